@@ -22,79 +22,92 @@ jgz a -1
 set a 1
 jgz a -2"""
 
-from collections import defaultdict, deque
-
-class Runner:
-    def __init__(self):
-        self.send_buffer = deque()
-        self.num_send = 0
-        self.waiting = False
-
-    def run_code(self, d, p=0, part2=False):
-        registers = defaultdict(int)
-        registers['p'] = p
-        last_freq = None
-        recover_freq = None
-        instructions = list(d.strip().splitlines())
-        #if part2:
-        #    _ = yield ('init', None)
-        current_index = 0
-        while 0 <= current_index < len(instructions):
-            op, reg, *arg = instructions[current_index].split()
-            arg = arg[0] if arg else '0'
-            v = registers[arg] if arg.isalpha() else int(arg)
-            if op == 'set':
-                registers[reg] = v
-            elif op == 'add':
-                registers[reg] += v
-            elif op == 'mul':
-                registers[reg] *= v
-            elif op == 'mod':
-                registers[reg] = registers[reg] % v
-            elif op == 'snd':
-                if part2:
-                    v = registers[reg] if reg.isalpha() else int(reg)
-                    self.send_buffer.append(v)
-                    #print(f'{p} send {v:6} at instruction {current_index:2} a={registers["a"]},b={registers["b"]} (send queue size {len(self.send_buffer)})')
-                    self.num_send += 1
-                    #_ = yield ('snd', v)
-                    #print(p, 'snd <-', _)
-                    #send_queue.append(v)
-                else:
-                    last_freq = registers[reg]
-            elif op == 'rcv':
-                if part2:
-                    r = yield
-                    while r is None:
-                        #print(p, 'waiting in rcv')
-                        self.waiting = True
-                        r = yield
-                    self.waiting = False
-                    registers[reg] = r
-                    
-                else:
-                    if registers[reg] != 0:
-                        recover_freq = yield last_freq
-                        break
-            elif op == 'jgz':
-                c = registers[reg] if reg.isalpha() else int(reg)
-                if c > 0:
-                    current_index += v-1
-            else:
-                raise ValueError(f"Unkown operation {op}")
-            current_index += 1
-        return recover_freq
+import sys
+sys.path.insert(0, str(THIS_DIR.absolute().parents[1] / '2020' / 'shared'))
+from cpu import Program, VM, HALT
+
+# Events
+RECOVER, WAIT = 'recover', 'wait'
+
+def _set(vm, x, y):
+    r = vm.registers
+    def op():
+        r[x] = r[y]
+        return 1
+    return op
+
+def _add(vm, x, y):
+    r = vm.registers
+    def op():
+        r[x] += r[y]
+        return 1
+    return op
+
+def _mul(vm, x, y):
+    r = vm.registers
+    def op():
+        r[x] *= r[y]
+        return 1
+    return op
+
+def _mod(vm, x, y):
+    r = vm.registers
+    def op():
+        r[x] %= r[y]
+        return 1
+    return op
+
+def _jgz(vm, x, y):
+    r = vm.registers
+    def op():
+        return r[y] if r[x] > 0 else 1
+    return op
+
+# snd plays a sound (part 1) or sends a value (part 2)
+def _snd(vm, x):
+    r = vm.registers
+    def op():
+        vm.outputs.append(r[x])
+        return 1
+    return op
+
+# Part 1, rcv recovers the last sound
+def _rcv_recover(vm, x):
+    r = vm.registers
+    def op():
+        if r[x] != 0:
+            vm.event = RECOVER
+        return 1
+    return op
+
+# Part 2, rcv receives a value
+def _rcv(vm, x):
+    r = vm.registers
+    inputs = vm.inputs
+    def op():
+        if not inputs:
+            # stay on this instruction
+            vm.event = WAIT
+            return 0
+        r[x] = inputs.popleft()
+        return 1
+    return op
+
+COMMON = {'set': _set, 'add': _add, 'mul': _mul, 'mod': _mod, 'jgz': _jgz}
+SOUND = dict(COMMON, snd=_snd, rcv=_rcv_recover)
+DUET = dict(COMMON, snd=_snd, rcv=_rcv)
+
+def solve(d):
+    vm = VM(Program(d), SOUND)
+    if vm.run() == RECOVER:
+        return vm.outputs[-1]
 
 def test_example():
-    runner = Runner()
-    iter = runner.run_code(EXAMPLE_DATA)
-    result = next(iter)
+    result = solve(EXAMPLE_DATA)
     assert(4 == result)
 
 def test_part1():
-    runner = Runner()
-    iter = runner.run_code(data())
-    result = next(iter)
+    result = solve(data())
     print('PART 1:', result)
     assert(7071 == result)
 
@@ -108,37 +121,47 @@ rcv c
 rcv d"""
 
 def solve2(d):
-    p0 = Runner()
-    p0_iter = p0.run_code(d, p=0, part2=True)
-    next(p0_iter)
-
-    p1 = Runner()
-    p1_iter = p1.run_code(d, p=1, part2=True)
-    next(p1_iter)
-
+    program = Program(d, register_names=['p'])
+    p0 = VM(program, DUET)
+    p1 = VM(program, DUET)
+    p1['p'] = 1
+    num_send = 0
     while True:
-        try:
-            if p1.send_buffer:
-                while p1.send_buffer:
-                    p0_iter.send(p1.send_buffer.popleft())
-            else:
-                p0_iter.send(None)
-            
-            if p0.send_buffer:
-                while p0.send_buffer:
-                    p1_iter.send(p0.send_buffer.popleft())
-            else:
-                p1_iter.send(None)
-            if p0.waiting and p1.waiting:
-                break
-        except StopIteration:
+        # run both programs until they wait for input (or halt)
+        e0 = p0.run()
+        moved = len(p0.outputs)
+        p1.inputs.extend(p0.outputs)
+        p0.outputs.clear()
+
+        e1 = p1.run()
+        num_send += len(p1.outputs)
+        moved += len(p1.outputs)
+        p0.inputs.extend(p1.outputs)
+        p1.outputs.clear()
+
+        if e0 == HALT or e1 == HALT:
+            # the other program can no longer receive anything new
+            break
+        if not moved:
+            # both wait and nothing is in flight: deadlock
             break
-    return p1.num_send
+    return num_send
 
 def test_example2():
     result = solve2(EXAMPLE_DATA2)
     assert(3 == result)
 
+def test_halting_program():
+    # p0 sends once and jumps out of the program, p1 sends once,
+    # receives the value of p0 and runs off the end
+    result = solve2("""\
+jgz p 3
+snd 1
+jgz 1 10
+snd 1
+rcv a""")
+    assert(1 == result)
+
 def test_part2():
     result = solve2(data())
     print('PART 2:', result)
@@ -6,6 +6,7 @@
 
 import itertools
 from collections import deque, defaultdict
+from array import array
 import time
 
 # Using a deque is much faster than 
@@ -60,7 +61,7 @@ def play_round(num_players):
 def game(num_players, last_marble, debug_print = False):
     last_percentage = 0
     last_processed = 0
-    last_time = time.clock()
+    last_time = time.perf_counter()
     for r in play_round(num_players):
         if debug_print:
             circle = r['circle']
@@ -74,7 +75,7 @@ def game(num_players, last_marble, debug_print = False):
         percentage = 100*(r['marble']/last_marble)
         if (percentage - last_percentage) > 1:
             # Compute performance statistics
-            current_time = time.clock()
+            current_time = time.perf_counter()
             current_processed = r['marble']
             num_processed = current_processed-last_processed
             speed = int(num_processed/(current_time - last_time)+0.5)
@@ -103,22 +104,100 @@ def game(num_players, last_marble, debug_print = False):
     print(num_players, 'players', 'last_marble:', last_marble, 'high_score:', high_score)
     return high_score
 
-# check examples
-assert(game(9, 25, True) == 32)
-assert(game(10, 1618) == 8317)
-assert(game(13, 7999) == 146373) 
-assert(game(17, 1104) == 2764)
-assert(game(21, 6111) == 54718)
-assert(game(30, 5807) == 37305)
+def marble_game(num_players, last_marble):
+    """
+    Plays the game on a circular doubly linked list stored
+    in two preallocated arrays indexed by marble value, so
+    memory is fixed by last_marble (two machine words per
+    marble) and no objects are created per marble.
+    """
+    next_marble = array('l', [0])*(last_marble + 1)
+    prev_marble = array('l', [0])*(last_marble + 1)
+    scores = [0]*num_players
+    current = 0
+    # the marble clockwise of the current one
+    right = 0
+    marble = 0
+    # play in blocks of 23 marbles, 22 inserts followed by a score
+    for block_start in range(0, last_marble + 1, 23):
+        for marble in range(block_start + 1, min(block_start + 23, last_marble + 1)):
+            # insert between the two marbles clockwise of the current one
+            left = right
+            right = next_marble[left]
+            next_marble[left] = marble
+            prev_marble[marble] = left
+            next_marble[marble] = right
+            prev_marble[right] = marble
+        current = marble
+        marble = block_start + 23
+        if marble > last_marble:
+            break
+        # walk 7 marbles counter-clockwise
+        p = prev_marble
+        removed = p[p[p[p[p[p[p[current]]]]]]]
+        left = p[removed]
+        current = next_marble[removed]
+        next_marble[left] = current
+        p[current] = left
+        scores[marble % num_players] += marble + removed
+        right = next_marble[current]
+    return max(scores)
+
+EXAMPLES = [
+    (9, 25, 32),
+    (10, 1618, 8317),
+    (13, 7999, 146373),
+    (17, 1104, 2764),
+    (21, 6111, 54718),
+    (30, 5807, 37305),
+]
+
+def test_examples():
+    assert(game(9, 25, True) == 32)
+    for num_players, last_marble, high_score in EXAMPLES:
+        assert(game(num_players, last_marble) == high_score)
+        assert(marble_game(num_players, last_marble) == high_score)
+
+def test_part1():
+    # PART 1: 426 players; last marble is worth 72058 points
+    print('PART 1:')
+    high_score = marble_game(426, 72058)
+    print('high_score:', high_score)
+    assert(high_score == game(426, 72058))
+
+def test_part2():
+    # PART 2: 426 players; last marble is worth 72058*100 points
+    # 100 times more points makes the list unworkable, but
+    # the deque performs fine.
+    # Insertion and deletion in list is O(n) but deque is O(1),
+    # the linked list in arrays is O(1) as well.
+    print('PART 2:')
+    high_score = marble_game(426, 72058*100)
+    print('high_score:', high_score)
+    # as found with the deque, see deque_times.txt
+    assert(high_score == 3487352628)
 
-# PART 1: 426 players; last marble is worth 72058 points
-print('PART 1:')
-game(426, 72058)
+def benchmark():
+    from contextlib import redirect_stdout
+    from io import StringIO
+    for last_marble in [7*10**6, 10**8]:
+        start = time.perf_counter()
+        high_score = marble_game(426, last_marble)
+        t_array = time.perf_counter() - start
+        print(last_marble, 'marbles, array:', high_score, f"{t_array:.1f}s", 
+              f"{last_marble/t_array:.0f} marbles/s")
+        start = time.perf_counter()
+        with redirect_stdout(StringIO()):
+            high_score_deque = game(426, last_marble)
+        t_deque = time.perf_counter() - start
+        print(last_marble, 'marbles, deque:', high_score_deque, f"{t_deque:.1f}s", 
+              f"{last_marble/t_deque:.0f} marbles/s")
 
-# PART 2: 426 players; last marble is worth 72058*100 points
-# 100 times more points makes the list unworkable, but
-# the deque performs fine.
-# Insertion and deletion in list is O(n) but deque is O(1)
-print('PART 2:')
-game(426, 72058*100)
-      
+if __name__ == "__main__":
+    import sys
+    if 'bench' in sys.argv[1:]:
+        benchmark()
+    else:
+        test_examples()
+        test_part1()
+        test_part2()
@@ -4,26 +4,27 @@
 # Pieter Kitslaar
 #
 
+from pathlib import Path
+THIS_DIR = Path(__file__).parent
+
+import sys
+sys.path.insert(0, str(THIS_DIR.absolute().parent / 'shared'))
+from summed_area import SummedAreaTable
+
 import numpy as np
 
 GRID_SIZE = 300
 SUB_GRID_SIZE = 3
 
-def create_grid(serial_number):
-    grid = [[0]*GRID_SIZE for _ in range(GRID_SIZE)]
-    for y_index, row in enumerate(grid):
-        y = y_index + 1
-        for x_index, cell_value in enumerate(row):
-            x = x_index + 1
-            rack_id = x + 10
-            power_level = rack_id * y
-            increased_level = power_level + serial_number
-            multiplied = increased_level * rack_id
-            str_multiplied = str(multiplied)
-            hundred_digit = int(str_multiplied[-3]) if len(str_multiplied) > 2 else 0
-            final_level = hundred_digit - 5
-            row[x_index] = final_level
-    return np.array(grid)
+def create_grid(serial_number, grid_size = GRID_SIZE):
+    x = np.arange(1, grid_size+1, dtype=np.int64)[None, :]
+    y = np.arange(1, grid_size+1, dtype=np.int64)[:, None]
+    rack_id = x + 10
+    power_level = rack_id * y
+    increased_level = power_level + serial_number
+    multiplied = increased_level * rack_id
+    hundred_digit = (multiplied // 100) % 10
+    return hundred_digit - 5
 
 def sub_grid(grid, top_left, sub_grid_size = SUB_GRID_SIZE):
    start_x_index = top_left[0]-1
@@ -35,45 +36,94 @@ def power(grid):
     return np.sum(grid)
     
 def max_sub_power_coord(grid, sub_grid_size = SUB_GRID_SIZE):
-    powers = []
-    for start_y in range(0, GRID_SIZE-sub_grid_size):
-        for start_x in range(0, GRID_SIZE-sub_grid_size):
-            coord = (start_x+1, start_y+1)
-            sg = sub_grid(grid, coord, sub_grid_size)
-            powers.append((coord, power(sg)))
-    powers.sort(key = lambda t: t[1])
-    return powers[-1]
+    table = grid if isinstance(grid, SummedAreaTable) else SummedAreaTable(grid)
+    y_index, x_index, max_power = table.best_window(sub_grid_size)
+    return (x_index+1, y_index+1), max_power
     
 def max_sub_power_coord_size(grid):
-    powers = []
-    for sub_grid_size in range(2, GRID_SIZE-1):
-        max_coord, max_power = max_sub_power_coord(grid, sub_grid_size)
-        powers.append(((max_coord[0], max_coord[1], sub_grid_size), max_power))
-    powers.sort(key = lambda t: t[1])
-    return powers[-1]        
+    y_index, x_index, size, max_power = SummedAreaTable(grid).best_square()
+    return (x_index+1, y_index+1, size), max_power
     
 def get_value(grid, x, y):
     return grid[y-1][x-1]
 
-example_grid_8 = create_grid(8)
-assert(4 == get_value(example_grid_8, 3, 5))
+def create_grid_loops(serial_number):
+    # the original (non vectorised) grid construction
+    grid = [[0]*GRID_SIZE for _ in range(GRID_SIZE)]
+    for y_index, row in enumerate(grid):
+        y = y_index + 1
+        for x_index, cell_value in enumerate(row):
+            x = x_index + 1
+            rack_id = x + 10
+            power_level = rack_id * y
+            increased_level = power_level + serial_number
+            multiplied = increased_level * rack_id
+            str_multiplied = str(multiplied)
+            hundred_digit = int(str_multiplied[-3]) if len(str_multiplied) > 2 else 0
+            final_level = hundred_digit - 5
+            row[x_index] = final_level
+    return np.array(grid)
+
+def test_examples():
+    example_grid_8 = create_grid(8)
+    assert(4 == get_value(example_grid_8, 3, 5))
+    assert((example_grid_8 == create_grid_loops(8)).all())
+
+    example_grid_18 = create_grid(18)
+    sub_18 = sub_grid(example_grid_18, (33,45))
+    assert(29 == power(sub_18))
+    max_coord, max_power = max_sub_power_coord(example_grid_18)
+    assert((33,45)==max_coord )
+    assert(((90,269,16), 113) == max_sub_power_coord_size(example_grid_18))
 
-example_grid_18 = create_grid(18)
-sub_18 = sub_grid(example_grid_18, (33,45))
-assert(29 == power(sub_18))
-max_coord, max_power = max_sub_power_coord(example_grid_18)
-assert((33,45)==max_coord )
+    example_grid_42 = create_grid(42)
+    sub_42 = sub_grid(example_grid_42, (21,61))
+    assert(30 == power(sub_42))
+    max_coord, max_power = max_sub_power_coord(example_grid_42)
+    assert((21,61) == max_coord)
+    assert(((232,251,12), 119) == max_sub_power_coord_size(example_grid_42))
 
-example_grid_42 = create_grid(42)
-sub_42 = sub_grid(example_grid_42, (21,61))
-assert(30 == power(sub_42))
-max_coord, max_power = max_sub_power_coord(example_grid_42)
-assert((21,61) == max_coord)
+def test_summed_area():
+    values = np.random.default_rng(11).integers(-5, 5, size=(40, 30))
+    table = SummedAreaTable(values)
+    assert(table.sum(3, 4, 5, 6) == values[3:8, 4:10].sum())
+    sums = table.window_sums(4, 7)
+    assert(sums.shape == (37, 24))
+    assert(sums[10, 20] == values[10:14, 20:27].sum())
+    # compare the early stopping against all sizes
+    best = max((table.best_window(size)[2], size) for size in range(1, 31))
+    assert(table.best_square()[2:] == (best[1], best[0]))
 
 # Test grid: Serial 7689
-test_grid = create_grid(7689)
-max_coord, max_power = max_sub_power_coord(test_grid)
-print('PART 1:', max_coord, 'max power', max_power)
+def test_part1():
+    test_grid = create_grid(7689)
+    max_coord, max_power = max_sub_power_coord(test_grid)
+    print('PART 1:', max_coord, 'max power', max_power)
+    assert((20,37) == max_coord)
+
+def test_part2():
+    test_grid = create_grid(7689)
+    max_coord_size, max_power = max_sub_power_coord_size(test_grid)
+    print('PART 2:', max_coord_size, 'max power', max_power)
+    assert((90,169,15) == max_coord_size)
+
+def benchmark():
+    import time
+    for grid_size in [300, 3000]:
+        start = time.perf_counter()
+        grid = create_grid(7689, grid_size)
+        table = SummedAreaTable(grid)
+        t_table = time.perf_counter() - start
+        start = time.perf_counter()
+        y_index, x_index, size, max_power = table.best_square()
+        t_search = time.perf_counter() - start
+        print(f"{grid_size}x{grid_size}: {(x_index+1, y_index+1, size)} power {max_power},",
+              f"grid and table {t_table:.3f}s, all sizes {t_search:.3f}s")
 
-max_coord_size, max_power = max_sub_power_coord_size(test_grid)
-print('PART 2:', max_coord_size, 'max power', max_power)
+if __name__ == "__main__":
+    if 'bench' in sys.argv[1:]:
+        benchmark()
+    else:
+        test_examples()
+        test_part1()
+        test_part2()
@@ -135,16 +135,147 @@ def grow(inital_data, num_generations):
     checksum = np.sum(np.nonzero(data['state'] == PLANT) - data['center'])
     return checksum
 
-# Test example
-with open('example.txt', 'r') as f:
-    example_data = parse(f.read())
-assert(325 == grow(example_data, 20))
+# Bit packed version
+#
+# Pots are a 0/1 uint8 array trimmed to the span from the first
+# to the last plant, together with the number of the first pot.
+# Every 5-pot window read as bits (leftmost pot as highest bit)
+# indexes a 32-entry rule table.
+
+WINDOW_WEIGHTS = np.array([16, 8, 4, 2, 1], dtype=np.uint8)
+
+def packed_rules(data):
+    """Returns the 32-entry growth table for the parsed patterns."""
+    table = np.zeros(32, dtype=np.uint8)
+    for pattern, result in data['patterns_txt']:
+        index = int(pattern.replace('#', '1').replace('.', '0'), 2)
+        table[index] = result == '#'
+    if table[0]:
+        raise ValueError("Empty pots grow plants, the state would be infinite")
+    return table
+
+def trim(pots, first):
+    """Removes the empty pots at both ends, returns pots and first pot number."""
+    plants = np.flatnonzero(pots)
+    if len(plants) == 0:
+        return pots[:0], first
+    return pots[plants[0]:plants[-1]+1], first + int(plants[0])
 
-# Assignment
-with open('input.txt', 'r') as f:
-    initial_test_data = parse(f.read())
+def packed_step(pots, first, table):
+    """Grows a trimmed state for one generation."""
+    # growth reaches at most two pots beyond the plants
+    padded = np.zeros(len(pots) + 8, dtype=np.uint8)
+    padded[4:-4] = pots
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 5)
+    # window j is centered on pot first - 2 + j
+    return trim(table[windows @ WINDOW_WEIGHTS], first - 2)
 
-print('PART 1:', grow(initial_test_data, 20))
+def checksum_packed(pots, first):
+    return int(np.flatnonzero(pots).sum()) + int(pots.sum())*first
+
+def grow_packed(initial_data, num_generations):
+    table = packed_rules(initial_data)
+    pots, first = trim((initial_data['state'] == PLANT).astype(np.uint8), -initial_data['center'])
+    # generation at which each trimmed pattern was first seen
+    seen = {}
+    history = []
+    for generation in range(num_generations):
+        signature = pots.tobytes()
+        if signature in seen:
+            # The same pattern as an earlier generation, only shifted.
+            # From there on the generations repeat with the same shift
+            # per period, so jump straight to the final generation.
+            start = seen[signature]
+            period = generation - start
+            shift = first - history[start][1]
+            num_periods, offset = divmod(num_generations - start, period)
+            pots, first = history[start + offset]
+            first += num_periods*shift
+            break
+        seen[signature] = generation
+        history.append((pots, first))
+        pots, first = packed_step(pots, first, table)
+    return checksum_packed(pots, first)
+
+from pathlib import Path
+THIS_DIR = Path(__file__).parent
+
+def load(name):
+    with open(THIS_DIR / name, 'r') as f:
+        return parse(f.read())
 
 NUM_GENERATIONS = 50000000000
-print('PART 2:', grow(initial_test_data, NUM_GENERATIONS))
\ No newline at end of file
+
+def test_example():
+    example_data = load('example.txt')
+    assert(325 == grow(example_data, 20))
+    assert(325 == grow_packed(example_data, 20))
+
+def test_packed_step():
+    data = load('input.txt')
+    table = packed_rules(data)
+    pots, first = trim((data['state'] == PLANT).astype(np.uint8), 0)
+    for step in range(200):
+        data = do_step(data)
+        pots, first = packed_step(pots, first, table)
+        plants = np.flatnonzero(data['state'] == PLANT) - data['center']
+        assert((np.flatnonzero(pots) + first == plants).all())
+
+def test_shifted_period():
+    # these rules settle after 2269 generations into a
+    # pattern that repeats every 16 generations, shifted
+    data = parse(random_input(121))
+    table = packed_rules(data)
+    pots, first = trim((data['state'] == PLANT).astype(np.uint8), 0)
+    for num_generations in range(2400):
+        if num_generations in (0, 2268, 2269, 2270, 2290, 2399):
+            assert(checksum_packed(pots, first) == grow_packed(data, num_generations))
+        pots, first = packed_step(pots, first, table)
+
+def test_part1():
+    initial_test_data = load('input.txt')
+    checksum = grow_packed(initial_test_data, 20)
+    print('PART 1:', checksum)
+    assert(checksum == grow(initial_test_data, 20))
+
+def test_part2():
+    initial_test_data = load('input.txt')
+    checksum = grow_packed(initial_test_data, NUM_GENERATIONS)
+    print('PART 2:', checksum)
+    assert(checksum == grow(initial_test_data, NUM_GENERATIONS))
+
+def random_input(seed, num_pots=100):
+    """Puzzle input with random rules (empty pots stay empty) and initial state."""
+    rng = np.random.default_rng(seed)
+    table = rng.integers(0, 2, 32)
+    table[0] = 0
+    state = rng.integers(0, 2, num_pots)
+    lines = ['initial state: ' + ''.join('.#'[v] for v in state), '']
+    for index, result in enumerate(table):
+        pattern = ''.join('.#'[(index >> bit) & 1] for bit in range(4, -1, -1))
+        lines.append(f"{pattern} => {'.#'[result]}")
+    return '\n'.join(lines)
+
+def benchmark():
+    import time
+    for name in ['example.txt', 'input.txt']:
+        initial_data = load(name)
+        for f in [grow, grow_packed]:
+            start = time.perf_counter()
+            checksum = f(initial_data, NUM_GENERATIONS)
+            print(name, f.__name__, checksum, f"{(time.perf_counter() - start)*1000:.1f} ms")
+    # random rules that take thousands of generations to settle into a
+    # shifted pattern with a period > 1 (which 'grow' never detects)
+    for seed in [121, 1897]:
+        start = time.perf_counter()
+        checksum = grow_packed(parse(random_input(seed)), NUM_GENERATIONS)
+        print('random seed', seed, 'grow_packed', checksum, f"{(time.perf_counter() - start)*1000:.1f} ms")
+
+if __name__ == "__main__":
+    import sys
+    if 'bench' in sys.argv[1:]:
+        benchmark()
+    else:
+        test_example()
+        test_part1()
+        test_part2()
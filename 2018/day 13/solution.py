@@ -5,6 +5,11 @@
 #
 
 import numpy as np
+import random
+import time
+from pathlib import Path
+
+THIS_DIR = Path(__file__).parent
 
 LEFT, RIGHT = range(2)
 
@@ -26,7 +31,28 @@ def main():
     print()
 
 def part_1(file_name):
-    with open(file_name, 'r') as f:
+    with open(THIS_DIR / file_name, 'r') as f:
+        raw_test_data = f.read()
+    simulator = CartSimulator(split_blocks(raw_test_data)[0])
+    crashes = []
+    while not crashes:
+        crashes = simulator.tick()
+    x, y = crashes[0]
+    print('cart CRASHED at location', f"{x},{y}")
+    return x, y
+
+def part_2(file_name):
+    with open(THIS_DIR / file_name, 'r') as f:
+        part_2_data = f.read()
+    simulator = CartSimulator(split_blocks(part_2_data)[0])
+    while len(simulator.order) > 1:
+        simulator.tick()
+    x, y = simulator.position(simulator.order[0])
+    print('Cart left at position:', f'{x},{y}')
+    return x, y
+
+def part_1_dicts(file_name):
+    with open(THIS_DIR / file_name, 'r') as f:
         raw_test_data = f.read()
         
     data = split_blocks(raw_test_data)
@@ -38,8 +64,8 @@ def part_1(file_name):
     crash_y, crash_x  = crash_pos
     return crash_x, crash_y
     
-def part_2(file_name):
-    with open(file_name, 'r') as f:
+def part_2_dicts(file_name):
+    with open(THIS_DIR / file_name, 'r') as f:
         part_2_data = f.read()
     
     blocks = split_blocks(part_2_data)
@@ -108,6 +134,9 @@ def tick(prev_data, remove_crashed = False):
             print('cart', c_id, 'CRASHED into cart', c_id_into, 'at location', f"{new_x},{new_y}")
             crashed_carts.add(c_id)
             crashed_carts.add(c_id_into)
+            # both carts are gone from the track
+            carts_array[new_y][new_x] = 0
+            carts_array[y][x] = 0
             if remove_crashed:
                 # remove crashed (for part 2)
                 del data['carts_info'][c_id]
@@ -240,6 +269,174 @@ def compute_carts_array(data, encode = 'id'):
 
 
 
+# Directions in clockwise order, the simulator stores a
+# direction as index in this string.
+DIRECTIONS = '^>v<'
+
+# Track pieces a cart can turn on
+STRAIGHT, SLASH, BACKSLASH, INTERSECTION = range(4)
+TRACK_CODES = {'|': STRAIGHT, '-': STRAIGHT, '/': SLASH, '\\': BACKSLASH, '+': INTERSECTION}
+
+def _turn(track_char, direction, num_turns):
+    """Returns the new (direction, num_turns) of a cart entering a track piece."""
+    if track_char == '/':
+        turn = {'^': RIGHT, 'v': RIGHT, '>': LEFT, '<': LEFT}[direction]
+    elif track_char == '\\':
+        turn = {'v': LEFT, '^': LEFT, '>': RIGHT, '<': RIGHT}[direction]
+    elif track_char == '+':
+        # left, straight, right
+        turn = [LEFT, None, RIGHT][num_turns]
+        num_turns = (num_turns + 1) % 3
+    else:
+        turn = None
+    if turn is not None:
+        direction = get_turned_direction(direction, turn)
+    return direction, num_turns
+
+# (track char, direction, intersection counter) -> (direction, intersection counter)
+TURNS = {
+    (track_char, direction, num_turns): _turn(track_char, direction, num_turns)
+    for track_char in '|-/\\+' for direction in DIRECTIONS for num_turns in range(3)
+}
+
+class CartSimulator:
+    """Simulates the carts in place.
+
+    The track is a flat list of track codes (index y*width + x) and
+    the carts are parallel lists of position, direction (index in
+    DIRECTIONS) and intersection counter. The occupancy dict maps the
+    position of every cart still on the track to its index.
+
+    The TURNS lookup is compiled into a flat list indexed by
+    (track code*4 + direction)*3 + counter, holding direction*3 + counter.
+    """
+
+    def __init__(self, txt_data):
+        lines = txt_data.splitlines()
+        self.width = width = max(len(line) for line in lines)
+        self.track = [STRAIGHT]*(width*len(lines))
+        self.positions = []
+        self.directions = []
+        self.num_turns = []
+        for y, line in enumerate(lines):
+            for x, c in enumerate(line):
+                if c in DIRECTIONS:
+                    self.positions.append(y*width + x)
+                    self.directions.append(DIRECTIONS.index(c))
+                    self.num_turns.append(0)
+                else:
+                    self.track[y*width + x] = TRACK_CODES.get(c, STRAIGHT)
+        self.offsets = [-width, 1, width, -1]
+        code_chars = '-/\\+'
+        self.turns = [0]*(4*4*3)
+        for code, track_char in enumerate(code_chars):
+            for d, direction in enumerate(DIRECTIONS):
+                for k in range(3):
+                    new_direction, new_k = TURNS[(track_char, direction, k)]
+                    self.turns[(code*4 + d)*3 + k] = DIRECTIONS.index(new_direction)*3 + new_k
+        # carts still on the track, and the index of the cart per position
+        self.order = list(range(len(self.positions)))
+        self.occupancy = {p: i for i, p in enumerate(self.positions)}
+        self.num_ticks = 0
+
+    def position(self, cart):
+        return tuple(reversed(divmod(self.positions[cart], self.width)))
+
+    def tick(self):
+        """Moves all carts one step in reading order. Crashed carts
+        are removed, returns the crash locations as (x, y) in the
+        order they happened."""
+        positions = self.positions
+        directions = self.directions
+        num_turns = self.num_turns
+        occupancy = self.occupancy
+        track = self.track
+        turns = self.turns
+        offsets = self.offsets
+        crashes = []
+        self.order.sort(key=positions.__getitem__)
+        for cart in self.order:
+            pos = positions[cart]
+            if occupancy.get(pos) != cart:
+                # hit by another cart earlier in this tick
+                continue
+            del occupancy[pos]
+            d = directions[cart]
+            pos += offsets[d]
+            positions[cart] = pos
+            other = occupancy.pop(pos, None)
+            if other is not None:
+                crashes.append(self.position(cart))
+                continue
+            occupancy[pos] = cart
+            state = turns[(track[pos]*4 + d)*3 + num_turns[cart]]
+            directions[cart], num_turns[cart] = divmod(state, 3)
+        if crashes:
+            self.order = [cart for cart in self.order if occupancy.get(positions[cart]) == cart]
+        self.num_ticks += 1
+        return crashes
+
+def lattice_track(size, num_carts, seed=13):
+    """A track of size x size with horizontal and vertical loops
+    that cross at intersections, with carts on random straight pieces."""
+    grid = [[' ']*size for _ in range(size)]
+    def loop(y0, x0, y1, x1):
+        for x in range(x0 + 1, x1):
+            for y in (y0, y1):
+                grid[y][x] = '+' if grid[y][x] == '|' else '-'
+        for y in range(y0 + 1, y1):
+            for x in (x0, x1):
+                grid[y][x] = '+' if grid[y][x] == '-' else '|'
+        grid[y0][x0] = grid[y1][x1] = '/'
+        grid[y0][x1] = grid[y1][x0] = '\\'
+    for offset in range(2, size - 4, 4):
+        loop(offset, 0, offset + 2, size - 1)
+        loop(0, offset, size - 1, offset + 2)
+    rng = random.Random(seed)
+    straight = [(y, x) for y in range(size) for x in range(size) if grid[y][x] in '-|']
+    for y, x in rng.sample(straight, num_carts):
+        grid[y][x] = rng.choice('<>' if grid[y][x] == '-' else '^v')
+    return "\n".join("".join(row) for row in grid)
+
+def benchmark():
+    from contextlib import redirect_stdout
+    from io import StringIO
+    for size, num_carts in [(150, 1000), (1000, 10000)]:
+        txt_data = lattice_track(size, num_carts)
+        simulator = CartSimulator(txt_data)
+        data = parse(txt_data)
+        for num_ticks in [10, 190]:
+            start = time.perf_counter()
+            for _ in range(num_ticks):
+                simulator.tick()
+            elapsed = time.perf_counter() - start
+            print(f"{size}x{size}, {num_carts} carts: {num_ticks/elapsed:.0f} ticks/s,",
+                  f"{len(simulator.order)} carts left after {simulator.num_ticks} ticks")
+            if num_ticks == 10:
+                start = time.perf_counter()
+                with redirect_stdout(StringIO()):
+                    for _ in range(num_ticks):
+                        data, _ = tick(data, remove_crashed=True)
+                elapsed = time.perf_counter() - start
+                print(f"{size}x{size}, {num_carts} carts (dicts): {num_ticks/elapsed:.1f} ticks/s")
+
+def test_simulator():
+    assert((7,3) == part_1('test_data.txt'))
+    assert((6,4) == part_2('test_data_2.txt'))
+    assert(part_1('input.txt') == part_1_dicts('input.txt'))
+    assert(part_2('input.txt') == part_2_dicts('input.txt'))
+    # compare the crashes per tick on a busy track
+    txt_data = lattice_track(40, 150)
+    simulator = CartSimulator(txt_data)
+    data = parse(txt_data)
+    for _ in range(100):
+        crashes = simulator.tick()
+        data, crashed = tick(data, remove_crashed=True)
+        assert(len(crashes) == len(crashed)//2)
+        assert(len(simulator.order) == len(data['carts_info']))
+        assert(sorted(simulator.position(c) for c in simulator.order) ==
+               sorted((x, y) for y, x in (c['pos'] for c in data['carts_info'].values())))
+
 def split_blocks(raw_txt):
     data_steps = [[]]
     current_block = data_steps[-1]
@@ -255,4 +452,8 @@ def split_blocks(raw_txt):
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import sys
+    if 'bench' in sys.argv[1:]:
+        benchmark()
+    else:
+        main()
\ No newline at end of file
@@ -6,6 +6,9 @@
 
 import numpy as np
 from collections import deque
+from pathlib import Path
+
+THIS_DIR = Path(__file__).parent
 
 EMPTY  = 0
 WALL   = -2 
@@ -327,10 +330,6 @@ def battle(input_data, last_column = None, init_map_callback = None, check_map_c
         outcome = r*summed
         return outcome
 
-def battle_test(outcome, *args, **kwargs):
-    if run_tests:
-        assert(outcome == battle(*args, **kwargs))
-
 class ElvesDied(Exception):
     pass
 
@@ -384,18 +383,190 @@ def battle_attack(d, last_column, attack):
     except ElvesDied:
         pass
 
+# Fast combat engine
+#
+# The cave is a flat bytearray (index y*width + x, walls are 0),
+# the units are parallel lists and 'occupant' holds the index
+# of the unit on every square (or -1). The neighbour offsets
+# are in reading order: up, left, right, down.
+
+class Combat(object):
+
+    def __init__(self, txt_data, last_column = None, elf_attack = 3):
+        rows = []
+        for l in txt_data.splitlines():
+            row = l.strip()
+            if last_column:
+                row = row[:last_column+1]
+            rows.append(row)
+        self.width = width = max(len(r) for r in rows)
+        self.open = bytearray(width*len(rows))
+        self.positions = []
+        self.kinds = []
+        self.hp = []
+        self.attack = []
+        for y, row in enumerate(rows):
+            for x, c in enumerate(row):
+                if c == '#':
+                    continue
+                self.open[y*width + x] = 1
+                if c in 'EG':
+                    self.positions.append(y*width + x)
+                    self.kinds.append(CHAR_TABLE[c])
+                    self.hp.append(200)
+                    self.attack.append(elf_attack if c == 'E' else 3)
+        self.occupant = [-1]*len(self.open)
+        for unit, pos in enumerate(self.positions):
+            self.occupant[pos] = unit
+        self.offsets = (-width, -1, 1, width)
+        self.alive = {ELF: self.kinds.count(ELF), GOBLIN: self.kinds.count(GOBLIN)}
+        self.num_rounds = 0
+        self.abort_on_elf_death = False
+
+    def enemy_next_to(self, pos, kind):
+        """Returns the adjacent enemy with the fewest hit points
+        (first in reading order on a tie), or -1."""
+        occupant = self.occupant
+        hp = self.hp
+        kinds = self.kinds
+        target = -1
+        for offset in self.offsets:
+            other = occupant[pos + offset]
+            if other >= 0 and kinds[other] != kind and (target < 0 or hp[other] < hp[target]):
+                target = other
+        return target
+
+    def step(self, unit):
+        """Breadth first search from the unit, layer by layer. Every
+        reached square remembers the first step (the reading order
+        first on a tie) of the shortest paths to it. Returns the first
+        step towards the nearest square in range of an enemy (first in
+        reading order on a tie), or -1 if there is none."""
+        open_ = self.open
+        occupant = self.occupant
+        kinds = self.kinds
+        offsets = self.offsets
+        kind = kinds[unit]
+        start = self.positions[unit]
+        first_step = {start: -1}
+        # the squares next to the unit are their own first step
+        layer = {}
+        for offset in offsets:
+            n = start + offset
+            if open_[n] and occupant[n] < 0:
+                layer[n] = n
+        while layer:
+            first_step.update(layer)
+            in_range = [pos for pos in layer if any(
+                occupant[pos + offset] >= 0 and kinds[occupant[pos + offset]] != kind
+                for offset in offsets)]
+            if in_range:
+                return first_step[min(in_range)]
+            next_layer = {}
+            for pos, step in layer.items():
+                for offset in offsets:
+                    n = pos + offset
+                    if n in first_step or not open_[n] or occupant[n] >= 0:
+                        continue
+                    if n not in next_layer or step < next_layer[n]:
+                        next_layer[n] = step
+            layer = next_layer
+        return -1
+
+    def turn(self, unit):
+        """Takes the turn of a unit, returns False if there
+        are no enemies left."""
+        kind = self.kinds[unit]
+        if self.alive[ELF + GOBLIN - kind] == 0:
+            return False
+        pos = self.positions[unit]
+        target = self.enemy_next_to(pos, kind)
+        if target < 0:
+            new_pos = self.step(unit)
+            if new_pos < 0:
+                return True
+            self.occupant[pos] = -1
+            self.occupant[new_pos] = unit
+            self.positions[unit] = pos = new_pos
+            target = self.enemy_next_to(pos, kind)
+        if target >= 0:
+            self.hp[target] -= self.attack[unit]
+            if self.hp[target] <= 0:
+                self.occupant[self.positions[target]] = -1
+                self.alive[self.kinds[target]] -= 1
+                if self.abort_on_elf_death and self.kinds[target] == ELF:
+                    raise ElvesDied()
+        return True
+
+    def round(self):
+        """Plays a round, returns False if combat ended during the round."""
+        order = sorted((pos, unit) for unit, pos in enumerate(self.positions) if self.hp[unit] > 0)
+        for _, unit in order:
+            if self.hp[unit] > 0 and not self.turn(unit):
+                return False
+        self.num_rounds += 1
+        return True
+
+    def run(self):
+        """Fights until one side is gone, returns the outcome."""
+        while self.round():
+            pass
+        return self.num_rounds*sum(h for h in self.hp if h > 0)
+
+def fast_battle(input_data, last_column = None, elf_attack = 3, abort_on_elf_death = False):
+    """Returns the outcome of the battle, or None if an elf
+    died while 'abort_on_elf_death' is set."""
+    combat = Combat(input_data, last_column, elf_attack)
+    combat.abort_on_elf_death = abort_on_elf_death
+    try:
+        return combat.run()
+    except ElvesDied:
+        return None
+
+def _battle_without_losses(args):
+    return fast_battle(*args, abort_on_elf_death = True)
+
+def fast_powerup_elves(d, last_column = None, max_workers = None):
+    """Finds the lowest elf attack power for which no elf dies,
+    returns (outcome, attack power). Powers are tried in batches,
+    one battle per process, a battle stops as soon as an elf dies."""
+    if max_workers == 1:
+        attack = 4
+        while True:
+            outcome = fast_battle(d, last_column, attack, abort_on_elf_death = True)
+            if outcome is not None:
+                return outcome, attack
+            attack += 1
+    from concurrent.futures import ProcessPoolExecutor
+    import os
+    batch_size = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(batch_size) as executor:
+        attack = 4
+        while True:
+            powers = range(attack, attack + batch_size)
+            outcomes = executor.map(_battle_without_losses, [(d, last_column, p) for p in powers])
+            for power, outcome in zip(powers, outcomes):
+                if outcome is not None:
+                    return outcome, power
+            attack += batch_size
+
+def battle_test(outcome, *args, **kwargs):
+    assert(outcome == fast_battle(*args, **kwargs))
+    if check_slow:
+        assert(outcome == battle(*args, **kwargs))
+
 def powerup_test(outcome, data, last_column):
-    if run_tests:
-        result, checker = powerup_elves(data, last_column)
-        if not outcome == result:
-            print(checker.map)
-            raise ValueError(f'result {result} not equal to {outcome}')
+    result, attack = fast_powerup_elves(data, last_column, max_workers = 1)
+    assert(outcome == result)
+    if check_slow:
+        slow_result, checker = powerup_elves(data, last_column)
+        assert(slow_result == result and checker.attack == attack)
 
-        
-run_tests = True
-debug = False
+# also run the examples with the original engine
+check_slow = True
 
-battle_test(27730, ("""\
+def test_examples():
+    battle_test(27730, ("""\
 #######
 #.G...#
 #...EG#
@@ -405,7 +576,7 @@ battle_test(27730, ("""\
 #######
 """))
 
-battle_test(36334, """\
+    battle_test(36334, """\
 #######       #######
 #G..#E#       #...#E#   E(200)
 #E#E.E#       #E#...#   E(197)
@@ -415,7 +586,7 @@ battle_test(36334, """\
 #######       #######
 """, 6)
 
-battle_test(39514, """\
+    battle_test(39514, """\
 #######       #######   
 #E..EG#       #.E.E.#   E(164), E(197)
 #.#G.E#       #.#E..#   E(200)
@@ -426,7 +597,7 @@ battle_test(39514, """\
 """, 6)
 
 
-battle_test(27755, """\
+    battle_test(27755, """\
 #######       #######   
 #E.G#.#       #G.G#.#   G(200), G(98)
 #.#G..#       #.#G..#   G(200)
@@ -437,7 +608,7 @@ battle_test(27755, """\
 """, 6)
 
 
-battle_test(28944, """\
+    battle_test(28944, """\
 #######       #######   
 #.E...#       #.....#   
 #.#..G#       #.#G..#   G(200)
@@ -447,7 +618,7 @@ battle_test(28944, """\
 #######       ####### 
 """, 6)
 
-battle_test(18740, """\
+    battle_test(18740, """\
 #########       #########   
 #G......#       #.G.....#   G(137)
 #.E.#...#       #G.G#...#   G(200), G(200)
@@ -459,14 +630,8 @@ battle_test(18740, """\
 #########       #########   
 """, 7)
 
-
-with open('input.txt') as f:
-    input_data = f.read()
-
-print('PART 1: outcome is', battle(input_data))
-
-
-powerup_test(4988, """\
+def test_powerup_examples():
+    powerup_test(4988, """\
 #######       #######
 #.G...#       #..E..#   E(158)
 #...EG#       #...E.#   E(14)
@@ -476,7 +641,7 @@ powerup_test(4988, """\
 #######       #######
 """, 6)
 
-powerup_test(1140, """\
+    powerup_test(1140, """\
 #########       #########   
 #G......#       #.......#   
 #.E.#...#       #.E.#...#   E(38)
@@ -488,6 +653,36 @@ powerup_test(1140, """\
 #########       #########  
 """, 8)
 
-print('Starting part 2....')
-print('PART 2: outcome is', powerup_elves(input_data)[0])
+with open(THIS_DIR / 'input.txt') as f:
+    input_data = f.read()
 
+def test_part1():
+    outcome = fast_battle(input_data)
+    print('PART 1: outcome is', outcome)
+    assert(outcome == 195811)
+
+def test_part2():
+    outcome, attack = fast_powerup_elves(input_data)
+    print('PART 2: outcome is', outcome, 'with attack power', attack)
+    # the same as found by the original engine
+    assert((outcome, attack) == (69867, 10))
+
+def benchmark():
+    import time
+    start = time.perf_counter()
+    outcome = fast_battle(input_data)
+    print(f"part 1: {outcome} {time.perf_counter() - start:.3f}s")
+    for max_workers in [1, None]:
+        start = time.perf_counter()
+        outcome, attack = fast_powerup_elves(input_data, max_workers = max_workers)
+        print(f"part 2 (max_workers={max_workers}): {outcome} attack {attack} {time.perf_counter() - start:.3f}s")
+
+if __name__ == "__main__":
+    import sys
+    if 'bench' in sys.argv[1:]:
+        benchmark()
+    else:
+        test_examples()
+        test_powerup_examples()
+        test_part1()
+        test_part2()
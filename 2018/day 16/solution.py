@@ -6,82 +6,10 @@
 #
 
 from collections import defaultdict
-
-class CPU(object):
-
-    def __init__(self):
-        self.registers = defaultdict(int)
-        self.all_instructions = [
-            (getattr(self, method_name), method_name) for method_name in dir(self)
-            if method_name.startswith('i_')]
-
-    def get_r(self, x):
-        return self.registers[x]
-
-    def set_r(self, x, y):
-        self.registers[x] = y
-
-    def call(self, i_name, *args):
-        return getattr(self, i_name)(*args)
-
-    def i_addr(self, a, b, c):
-        self.set_r(c, self.get_r(a) + self.get_r(b))
-
-    def i_addi(self, a, b, c):
-        self.set_r(c, self.get_r(a) + b)
-
-    def i_mulr(self, a, b, c):
-        self.set_r(c, self.get_r(a) * self.get_r(b))
-
-    def i_muli(self, a, b, c):
-        self.set_r(c, self.get_r(a) * b)
-
-    def i_banr(self, a, b, c):
-        self.set_r(c, self.get_r(a) & self.get_r(b))
-
-    def i_bani(self, a, b, c):
-        self.set_r(c, self.get_r(a) & b)
-
-    def i_borr(self, a, b, c):
-        self.set_r(c, self.get_r(a) | self.get_r(b))
-
-    def i_bori(self, a, b, c):
-        self.set_r(c, self.get_r(a) | b)
-
-    def i_setr(self, a, b, c):
-        self.set_r(c, self.get_r(a))
-
-    def i_seti(self, a, b, c):
-        self.set_r(c, a)
-
-    def i_gtir(self, a, b, c):
-        self.set_r(c, 1 if a > self.get_r(b) else 0)
-
-    def i_gtri(self, a, b, c):
-        self.set_r(c, 1 if self.get_r(a) > b else 0)
-
-    def i_gtrr(self, a, b, c):
-        self.set_r(c, 1 if self.get_r(a) > self.get_r(b) else 0)
-
-    def i_eqir(self, a, b, c):
-        self.set_r(c, 1 if a == self.get_r(b) else 0)
-
-    def i_eqri(self, a, b, c):
-        self.set_r(c, 1 if self.get_r(a) == b else 0)
-
-    def i_eqrr(self, a, b, c):
-        self.set_r(c, 1 if self.get_r(a) == self.get_r(b) else 0)
-
-    def setup(self, values):
-        self.registers = defaultdict(int)
-        for i, v in enumerate(values):
-            self.registers[i] = v
-
-    def dump(self):
-        highest_register = max(self.registers)
-        return [self.registers[i] for i in range(highest_register+1)]
-
-
+from pathlib import Path
+import sys
+sys.path.insert(0, str(Path(__file__).absolute().parents[1] / 'shared'))
+from elfcode import OPCODES, NUM_REGISTERS, compile_instruction
 
 def parse_sample(txt):
     before = []
@@ -97,15 +25,14 @@ def parse_sample(txt):
     return {'before': before, 'code': code, 'after': after}
 
 def test_sample(sample):
-    cpu = CPU()       
     matches = []
-    for f, name in cpu.all_instructions:
-        cpu.setup(sample['before'])
-        code = sample['code']
-        op_code, call_args = code[0], code[1:]
-        f(*call_args)
-        result = cpu.dump()
-        if result == sample['after']:
+    code = sample['code']
+    op_code, call_args = code[0], code[1:]
+    num_registers = len(sample['before'])
+    for name in OPCODES:
+        registers = sample['before'] + [0]*(NUM_REGISTERS - num_registers)
+        compile_instruction(name, *call_args, registers)()
+        if registers[:num_registers] == sample['after']:
             matches.append((op_code, name))
     return matches
 
@@ -173,12 +100,12 @@ while op_code_matches:
 
 print(certain_matches)
 
-cpu = CPU()       
-for code in test_codes:
-    op_code, call_args = code[0], code[1:]
-    f_name = certain_matches[op_code]
-    cpu.call(f_name, *call_args)
-print(cpu.dump())
+# compile the program once and run it
+registers = [0]*NUM_REGISTERS
+program = [compile_instruction(certain_matches[code[0]], *code[1:], registers) for code in test_codes]
+for op in program:
+    op()
+print(registers[:4])
 
 
 
@@ -0,0 +1,330 @@
+# Advent of code - 2018
+#
+# Shared elfcode CPU (day 16, 19 and 21)
+#
+# Pieter Kitslaar
+#
+# A program is compiled once into a list of closures that operate
+# on a fixed six-slot register list. Known loops (the divisor-sum of
+# day 19 and the divide-by-256 of day 21) can be recognised by their
+# instruction pattern and replaced by a single closure that jumps
+# over the loop.
+#
+
+NUM_REGISTERS = 6
+
+def _addr(r, a, b, c):
+    def op():
+        r[c] = r[a] + r[b]
+    return op
+
+def _addi(r, a, b, c):
+    def op():
+        r[c] = r[a] + b
+    return op
+
+def _mulr(r, a, b, c):
+    def op():
+        r[c] = r[a] * r[b]
+    return op
+
+def _muli(r, a, b, c):
+    def op():
+        r[c] = r[a] * b
+    return op
+
+def _banr(r, a, b, c):
+    def op():
+        r[c] = r[a] & r[b]
+    return op
+
+def _bani(r, a, b, c):
+    def op():
+        r[c] = r[a] & b
+    return op
+
+def _borr(r, a, b, c):
+    def op():
+        r[c] = r[a] | r[b]
+    return op
+
+def _bori(r, a, b, c):
+    def op():
+        r[c] = r[a] | b
+    return op
+
+def _setr(r, a, b, c):
+    def op():
+        r[c] = r[a]
+    return op
+
+def _seti(r, a, b, c):
+    def op():
+        r[c] = a
+    return op
+
+def _gtir(r, a, b, c):
+    def op():
+        r[c] = 1 if a > r[b] else 0
+    return op
+
+def _gtri(r, a, b, c):
+    def op():
+        r[c] = 1 if r[a] > b else 0
+    return op
+
+def _gtrr(r, a, b, c):
+    def op():
+        r[c] = 1 if r[a] > r[b] else 0
+    return op
+
+def _eqir(r, a, b, c):
+    def op():
+        r[c] = 1 if a == r[b] else 0
+    return op
+
+def _eqri(r, a, b, c):
+    def op():
+        r[c] = 1 if r[a] == b else 0
+    return op
+
+def _eqrr(r, a, b, c):
+    def op():
+        r[c] = 1 if r[a] == r[b] else 0
+    return op
+
+OPCODES = {
+    'addr': _addr, 'addi': _addi,
+    'mulr': _mulr, 'muli': _muli,
+    'banr': _banr, 'bani': _bani,
+    'borr': _borr, 'bori': _bori,
+    'setr': _setr, 'seti': _seti,
+    'gtir': _gtir, 'gtri': _gtri, 'gtrr': _gtrr,
+    'eqir': _eqir, 'eqri': _eqri, 'eqrr': _eqrr,
+}
+
+# instructions for which a and b can be swapped
+COMMUTATIVE = {'addr', 'mulr', 'banr', 'borr', 'eqrr'}
+
+def compile_instruction(name, a, b, c, registers):
+    """
+    Returns a closure executing a single instruction on 'registers'.
+    """
+    return OPCODES[name](registers, a, b, c)
+
+def parse(txt):
+    """
+    Returns the instruction pointer register and the
+    list of (name, a, b, c) instructions.
+    """
+    ip_register = None
+    instructions = []
+    for l in txt.splitlines():
+        if not l.strip():
+            continue
+        if l.startswith('#ip'):
+            ip_register = int(l.split('#ip ')[-1])
+        else:
+            name, *args = l.split()
+            a, b, c = [int(v) for v in args]
+            instructions.append((name, a, b, c))
+    return ip_register, instructions
+
+#
+# Loop detection
+#
+# Patterns are written with role names for registers/constants
+# that are bound while matching. 'IP' is the instruction pointer
+# register, ('p', k) is the address of the pattern start plus k
+# and '*' matches anything.
+#
+
+# Sums all divisors of N into S (day 19)
+#   for A in 1..N:
+#       for B in 1..N:
+#           if A*B == N: S += A
+DIVISOR_SUM_PATTERN = [
+    ('seti', 1, '*', 'A'),
+    ('seti', 1, '*', 'B'),
+    ('mulr', 'A', 'B', 'T'),
+    ('eqrr', 'T', 'N', 'T'),
+    ('addr', 'T', 'IP', 'IP'),
+    ('addi', 'IP', 1, 'IP'),
+    ('addr', 'A', 'S', 'S'),
+    ('addi', 'B', 1, 'B'),
+    ('gtrr', 'B', 'N', 'T'),
+    ('addr', 'IP', 'T', 'IP'),
+    ('seti', ('p', 1), '*', 'IP'),
+    ('addi', 'A', 1, 'A'),
+    ('gtrr', 'A', 'N', 'T'),
+    ('addr', 'T', 'IP', 'IP'),
+    ('seti', ('p', 0), '*', 'IP'),
+]
+
+def _divisor_sum(r, ip_register, exit_ip, A, B, T, N, S, **_):
+    def op():
+        n = r[N]
+        total = 0
+        d = 1
+        while d*d <= n:
+            if n % d == 0:
+                total += d
+                if d*d != n:
+                    total += n // d
+            d += 1
+        r[S] += total
+        r[A] = r[B] = max(n, 1) + 1
+        r[T] = 1
+        r[ip_register] = exit_ip - 1
+    return op
+
+# Integer division Q = X // K (day 21)
+#   Q = 0
+#   while (Q+1)*K <= X: Q += 1
+DIVIDE_PATTERN = [
+    ('seti', 0, '*', 'Q'),
+    ('addi', 'Q', 1, 'U'),
+    ('muli', 'U', '#K', 'U'),
+    ('gtrr', 'U', 'X', 'U'),
+    ('addr', 'U', 'IP', 'IP'),
+    ('addi', 'IP', 1, 'IP'),
+    ('seti', ('p', 8), '*', 'IP'),
+    ('addi', 'Q', 1, 'Q'),
+    ('seti', ('p', 0), '*', 'IP'),
+]
+
+def _divide(r, ip_register, exit_ip, Q, U, X, K, **_):
+    def op():
+        r[Q] = max(r[X], 0) // K
+        r[U] = 1
+        r[ip_register] = exit_ip - 1
+    return op
+
+LOOP_PATTERNS = [
+    (DIVISOR_SUM_PATTERN, _divisor_sum),
+    (DIVIDE_PATTERN, _divide),
+]
+
+def _match_value(token, value, p, binding):
+    """
+    Matches a single operand, returns the (possibly extended) binding or None.
+    """
+    if token == '*':
+        return binding
+    if isinstance(token, int):
+        return binding if token == value else None
+    if isinstance(token, tuple):
+        return binding if p + token[1] == value else None
+    if token in binding:
+        return binding if binding[token] == value else None
+    if not token.startswith('#') and value in [v for k, v in binding.items() if not k.startswith('#')]:
+        # different register roles should use different registers
+        return None
+    extended = dict(binding)
+    extended[token] = value
+    return extended
+
+def _match(pattern, instructions, p, k, binding):
+    """
+    Matches pattern[k:] against the instructions starting at p+k.
+    """
+    if k == len(pattern):
+        return binding
+    name, *tokens = pattern[k]
+    i_name, *values = instructions[p + k]
+    if i_name != name:
+        return None
+    orders = [values]
+    if name in COMMUTATIVE:
+        orders.append([values[1], values[0], values[2]])
+    for order in orders:
+        b = binding
+        for token, value in zip(tokens, order):
+            b = _match_value(token, value, p, b)
+            if b is None:
+                break
+        if b is not None:
+            result = _match(pattern, instructions, p, k + 1, b)
+            if result is not None:
+                return result
+    return None
+
+def match_pattern(pattern, instructions, p, ip_register):
+    """
+    Tries to match the pattern at address p. Returns the role
+    bindings (role name to register/constant) or None.
+    """
+    if p + len(pattern) > len(instructions):
+        return None
+    binding = _match(pattern, instructions, p, 0, {'IP': ip_register})
+    if binding is None:
+        return None
+    del binding['IP']
+    return {k.lstrip('#'): v for k, v in binding.items()}
+
+def find_loops(instructions, ip_register):
+    """
+    Returns {address: (macro_factory, exit_address, binding)} for all
+    recognised loops.
+    """
+    loops = {}
+    if ip_register is None:
+        return loops
+    for p in range(len(instructions)):
+        for pattern, factory in LOOP_PATTERNS:
+            binding = match_pattern(pattern, instructions, p, ip_register)
+            if binding is not None:
+                loops[p] = (factory, p + len(pattern), binding)
+    return loops
+
+
+class ElfCPU:
+    """
+    Runs an elfcode program compiled into closures.
+    """
+
+    def __init__(self, program_txt, registers=None, detect_loops=True):
+        self.ip_register, self.instructions = parse(program_txt)
+        self.registers = [0]*NUM_REGISTERS
+        if registers:
+            self.registers[:len(registers)] = registers
+        self.ip = 0
+        self.num_steps = 0
+        self._resume = False
+        self.ops = [compile_instruction(*i, self.registers) for i in self.instructions]
+        self.loops = {}
+        if detect_loops:
+            self.loops = find_loops(self.instructions, self.ip_register)
+            for p, (factory, exit_ip, binding) in self.loops.items():
+                self.ops[p] = factory(self.registers, self.ip_register, exit_ip, **binding)
+
+    def run(self, breakpoints=()):
+        """
+        Runs until the program halts (returns False) or an address
+        in 'breakpoints' is reached (returns True). A breakpoint stops
+        before its instruction is executed, calling run() again resumes.
+        """
+        r = self.registers
+        ops = self.ops
+        ipr = self.ip_register
+        num_ops = len(ops)
+        stops = [False]*num_ops
+        for b in breakpoints:
+            stops[b] = True
+        ip = self.ip
+        num_steps = self.num_steps
+        resume = self._resume
+        hit = False
+        while 0 <= ip < num_ops:
+            if stops[ip] and not resume:
+                hit = True
+                break
+            resume = False
+            r[ipr] = ip
+            ops[ip]()
+            ip = r[ipr] + 1
+            num_steps += 1
+        self.ip = ip
+        self.num_steps = num_steps
+        self._resume = hit
+        return hit
@@ -0,0 +1,72 @@
+# Advent of code - 2018
+#
+# Summed-area table (integral image), used by day 11
+#
+# Pieter Kitslaar
+#
+# table[r, c] holds the sum of all values above and left of (r, c),
+# with a row and column of zeros in front, so the sum of any
+# rectangle takes four lookups and all windows of one size are
+# four shifted slices of the table.
+#
+
+import numpy as np
+
+class SummedAreaTable:
+    def __init__(self, values):
+        values = np.asarray(values)
+        self.shape = values.shape
+        height, width = self.shape
+        self.table = np.zeros((height + 1, width + 1), dtype=np.int64)
+        self.table[1:, 1:] = values.cumsum(axis=0).cumsum(axis=1)
+        self.max_value = int(values.max())
+
+    def sum(self, row, col, height, width):
+        """
+        Returns the sum of the rectangle with top left (row, col).
+        """
+        t = self.table
+        return int(t[row + height, col + width] - t[row, col + width]
+                   - t[row + height, col] + t[row, col])
+
+    def window_sums(self, height, width=None):
+        """
+        Returns the sums of all height x width windows that fit in
+        the grid, indexed by the (row, col) of their top left.
+        """
+        width = height if width is None else width
+        t = self.table
+        return t[height:, width:] - t[:-height, width:] - t[height:, :-width] + t[:-height, :-width]
+
+    def best_window(self, height, width=None):
+        """
+        Returns (row, col, sum) of the window with the highest sum.
+        """
+        sums = self.window_sums(height, width)
+        row, col = np.unravel_index(np.argmax(sums), sums.shape)
+        return int(row), int(col), int(sums[row, col])
+
+    def best_square(self, min_size=1, max_size=None):
+        """
+        Returns (row, col, size, sum) of the square with the highest sum
+        over all sizes from min_size to max_size (default the grid size).
+
+        Stops early when no larger square can beat the best one: a square
+        of size s holds q*q disjoint squares of a smaller size k (q = s//k),
+        which sum to at most q*q times the best k square, and the other
+        s*s - q*q*k*k cells are each at most the largest value.
+        """
+        max_size = min(self.shape) if max_size is None else max_size
+        sizes = np.arange(max_size + 1, dtype=np.int64)
+        # upper bound of the best sum per size, from the sizes seen so far
+        bound = np.full(max_size + 1, np.iinfo(np.int64).max)
+        best = None
+        for size in range(min_size, max_size + 1):
+            row, col, total = self.best_window(size)
+            if best is None or total > best[3]:
+                best = (row, col, size, total)
+            q = sizes // size
+            bound = np.minimum(bound, q*q*total + (sizes*sizes - q*q*size*size)*self.max_value)
+            if size < max_size and bound[size+1:].max() <= best[3]:
+                break
+        return best
@@ -3,7 +3,7 @@ Day 5 puzzle - Advent of Code 2019
 Pieter Kitslaar
 """
 from pathlib import Path
-POSITION_MODE, IMMEDIATE_MODE, RELATIVE_MODE = range(3)
+from intcode import IntcodeMachine, POSITION_MODE, IMMEDIATE_MODE, RELATIVE_MODE
 
 def txt_values(txt):
     return [int(v) for v in txt.split(',')]
@@ -13,6 +13,31 @@ def default_input_provider(input_v):
         return input_v
     return get_v
 
+def debug_trace(input_v):
+    def trace(machine, current_pos, relative_base, ins):
+        values = machine.memory()
+        print(input_v(), relative_base, ["{0}{1}".format(v, ['','*'][i==current_pos]) for i,v in enumerate(values)], ins[0], ins[1::2])
+    return trace
+
+def run(in_values, input_v=0, 
+                   noun_verb = None, assume_mode=POSITION_MODE, debug_output=False,
+                   output_cb=None, current_pos=0, relative_base=0, stop_on_output=True):
+
+    if isinstance(input_v, int):
+        input_v = default_input_provider(input_v)
+    machine = IntcodeMachine(in_values, ip=current_pos, relative_base=relative_base, assume_mode=assume_mode)
+    if noun_verb:
+        noun, verb = noun_verb
+        machine[1] = noun
+        machine[2] = verb
+
+    machine.run(input_v, output_cb=output_cb, stop_on_output=stop_on_output and output_cb is not None, 
+                trace=debug_trace(input_v) if debug_output else None)
+    return machine.ip, machine.memory(), machine.outputs
+
+# The original step-by-step interpreter, kept as reference
+# for cross checking and benchmarking the IntcodeMachine
+
 # Taken from: https://stackoverflow.com/a/4544699/4166
 class GrowingList(list):
     def __grow(self, index):
@@ -30,7 +55,7 @@ class GrowingList(list):
         self.__grow(index)
         return list.__getitem__(self, index)
 
-def run(in_values, input_v=0, 
+def run_legacy(in_values, input_v=0, 
                    noun_verb = None, assume_mode=POSITION_MODE, debug_output=False,
                    output_cb=None, current_pos=0, relative_base=0, stop_on_output=True):
 
@@ -145,7 +170,7 @@ def run(in_values, input_v=0,
                 raise ValueError(f"Invalid op_code {op_code} at position {current_pos}")
         elif op_code == 99:
             break
-        
+
     return current_pos, values, outputs
 
 def compute_run2(code, input_v, assume_mode=POSITION_MODE, debug_output=False):
@@ -213,6 +238,61 @@ def test_large_example():
     assert(compute_run2(large_data, input_v=8) == 1000) # equal 8
     assert(compute_run2(large_data, input_v=9) == 1001) # above 8
 
+def test_self_modifying():
+    # the input is written into the parameter of the next instruction
+    program = [3,3,1108,-1,8,3,4,3,99]
+    machine = IntcodeMachine(program)
+    machine.run(default_input_provider(8))
+    assert(machine.outputs == [1])
+    assert(machine.memory() == run_legacy(program, input_v=8)[1])
+
+def test_matches_legacy():
+    large_data = [3,21,1008,21,8,20,1005,20,22,107,8,21,20,1006,20,31,
+    1106,0,36,98,0,0,1002,21,125,20,4,20,1105,1,46,104,
+    999,1105,1,46,1101,1000,1,20,4,20,1105,1,46,98,99]
+    for input_v in range(5, 12):
+        assert(run(large_data, input_v=input_v) == run_legacy(large_data, input_v=input_v))
+
+def test_resume_and_snapshot():
+    # doubles every input value, uses relative mode so the
+    # relative base has to survive resumption
+    program = [109,20,203,0,21202,0,2,1,204,1,1105,1,2,99]
+    machine = IntcodeMachine(program)
+    assert(machine.run_until_output() is None)
+    machine.feed((3,))
+    assert(machine.run_until_output() == 6)
+    snapshot = machine.snapshot()
+    machine.feed((5, 7))
+    assert(machine.run_until_input_needed() == [10, 14])
+    machine.restore(snapshot)
+    assert(machine.outputs == [6])
+    machine.feed((1,))
+    assert(machine.run_until_output() == 2)
+    # a snapshot is a regular machine, restoring from anything else fails
+    assert(snapshot.outputs == [6])
+    try:
+        machine.restore(machine.fork())
+    except ValueError:
+        pass
+    else:
+        assert False, 'restore() accepted a fork'
+
+def test_fork():
+    program = [109,20,203,0,21202,0,2,1,204,1,1105,1,2,99]
+    parent = IntcodeMachine(program)
+    parent.feed((3,))
+    assert(parent.run_until_output() == 6)
+    child = parent.fork()
+    child.feed((5,))
+    assert(child.run_until_output() == 10)
+    assert(child[20] == 5)
+    # the parent is not affected by the child
+    assert(parent[20] == 3)
+    parent.feed((4,))
+    assert(parent.run_until_output() == 8)
+    assert(parent.outputs == [6, 8])
+    assert(child.outputs == [6, 10])
+
 def get_valid_output(output):
     if (all(v == 0 for v in output[:-1])):
         return output[-1]
@@ -0,0 +1,322 @@
+"""
+Intcode engine - Advent of Code 2019
+Pieter Kitslaar
+
+Every instruction is decoded once and cached per address. Writes into
+memory invalidate the cached decodings that cover the written cell, so
+self-modifying programs keep working.
+
+Memory is a flat pre-sized list of ints, addresses beyond that
+buffer end up in a sparse dict.
+
+The machine can be driven with callbacks (see day_05.run) or
+resumed through its input queue:
+
+    machine = IntcodeMachine(program)
+    machine.feed([1, 2])
+    value = machine.run_until_output()
+
+Forks and snapshots share the memory buffers copy-on-write, the
+buffers are only copied once one of the sharing machines runs
+or writes.
+"""
+from collections import deque
+
+POSITION_MODE, IMMEDIATE_MODE, RELATIVE_MODE = range(3)
+
+HALTED, OUTPUT, NEED_INPUT = range(3)
+
+# number of parameters per op code
+NUM_PARAMS = {1: 3, 2: 3, 3: 1, 4: 1, 5: 2, 6: 2, 7: 3, 8: 3, 9: 1, 99: 0}
+
+# extra (zero) memory allocated after the program
+MEMORY_HEADROOM = 4096
+
+# a single instruction spans at most 4 cells, so a write at address
+# 'a' can affect the decodings starting at a-3 .. a
+_INVALID = (None,)*4
+_CODE_OFFSET = 3
+
+
+def decode(op_word, assume_mode=POSITION_MODE):
+    """
+    Splits an op word like 1002 into (op_code, mode_1, mode_2, mode_3).
+    """
+    op_code = op_word % 100
+    if op_word < 100:
+        return op_code, assume_mode, assume_mode, assume_mode
+    return op_code, (op_word // 100) % 10, (op_word // 1000) % 10, (op_word // 10000) % 10
+
+
+class IntcodeMachine:
+    def __init__(self, program, ip=0, relative_base=0, assume_mode=POSITION_MODE):
+        size = len(program) + MEMORY_HEADROOM
+        self._size = size
+        self._program_length = len(program)
+        self._mem = list(program) + [0]*MEMORY_HEADROOM
+        self._extra = {}
+        # decoded instructions, shifted by _CODE_OFFSET so that
+        # invalidation never needs a bounds check
+        self._code = [None]*(size + _CODE_OFFSET + 1)
+        # number of machines sharing the buffers above
+        self._shared = [1]
+        self.assume_mode = assume_mode
+        self.ip = ip
+        self.relative_base = relative_base
+        self.inputs = deque()
+        self.outputs = []
+        self.halted = False
+
+    def __getitem__(self, address):
+        if address < self._size:
+            return self._mem[address]
+        return self._extra.get(address, 0)
+
+    def __setitem__(self, address, value):
+        self._own()
+        if address < self._size:
+            self._mem[address] = value
+            self._code[address:address+4] = _INVALID
+        else:
+            self._extra[address] = value
+
+    def memory(self):
+        """
+        Returns the memory as plain list. Trailing zeros beyond
+        the original program are stripped.
+        """
+        values = self._mem[:]
+        if self._extra:
+            max_address = max(self._extra)
+            values.extend([0]*(max_address + 1 - len(values)))
+            for address, v in self._extra.items():
+                values[address] = v
+        end = len(values)
+        while end > self._program_length and values[end-1] == 0:
+            end -= 1
+        del values[end:]
+        return values
+
+    def feed(self, values):
+        """
+        Appends values to the input queue.
+        """
+        self.inputs.extend(values)
+
+    def run_until_output(self):
+        """
+        Runs until the next output and returns it. Returns None if
+        the machine halted or needs more input.
+        """
+        if self.run(stop_on_output=True) == OUTPUT:
+            return self.outputs[-1]
+        return None
+
+    def run_until_input_needed(self):
+        """
+        Runs until the input queue is exhausted or the machine halts
+        and returns the outputs produced in the mean time.
+        """
+        start = len(self.outputs)
+        self.run()
+        return self.outputs[start:]
+
+    def _own(self):
+        """
+        Makes private copies of the buffers if they are shared.
+        """
+        if self._shared[0] > 1:
+            self._shared[0] -= 1
+            self._shared = [1]
+            self._mem = self._mem[:]
+            self._extra = dict(self._extra)
+            self._code = self._code[:]
+
+    def _share(self, other):
+        """
+        Shares the buffers and registers of 'other' with this machine.
+        """
+        self._size = other._size
+        self._program_length = other._program_length
+        self._mem = other._mem
+        self._extra = other._extra
+        self._code = other._code
+        self._shared = other._shared
+        self._shared[0] += 1
+        self.assume_mode = other.assume_mode
+        self.ip = other.ip
+        self.relative_base = other.relative_base
+        self.inputs = deque(other.inputs)
+        self.halted = other.halted
+
+    def fork(self):
+        """
+        Returns an independent copy of this machine, including
+        pending input and produced outputs.
+        """
+        child = IntcodeMachine.__new__(IntcodeMachine)
+        child._share(self)
+        child.outputs = self.outputs[:]
+        return child
+
+    def snapshot(self):
+        """
+        Captures the full state of the machine, see restore().
+        """
+        frozen = IntcodeMachine.__new__(IntcodeMachine)
+        frozen._share(self)
+        frozen.outputs = self.outputs[:]
+        frozen._num_outputs = len(self.outputs)
+        return frozen
+
+    def restore(self, snapshot):
+        """
+        Resets the machine to a state captured by snapshot(). Outputs
+        produced after the snapshot was taken are discarded.
+        """
+        num_outputs = getattr(snapshot, '_num_outputs', None)
+        if num_outputs is None:
+            raise ValueError("Can only restore a machine from a snapshot()")
+        self._shared[0] -= 1
+        self._share(snapshot)
+        del self.outputs[num_outputs:]
+
+    def predecode(self):
+        """
+        Decodes the program with a linear sweep, so forks share the
+        decoded instructions. Words that are no valid instruction are
+        skipped, those (and misaligned) addresses are decoded on demand.
+        """
+        self._own()
+        ip = 0
+        while ip < self._program_length:
+            num_params = NUM_PARAMS.get(self[ip] % 100)
+            if num_params is None:
+                ip += 1
+            else:
+                self._decode(ip)
+                ip += 1 + num_params
+        return self
+
+    def _decode(self, ip):
+        op_code, m1, m2, m3 = decode(self[ip], self.assume_mode)
+        num_params = NUM_PARAMS.get(op_code)
+        if num_params is None:
+            raise ValueError(f"Invalid op_code {op_code} at position {ip}")
+        params = [self[ip+i] for i in range(1, num_params + 1)]
+        params.extend([0]*(3-num_params))
+        ins = (op_code, m1, params[0], m2, params[1], m3, params[2])
+        if ip < self._size:
+            self._code[ip + _CODE_OFFSET] = ins
+        return ins
+
+    def run(self, input_v=None, output_cb=None, stop_on_output=False, trace=None):
+        """
+        Runs the program until it halts, or until an output is produced
+        when 'stop_on_output' is set. Input values are taken by calling
+        'input_v()' or, if no 'input_v' is given, from the input queue.
+        Outputs are appended to self.outputs and passed to 'output_cb'
+        (if given).
+
+        Returns HALTED, OUTPUT or NEED_INPUT (when the input queue is empty).
+        """
+        if self.halted:
+            return HALTED
+        self._own()
+        mem = self._mem
+        extra = self._extra
+        code = self._code
+        size = self._size
+        inputs = self.inputs
+        outputs = self.outputs
+        ip = self.ip
+        rb = self.relative_base
+        status = HALTED
+        while True:
+            ins = code[ip + _CODE_OFFSET]
+            if ins is None:
+                ins = self._decode(ip)
+            op, m1, p1, m2, p2, m3, p3 = ins
+            if trace is not None:
+                trace(self, ip, rb, ins)
+
+            if op == 99:
+                self.halted = True
+                break
+
+            # first parameter, read as value (not for input)
+            if op != 3:
+                if m1 == 1:
+                    a = p1
+                else:
+                    if m1 == 2:
+                        p1 += rb
+                    a = mem[p1] if p1 < size else extra.get(p1, 0)
+
+            if op == 1 or op == 2 or op == 7 or op == 8:
+                if m2 == 1:
+                    b = p2
+                else:
+                    if m2 == 2:
+                        p2 += rb
+                    b = mem[p2] if p2 < size else extra.get(p2, 0)
+                if op == 1:
+                    v = a + b
+                elif op == 2:
+                    v = a * b
+                elif op == 7:
+                    v = 1 if a < b else 0
+                else:
+                    v = 1 if a == b else 0
+                if m3 == 2:
+                    p3 += rb
+                if p3 < size:
+                    mem[p3] = v
+                    code[p3:p3+4] = _INVALID
+                else:
+                    extra[p3] = v
+                ip += 4
+            elif op == 5 or op == 6:
+                if (a != 0) == (op == 5):
+                    if m2 == 1:
+                        ip = p2
+                    else:
+                        if m2 == 2:
+                            p2 += rb
+                        ip = mem[p2] if p2 < size else extra.get(p2, 0)
+                else:
+                    ip += 3
+            elif op == 9:
+                rb += a
+                ip += 2
+            elif op == 4:
+                outputs.append(a)
+                ip += 2
+                if output_cb is not None:
+                    output_cb(a)
+                if stop_on_output:
+                    status = OUTPUT
+                    break
+            else: # op == 3
+                if input_v is None:
+                    if not inputs:
+                        status = NEED_INPUT
+                        break
+                    v = inputs.popleft()
+                else:
+                    # store the state, the input provider might inspect it
+                    self.ip = ip
+                    self.relative_base = rb
+                    v = input_v()
+                if m1 == 2:
+                    p1 += rb
+                if p1 < size:
+                    mem[p1] = v
+                    code[p1:p1+4] = _INVALID
+                else:
+                    extra[p1] = v
+                ip += 2
+
+        self.ip = ip
+        self.relative_base = rb
+        return status
@@ -6,64 +6,32 @@ assert(d5_dir.exists())
 sys.path.append(str(d5_dir))
 
 from day_05 import run, txt_values
+from intcode import IntcodeMachine
+import time
 
 def test_intcode_basic():
     for in_, out_ in [("1,9,10,3,2,3,11,0,99,30,40,50", "3500,9,10,70,2,3,11,0,99,30,40,50"),]:
         assert(txt_values(out_) == run(txt_values(in_))[1])
 
 
-class Amp:
-    def __init__(self, program, initial_values = None):
-        self.program = program[:]
-        self.position = 0
-        self.outputs = []
-        self.values = []
-        if initial_values:
-            self.values.extend(initial_values)
-
-    def add_value(self, add_v):
-        self.values.append(add_v)
-    
-    def __call__(self):
-        v = self.values.pop(0)
-        return v
-    
-    def run(self, output_cb=None):
-        self.position, self.program, self.outputs = run(
-            self.program, 
-            input_v=self, 
-            output_cb=output_cb, 
-            current_pos=self.position)
-        return self.outputs
-    
-    
-def run_amp(program_code, inputs, output_cb=None):
-    _, output = run(program_code[:], input_v=inputs, output_cb=output_cb)
-    return output[-1]
-
-
 def check_thrusters(program_code, phase_settings, feedback=False):
-    amp_a = Amp(program_code, [phase_settings[0], 0])
-    amp_b = Amp(program_code, [phase_settings[1]])
-    amp_c = Amp(program_code, [phase_settings[2]])
-    amp_d = Amp(program_code, [phase_settings[3]])
-    amp_e = Amp(program_code, [phase_settings[4]])
-
-    output_e = []
-    prev_amp_a_in = None
+    amps = [IntcodeMachine(program_code) for _ in phase_settings]
+    for amp, phase in zip(amps, phase_settings):
+        amp.feed((phase,))
+
+    signal = 0
+    thruster_signal = None
     while True:
-        amp_a.run(output_cb=amp_b.add_value)
-        amp_b.run(output_cb=amp_c.add_value)
-        amp_c.run(output_cb=amp_d.add_value)
-        amp_d.run(output_cb=amp_e.add_value)
-        amp_e.run(output_cb=amp_a.add_value if feedback else output_e.append)
-        if feedback:
-            if amp_a.values == prev_amp_a_in:
-                break
-            prev_amp_a_in = amp_a.values[:] 
-        else:
-            break
-    return amp_a.values[-1] if feedback else output_e[0]
+        for amp in amps:
+            amp.feed((signal,))
+            signal = amp.run_until_output()
+            if signal is None:
+                # amplifiers halted, the last signal
+                # of amp E goes to the thrusters
+                return thruster_signal
+        thruster_signal = signal
+        if not feedback:
+            return thruster_signal
 
 
 from itertools import permutations
@@ -117,8 +85,25 @@ def main():
     print('Part 2', part2_sol[0])
     assert(7818398 == part2_sol[0])
 
+def benchmark():
+    """
+    Times the feedback loop over all 120 phase permutations of part 2.
+    """
+    with open(Path(__file__).parent / 'input.txt', 'r') as f:
+        data = txt_values(f.read())
+    num_runs = 10
+    t0 = time.perf_counter()
+    for _ in range(num_runs):
+        part2_sol = find_max_feedback(data)
+    t_total = (time.perf_counter() - t0) / num_runs
+    assert(7818398 == part2_sol[0])
+    print(f'120 permutations: {1000*t_total:.1f}ms ({1e6*t_total/120:.0f}us per permutation)')
+
 if __name__ == "__main__":
-    main()
+    if 'bench' in sys.argv[1:]:
+        benchmark()
+    else:
+        main()
 
 
 
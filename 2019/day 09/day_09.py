@@ -7,7 +7,9 @@ from pathlib import Path
 d5_dir = Path(__file__).parents[1] / 'day 05'
 assert(d5_dir.exists())
 sys.path.append(str(d5_dir))
-from day_05 import run, txt_values
+from day_05 import run, run_legacy, txt_values, default_input_provider
+from intcode import IntcodeMachine
+import time
 
 def test_intcode_basic():
     for in_, out_ in [("1,9,10,3,2,3,11,0,99,30,40,50", "3500,9,10,70,2,3,11,0,99,30,40,50"),]:
@@ -39,5 +41,37 @@ def main():
     print('Part 2:', part2_output[0])
     assert(81348 == part2_output[0])
 
+def benchmark():
+    """
+    Compares the steps/second of the original interpreter and
+    the IntcodeMachine on the BOOST program (part 2).
+    """
+    with open(Path(__file__).parent / 'input.txt', 'r') as f:
+        data = txt_values(f.read())
+
+    num_steps = 0
+    def count_step(*args):
+        nonlocal num_steps
+        num_steps += 1
+    IntcodeMachine(data).run(default_input_provider(2), trace=count_step)
+
+    t0 = time.perf_counter()
+    _, _, legacy_output = run_legacy(data, input_v=2)
+    t_legacy = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    machine = IntcodeMachine(data)
+    machine.run(default_input_provider(2))
+    t_machine = time.perf_counter() - t0
+
+    assert(legacy_output == machine.outputs)
+    print('Steps:', num_steps)
+    print(f'run_legacy     {t_legacy:.3f}s {num_steps/t_legacy:12.0f} steps/s')
+    print(f'IntcodeMachine {t_machine:.3f}s {num_steps/t_machine:12.0f} steps/s')
+    print(f'Speedup: {t_legacy/t_machine:.1f}x')
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if 'bench' in sys.argv[1:]:
+        benchmark()
+    else:
+        main()
\ No newline at end of file
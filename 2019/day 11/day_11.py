@@ -8,6 +8,7 @@ d5_dir = Path(__file__).parents[1] / 'day 05'
 assert(d5_dir.exists())
 sys.path.append(str(d5_dir))
 from day_05 import run, txt_values
+from intcode import IntcodeMachine
 
 def test_intcode_basic():
     for in_, out_ in [("1,9,10,3,2,3,11,0,99,30,40,50", "3500,9,10,70,2,3,11,0,99,30,40,50"),]:
@@ -62,6 +63,14 @@ class Robot:
 
         return "\n".join(["".join(r) for r in grid])
     
+    def drive(self, program):
+        """Runs the program, feeding the color under the robot as input"""
+        machine = IntcodeMachine(program)
+        while not machine.halted:
+            machine.feed((self.get_v(),))
+            for v in machine.run_until_input_needed():
+                self(v)
+
     def get_v(self):
         return self.panel_colors.get(self.current_pos, BLACK)
     
@@ -116,14 +125,14 @@ def main():
         main_program = txt_values(f.read())
 
     part1_robot = Robot()
-    part1_output = run(main_program, input_v=part1_robot.get_v, output_cb=part1_robot, stop_on_output=False)
+    part1_robot.drive(main_program)
     part1_solution = len(part1_robot.panel_colors)
     print('Part 1:', part1_solution)
     assert(2478 == part1_solution)
 
     part2_robot = Robot()
     part2_robot.panel_colors[(0,0)] = WHITE
-    part2_output = run(main_program, input_v=part2_robot.get_v, output_cb=part2_robot, stop_on_output=False)
+    part2_robot.drive(main_program)
     part2_solution = part2_robot.print_grid(width=-1, height=-1)
     print('Part 2:\n', part2_solution)
     assert(part2_expexted == part2_solution)
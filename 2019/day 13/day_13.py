@@ -8,6 +8,7 @@ d5_dir = Path(__file__).parents[1] / 'day 05'
 assert(d5_dir.exists())
 sys.path.append(str(d5_dir))
 from day_05 import run, txt_values
+from intcode import IntcodeMachine
 
 def test_intcode_basic():
     for in_, out_ in [("1,9,10,3,2,3,11,0,99,30,40,50", "3500,9,10,70,2,3,11,0,99,30,40,50"),]:
@@ -75,7 +76,8 @@ def main():
         puzzle_data = txt_values(f.read())
 
     game = Arcade()
-    run(puzzle_data[:], output_cb=game.receive_output, stop_on_output=False)
+    for v in IntcodeMachine(puzzle_data).run_until_input_needed():
+        game.receive_output(v)
     game.print_screen()
     part1_sol = len([t for t in game.tiles.values() if t == BLOCK])
     print('Part 1:', part1_sol)
@@ -87,7 +89,13 @@ def main():
     print('*'*80)
     print('PART 2')
     game = Arcade()
-    run(part2_data, input_v=game.move_joystick, output_cb=game.receive_output, stop_on_output=False)
+    machine = IntcodeMachine(part2_data)
+    while True:
+        for v in machine.run_until_input_needed():
+            game.receive_output(v)
+        if machine.halted:
+            break
+        machine.feed((game.move_joystick(),))
     game.print_screen()
 
 if __name__ == "__main__":
@@ -4,6 +4,8 @@ d5_dir = Path(__file__).parents[1] / 'day 05'
 assert(d5_dir.exists())
 sys.path.append(str(d5_dir))
 from day_05 import run, txt_values
+from intcode import IntcodeMachine
+from collections import deque
 
 def test_intcode_basic():
     for in_, out_ in [("1,9,10,3,2,3,11,0,99,30,40,50", "3500,9,10,70,2,3,11,0,99,30,40,50"),]:
@@ -147,6 +149,31 @@ class DroidControl():
 
 
 
+def explore(program):
+    """
+    Breadth first exploration of the area. The droid program is forked
+    at every reached cell, so no moves have to be replayed to backtrack.
+
+    Returns a DroidControl with the complete map and the oxygen position.
+    """
+    dc = DroidControl()
+    front = deque([((0,0), IntcodeMachine(program))])
+    while front:
+        pos, machine = front.popleft()
+        for direction, step in MOVE_NAME_TO_DIFF.items():
+            next_pos = pos[0]+step[0], pos[1]+step[1]
+            if next_pos in dc.map:
+                continue
+            droid = machine.fork()
+            droid.feed((direction,))
+            v = droid.run_until_output()
+            dc.map[next_pos] = v
+            if v == OXYGEN:
+                dc.oxyen_pos = next_pos
+            if v != WALL:
+                front.append((next_pos, droid))
+    return dc
+
 def test_simple_grid():
     dc = DroidControl()
     dc.draw()
@@ -185,11 +212,7 @@ def main():
     with open(Path(__file__).parent / 'input.txt', 'r') as f:
         main_program = txt_values(f.read())
 
-    dc = DroidControl(mode = EXPLORE_MODE)
-    try:
-        run(main_program, input_v=dc.send_next_move, output_cb=dc.receive_status, stop_on_output=False)
-    except ExplorationFinished:
-        pass
+    dc = explore(main_program)
     #dc.draw()
     arrival = dc.create_arrival_map()
     print('Part 1:', arrival[dc.oxyen_pos])
@@ -4,7 +4,11 @@ d5_dir = Path(__file__).resolve().parents[1] / 'day 05'
 assert(d5_dir.exists())
 sys.path.append(str(d5_dir))
 from day_05 import run, txt_values
+from intcode import IntcodeMachine
 from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import os
+import time
 
 def test_intcode_basic():
     for in_, out_ in [("1,9,10,3,2,3,11,0,99,30,40,50", "3500,9,10,70,2,3,11,0,99,30,40,50"),]:
@@ -16,22 +20,62 @@ def droid_deploy(values):
             return next(i)
         return get_v
 
-def part1():
+def read_program():
     with open(Path(__file__).parent / 'input.txt', 'r') as f:
-        main_program = txt_values(f.read())
+        return txt_values(f.read())
+
+class BeamProbe:
+    """
+    Deploys drones from a single predecoded program, 
+    every probe runs on a copy-on-write fork.
+    """
+    def __init__(self, program):
+        self.machine = IntcodeMachine(program).predecode()
+    
+    def __call__(self, x, y):
+        drone = self.machine.fork()
+        drone.feed((x, y))
+        return drone.run_until_output()
+
+_worker_probe = None
+
+def _init_worker(program):
+    global _worker_probe
+    _worker_probe = BeamProbe(program)
+
+def _probe_chunk(coords):
+    return [_worker_probe(x, y) for x, y in coords]
+
+def probe_batch(program, coords, max_workers=None):
+    """
+    Returns the drone value for every (x, y) in coords, evaluated
+    across a process pool. Each worker predecodes the program once.
+    """
+    coords = list(coords)
+    num_workers = max_workers or os.cpu_count() or 1
+    chunk_size = max(1, -(-len(coords) // num_workers))
+    chunks = [coords[i:i+chunk_size] for i in range(0, len(coords), chunk_size)]
+    if num_workers == 1 or len(chunks) == 1:
+        _init_worker(program)
+        return _probe_chunk(coords)
+    with ProcessPoolExecutor(num_workers, initializer=_init_worker, initargs=(program,)) as pool:
+        return [v for chunk_values in pool.map(_probe_chunk, chunks) for v in chunk_values]
 
-    def area_generator(width, height):
-        for x in range(width):
-            for y in range(height):
-                yield x,y
+def area_generator(width, height):
+    for x in range(width):
+        for y in range(height):
+            yield x,y
+
+def part1():
+    main_program = read_program()
     
     w, h = 50,50
     grid = [[' ']*w for _ in range(h)]
+    coords = list(area_generator(w,h))
     num_affected = 0
-    for x,y in area_generator(w,h):
-        _, _, output = run(main_program, input_v = droid_deploy((x,y)), stop_on_output=False)
-        grid[y][x] = output[-1]
-        if output[-1] > 0:
+    for (x,y), v in zip(coords, probe_batch(main_program, coords)):
+        grid[y][x] = v
+        if v > 0:
             num_affected += 1
     print('\n'.join([''.join(map(str,r)) for r in grid]))
     print('Part 1:', num_affected)
@@ -57,13 +101,13 @@ OUTSIDE, LEFT, RIGHT = range(3)
 
 class IntCodeDroidControl:
     def __init__(self):
-        with open(Path(__file__).parent / 'input.txt', 'r') as f:
-           self.main_program = txt_values(f.read())
+        self.main_program = read_program()
+        self.probe = BeamProbe(self.main_program)
+        self.num_probes = 0
     
     def get_droid_value(self, x, y):
-        _,_, output = run(self.main_program, input_v=droid_deploy((x,y)))
-        v = output[-1]
-        return v
+        self.num_probes += 1
+        return self.probe(x, y)
 
 part2_example="""\
 #.......................................
@@ -218,20 +262,70 @@ def solve_part2(start_pos, droid_control, ship_size):
         front, next_front = next_front, front
     return values
 
+def solve_part2_edges(start_pos, droid_control, ship_size):
+    """
+    Tracks the left edge of the beam row by row. With the bottom left
+    corner of the ship on that edge, only the opposite top right corner
+    has to be probed. 'start_pos' should be inside the beam and every
+    row below it should hit the beam.
+    """
+    def in_beam(x, y):
+        return droid_control.get_droid_value(x, y) > 0
+
+    left, y = start_pos
+    while True:
+        y += 1
+        while not in_beam(left, y):
+            left += 1
+        upper_y = y - (ship_size-1)
+        if upper_y >= start_pos[1] and in_beam(left + ship_size - 1, upper_y):
+            return 10000*left + upper_y
+
 def test_part_2_example():
     dc = GridDroidControl(part2_example)
     v = solve_part2(start_pos=(1,1), droid_control=dc, ship_size=10)
     print(v)
     assert(250020 == v)
+    assert(250020 == solve_part2_edges(start_pos=(1,1), droid_control=dc, ship_size=10))
 
 def part2():
     sp = (5,7)
     dc = IntCodeDroidControl()
-    v = solve_part2(start_pos=sp, droid_control=dc, ship_size=100)
+    v = solve_part2_edges(start_pos=sp, droid_control=dc, ship_size=100)
     print('Part 2:', v)
     assert(9441282 == v)
 
+def benchmark():
+    main_program = read_program()
+
+    # Part 1: one fresh run per probe vs batched probes
+    coords = list(area_generator(50, 50))
+    t0 = time.perf_counter()
+    sequential = [run(main_program, input_v=droid_deploy(c), stop_on_output=False)[2][-1] for c in coords]
+    t_sequential = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    batched = probe_batch(main_program, coords, max_workers=1)
+    t_batched = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    parallel = probe_batch(main_program, coords)
+    t_parallel = time.perf_counter() - t0
+    assert(sequential == batched == parallel)
+    print(f'Part 1 ({len(coords)} probes): run() {t_sequential:.2f}s, '
+          f'batch {t_batched:.2f}s, batch parallel {t_parallel:.2f}s')
+
+    # Part 2: scanning vs edge tracking
+    for name, solver in [('scan', solve_part2), ('edges', solve_part2_edges)]:
+        dc = IntCodeDroidControl()
+        t0 = time.perf_counter()
+        v = solver(start_pos=(5,7), droid_control=dc, ship_size=100)
+        t = time.perf_counter() - t0
+        assert(9441282 == v)
+        print(f'Part 2 {name:5}: {dc.num_probes} probes, {t:.2f}s')
+
 
 if __name__ == "__main__":
-    part1()
-    part2()
\ No newline at end of file
+    if 'bench' in sys.argv[1:]:
+        benchmark()
+    else:
+        part1()
+        part2()
\ No newline at end of file
@@ -3,131 +3,95 @@ from pathlib import Path
 d5_dir = Path(__file__).parents[1] / 'day 05'
 assert(d5_dir.exists())
 sys.path.append(str(d5_dir))
-from day_05 import run, txt_values
+from day_05 import txt_values
+from intcode import IntcodeMachine
 
 
 with open(Path(__file__).parent / 'input.txt', 'r') as f:
     main_program = txt_values(f.read())
 
-import threading
-import queue
-import time
+from collections import deque
 
-class StopComputation(Exception):
-    pass
+NAT_ADDRESS = 255
 
 class Computer():
+    """
+    Network computer that runs until it blocks on input.
+    """
 
-    def __init__(self, address, all_queues):
+    def __init__(self, address, program):
         self.address = address
-        self.send_adress = False
-        self.incoming_packets = all_queues[self.address]
-        self.outgoing_packets = all_queues
-        self.last_outgoing_packet = []
-        self.last_incoming_packet = []
-        self.all_received = []
-        self.num_send = 0
-        self.num_empty_queues = 0
+        self.machine = IntcodeMachine(program)
+        self.machine.feed((address,))
+        self.incoming_packets = deque()
+        self.outgoing_buffer = []
         self.idle = False
 
-    def log(self, *args):
-        #print(self.address, *args)
-        pass
-
-    def run(self):
-        try:
-            run(main_program[:], input_v=self.receive, output_cb=self.send, stop_on_output=False)
-        except StopComputation:
-            pass
-
-    def receive(self):
-        if not self.send_adress:
-            self.send_adress = True
-            self.log('sending adress', self.address)
-            return self.address
+    def step(self):
+        """
+        Delivers all queued packets (or -1 when there are none) and runs
+        until the next input is needed. Returns the sent packets.
+        """
+        if self.incoming_packets:
+            while self.incoming_packets:
+                self.machine.feed(self.incoming_packets.popleft())
+            received = True
         else:
-            if self.last_incoming_packet:
-                packet_part = self.last_incoming_packet[0]
-                del self.last_incoming_packet[0]
-                self.log('receiving packet part', packet_part)
-                return packet_part
-            else:
-                if self.incoming_packets.empty():
-                    #print(self.address, 'no incoming packets')
-                    self.idle = True
-                    time.sleep(0.01)
-                    return -1
-                else:
-                    self.idle = False
-                    packet_value = self.incoming_packets.get()
-                    if packet_value is None:
-                        self.log('stopping')
-                        raise StopComputation()
-                    self.last_incoming_packet = list(packet_value)
-                    self.all_received.append(packet_value)
-                    self.log('received packet', self.last_incoming_packet)
-                    return -1
-
-    def send(self, value):
-        self.log('send', value)
-        self.last_outgoing_packet.append(value)
-        if len(self.last_outgoing_packet) > 2:
-            adress_to_send_to = int(self.last_outgoing_packet[0])
-            self.log('adding packet to queue of adress', adress_to_send_to)
-            self.outgoing_packets[adress_to_send_to].put(tuple(self.last_outgoing_packet[1:]))
-            self.last_outgoing_packet = []
+            self.machine.feed((-1,))
+            received = False
+        self.outgoing_buffer.extend(self.machine.run_until_input_needed())
+        num_complete = len(self.outgoing_buffer) - len(self.outgoing_buffer) % 3
+        sent = [tuple(self.outgoing_buffer[i:i+3]) for i in range(0, num_complete, 3)]
+        del self.outgoing_buffer[:num_complete]
+        self.idle = not received and not sent
+        return sent
 
 class Network():
-
-    def __init__(self):
-
-        self.computer_queues = {i:queue.Queue() for i in range(50)}
-        self.computer_queues[255] = queue.Queue()
-        self.all_computers = [Computer(i, self.computer_queues) for i in range(50)]
-        self.threads = []
+    """
+    Round-robin scheduler that steps all computers in a single thread.
+    """
+
+    def __init__(self, program, num_computers=50):
+        self.all_computers = [Computer(i, program) for i in range(num_computers)]
+        self.nat_packets = []
+
+    def run_round(self):
+        """
+        Steps every computer once and routes the sent packets. Returns
+        True when the network is idle: no computer received or sent
+        anything and all queues are empty.
+        """
         for c in self.all_computers:
-            t = threading.Thread(target=c.run)
-            self.threads.append(t)
-            t.start()
-
-    def stop(self):   
-        for i in range(50):
-            q = self.computer_queues[i]
-            q.put(None)
-        for t in self.threads:
-            t.join()
+            for address, x, y in c.step():
+                if address == NAT_ADDRESS:
+                    self.nat_packets.append((x, y))
+                else:
+                    self.all_computers[address].incoming_packets.append((x, y))
+        return all(c.idle and not c.incoming_packets for c in self.all_computers)
 
 def part_1():
-    n = Network()
-    first_value = n.computer_queues[255].get()
-    n.stop()
+    n = Network(main_program)
+    while not n.nat_packets:
+        n.run_round()
+    first_value = n.nat_packets[0]
     print('Part 1', first_value[1])
+    return first_value[1]
 
 def part_2():
-    n = Network()
-    last_nat_value = None
+    n = Network(main_program)
     send_to_zero = []
     while True:
-            time.sleep(0.01)
-            while not n.computer_queues[255].empty():
-                last_nat_value = n.computer_queues[255].get()
-            if last_nat_value:
-                if all(n.all_computers[i].idle for i in range(50)):
-                    #print('Idle sending', last_nat_value)
-                    send_to_zero.append(last_nat_value)
-                    n.computer_queues[0].put(last_nat_value)
-                    last_nat_value = None
-                    if len(send_to_zero) > 1:
-                        if send_to_zero[-1][1] == send_to_zero[-2][1]:
-                            print('Part 2', send_to_zero[-1][1])
-                            n.stop()
-                            return
-
-
-
-
+        idle = n.run_round()
+        if idle and n.nat_packets:
+            last_nat_value = n.nat_packets[-1]
+            n.nat_packets.clear()
+            send_to_zero.append(last_nat_value)
+            n.all_computers[0].incoming_packets.append(last_nat_value)
+            if len(send_to_zero) > 1:
+                if send_to_zero[-1][1] == send_to_zero[-2][1]:
+                    print('Part 2', send_to_zero[-1][1])
+                    return send_to_zero[-1][1]
 
 if __name__ == "__main__":
     part_1()
     part_2()
-
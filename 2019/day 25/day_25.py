@@ -4,12 +4,22 @@ d5_dir = Path(__file__).parents[1] / 'day 05'
 assert(d5_dir.exists())
 sys.path.append(str(d5_dir))
 from day_05 import run, txt_values
+from intcode import IntcodeMachine
 
 import heapq
 import itertools
+from collections import deque
 
 DROID_MANUAL, DROID_AUTO = range(2)
 
+# Items that should not be picked-up
+IGNORE_ITEMS = {'infinite loop', 
+                'escape pod', 
+                'giant electromagnet',
+                'molten lava',
+                'photons',
+                }
+
 direction_to_opposite = {
     'north': 'south',
     'south': 'north',
@@ -49,162 +59,9 @@ class ManualControl(Strategy):
                 print('invalid command', command)
         return command
 
-class ExploreStrategy(Strategy):
-    """
-    This strategy explores all rooms and picks up all 'valid' items in the rooms.
-
-    Valid itesm are items not defined in the ignore items list.
-    """
-
-    def __init__(self):
-        # Items that should not be picked-up
-        self.ignore_items = {'infinite loop', 
-                            'escape pod', 
-                            'giant electromagnet',
-                            'molten lava',
-                            'photons',
-                            }
-
-    def next_command(self, droid, state):
-        """
-        Does one of three things
-        - pickup any valid item, or
-        - go to any unvisited room, or
-        - backtrack if all doors in the current room have been visited
-        """
-
-        command = None
-        # See if there are items to pick-up
-        valid_items = set(state['items']) - self.ignore_items
-        if valid_items:
-            item_to_pickup = list(valid_items)[0]
-            command = f'take {item_to_pickup}'
-        else:
-            # Find next location to explore
-            doors_in_room = state['doors']
-            non_visited_doors = []
-            for d in doors_in_room:            
-                if not droid.get_node_in_direction(droid.current_node, d):
-                    non_visited_doors.append(d)    
-            if non_visited_doors:
-                command = non_visited_doors[0]
-            else:
-                # No more doors to go to so lets go back
-                #print('no more doors to visit backtracking')
-                if len(droid.route) > 1:
-                    prev_room = droid.route[-2]
-                    direction = droid.get_direction_for_node(droid.current_node, prev_room)
-                    command = direction
-                    del droid.route[-1]
-                else:
-                    print('Visited all rooms')
-                    self.switch_to(GoToSecurity)
-                    return self.next_command(droid, state)
-        return command
-
-class GoToSecurity(Strategy):
-    """
-    This strategy lets the droid walk from any location in the map
-    to the 'Security' room.
-    """
-
-    def __init__(self):
-        # Holds 'arrival time'/distance map for each room to the 'Security' room.
-        self.arrival = None
-
-    def next_command(self, droid, state):
-        security_room = 'Security'
-        if droid.current_node == security_room:
-            print('Reached security room')
-            self.switch_to(CrackPressureLock)
-            return self.next_command(droid, state)
-        else:
-            if not self.arrival:
-                # Compute the arrival map from the 'Security' room
-                self.arrival = droid.propagate(security_room)     
-            # Find neighbor with the lowest arrival/distance value
-            # This neighbor will bring the droid closer to the target
-            neighbor_arrival = [(self.arrival[n],n) for n in droid.get_connected_nodes(droid.current_node)]            
-            neighbor_arrival.sort()
-            next_room = neighbor_arrival[0][1]
-
-            # Return the direction to walk
-            return droid.get_direction_for_node(droid.current_node, next_room)
-
-        return None
-
-class CrackPressureLock(Strategy):
-    """
-    Strategy to "crack" the pressure lock. 
-    For this we need to find the combination of items in 
-    the droids inventory that result in the correct weight.
-
-    This is a brute force strategy which tries all possible combinations of items.
-    """
-
-    def __init__(self):
-        self.initialized = False
-        self.permutations_to_check = None
-        self.items_to_status = {}
-
-    def initialize(self, droid):
-        """
-        Compute all combinations of items that the droid can hold.
-        Assumes the droid currently hold all the items it has access to.
-        """
-        current_items_set = tuple(sorted(droid.inventory))
-        self.permutations_to_check = {current_items_set}
-        for n in range(1,len(current_items_set)+1):
-            for comb in itertools.permutations(current_items_set, n):
-                self.permutations_to_check.add(tuple(sorted(comb)))
-        self.permutations_to_check = list(self.permutations_to_check)
-        self.permutations_to_check.sort(key = lambda t: (len(t), t))        
-
-    def next_command(self, droid, state):
-        if not self.initialized:
-            print('Initializing item permuations')
-            self.initialize(droid)    
-            self.initialized = True
-
-        if droid.current_node != 'Security':
-            print("No longer at security!!!!!!")
-            return None
-
-        current_items_set = tuple(sorted(droid.inventory))
-        if state.get('analysis_result'):
-            # We got back an analysis result, so store it.
-            #print(current_items_set, state['analysis_result'][0])
-            self.items_to_status[current_items_set] = state
-            print('Checked', len(self.items_to_status), 'combinations')
-        
-        # Remove permutations we have status information for.
-        while self.permutations_to_check and self.permutations_to_check[-1] in self.items_to_status:
-            self.permutations_to_check.pop()
-        if self.permutations_to_check:
-            # Define the permutation to check
-            perm_to_check = set(self.permutations_to_check[-1])
-
-            # The items the droid currenty holds
-            current_set = set(current_items_set)
-
-            # If we miss items, pick-up the missing item
-            missing_items = perm_to_check - current_set
-            if missing_items:
-                return 'take ' + str(list(missing_items)[0])
-            # If we have too much items, drop the item we don't need
-            redundant_items = current_set - perm_to_check
-            if redundant_items:
-                return 'drop ' + str(list(redundant_items)[0])
-            
-            # seems we have the items we want let check at the security
-            return "south"
-        else:
-            # We have exhausted all options, this should not happen
-            raise RuntimeError('No more permutations')
-
 class Droid():
 
-    def __init__(self, strategy=ExploreStrategy):
+    def __init__(self, strategy=ManualControl):
         # Communication
         self.receive_buffer = []
         self.received_txt = None
@@ -433,22 +290,139 @@ class Droid():
             v = self.send_buffer.pop()
             return v
 
+    def send_command(self):
+        """
+        Returns the complete next command as int characters.
+        """
+        command = [self.send()]
+        while self.send_buffer:
+            command.append(self.send())
+        return command
+
     def receive(self, v):    
         """
         Receives a single character at a time, so we put them in a buffer.
         """    
         self.receive_buffer.append(v)
 
-if __name__ == "__main__":
+def send_command(machine, command=None):
+    """
+    Sends the command (if any) to the droid program and returns
+    the text it prints until it asks for the next command.
+    """
+    if command is not None:
+        machine.feed([ord(c) for c in command] + [10])
+    return ''.join(chr(v) for v in machine.run_until_input_needed())
+
+def explore_rooms(machine, droid):
+    """
+    Breadth first exploration of all rooms. The droid program is forked
+    in every room, so no moves are needed to backtrack.
+
+    The connections are stored in the droid. Returns the parsed rooms
+    and the (room, direction) leading to the pressure-sensitive floor.
+    """
+    start_parsed = droid.parse_text(send_command(machine))
+    start_room = start_parsed['room']
+    rooms = {start_room: start_parsed}
+    machines = {start_room: machine}
+    pressure_floor = None
+    front = deque([start_room])
+    while front:
+        room = front.popleft()
+        for door in rooms[room]['doors']:
+            if droid.get_node_in_direction(room, door):
+                continue
+            child = machines[room].fork()
+            parsed = droid.parse_text(send_command(child, door))
+            if 'ejected_room' in parsed:
+                # the pressure plate sends us back
+                pressure_floor = (room, door)
+                continue
+            next_room = parsed['room']
+            droid.set_node_for_direction(room, door, next_room)
+            if next_room not in rooms:
+                rooms[next_room] = parsed
+                machines[next_room] = child
+                front.append(next_room)
+    return rooms, pressure_floor
+
+def walk(machine, droid, from_room, to_room):
+    """
+    Walks the droid along the shortest route between the two rooms.
+    """
+    arrival = droid.propagate(to_room)
+    room = from_room
+    while room != to_room:
+        next_room = min(droid.get_connected_nodes(room), key=lambda n: arrival[n])
+        send_command(machine, droid.get_direction_for_node(room, next_room))
+        room = next_room
+
+def crack_pressure_lock(machine, items, door):
+    """
+    Tries all combinations of the items on the pressure plate. Each
+    attempt runs on a fork of the droid waiting at the checkpoint.
+
+    Returns the text of the successful attempt.
+    """
+    for n in range(len(items), -1, -1):
+        for keep in itertools.combinations(items, n):
+            attempt = machine.fork()
+            for item in items:
+                if item not in keep:
+                    send_command(attempt, f'drop {item}')
+            txt = send_command(attempt, door)
+            if attempt.halted:
+                return txt
+    raise RuntimeError('No more combinations')
+
+def solve(main_program):
+    droid = Droid()
+    machine = IntcodeMachine(main_program)
+    rooms, pressure_floor = explore_rooms(machine.fork(), droid)
+    if pressure_floor is None:
+        raise RuntimeError('No room ejects the droid')
+    checkpoint, door = pressure_floor
+
+    # Collect all items with a single droid
+    room = next(iter(rooms))
+    send_command(machine)
+    items = []
+    for item_room, parsed in rooms.items():
+        for item in parsed['items']:
+            if item not in IGNORE_ITEMS:
+                walk(machine, droid, room, item_room)
+                room = item_room
+                send_command(machine, f'take {item}')
+                items.append(item)
+    walk(machine, droid, room, checkpoint)
+    return crack_pressure_lock(machine, items, door)
+
+def run_droid(main_program, strategy):
+    """
+    Runs a single droid controlled by the given strategy.
+    """
+    d = Droid(strategy)
+    machine = IntcodeMachine(main_program)
+    while True:
+        for v in machine.run_until_input_needed():
+            d.receive(v)
+        if machine.halted:
+            break
+        machine.feed(d.send_command())
+    d.update_receive_txt()
+    return d.received_txt
+
+def main():
     with open(Path(__file__).parent / 'input.txt', 'r') as f:
         main_program = txt_values(f.read())
-    
-    # Use the ManualControl stategy to control the droid manually
-    #d = Droid(ManualControl)
 
-    # This setup automatically solves the puzzle
-    d = Droid(ExploreStrategy)
-    
-    run(main_program, input_v=d.send, output_cb=d.receive, stop_on_output=False)
-    d.update_receive_txt()
-    print(d.received_txt)
+    if 'manual' in sys.argv[1:]:
+        # Use the ManualControl stategy to control the droid manually
+        print(run_droid(main_program, ManualControl))
+    else:
+        # Explore with forked droids, this automatically solves the puzzle
+        print(solve(main_program))
+
+if __name__ == "__main__":
+    main()
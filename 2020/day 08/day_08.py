@@ -6,10 +6,9 @@ Pieter Kitslaar
 import sys
 from pathlib import Path
 
-# Import the shared CPU class
-# we will probably need to reuse this in the next puzzles...
+# Import the shared VM
 sys.path.insert(0,str(Path(__file__).absolute().parents[1] / 'shared'))
-from cpu import CPU
+from cpu import VM, HANDHELD, HALT, handheld_program
 
 example="""\
 nop +0
@@ -23,63 +22,58 @@ jmp -4
 acc +6
 """
 
-def detect_loop(program_txt):
-    cpu = CPU(program_txt)
-    history= []
-    found_loop = False
-    try:
-        while not found_loop:
-            this_state = cpu.step()
-            if history:
-                for his in history:
-                    if this_state['pc'] == his['pc']:
-                        found_loop = True
-                        break
-            if not found_loop:
-                history.append(this_state)
-    except IndexError:
-        # the cpu will raise an IndexError when the
-        # program halts
-        pass
+def detect_loop(vm):
+    """
+    Runs the program until an instruction would be executed
+    a second time or the program halts. Returns if a loop was 
+    found and the accumulator value at that moment.
+    """
+    vm.reset()
+    visited = set()
+    while vm.pc not in visited:
+        visited.add(vm.pc)
+        if vm.step() == HALT:
+            return False, vm['acc']
+    return True, vm['acc']
 
-    return found_loop, history
+def run_program(program_txt):
+    return detect_loop(VM(handheld_program(program_txt), HANDHELD))
 
 def test_example():
-    _, history = detect_loop(example)
-    assert(5 == history[-1]['a'])
+    _, accumulator = run_program(example)
+    assert(5 == accumulator)
 
 def get_input():
     with open(Path(__file__).parent / 'input.txt', 'r') as f:
         return f.read()
 
 def test_part1():
-    _, history = detect_loop(get_input())
-    answer = history[-1]['a']
+    _, answer = run_program(get_input())
     print('Part 1:', answer)
     assert(1489 == answer)
 
 def fix_program(program_txt):
-    original_instructions = program_txt.splitlines()
-    num_instructions = len(original_instructions)
-    for i in range(num_instructions):
-        if original_instructions[i].startswith(('jmp', 'nop')):
-            new_instructions = original_instructions[:] # make copy
-            new_instructions[i] = "{0}{1}".format(
-                    {'jmp':'nop', 'nop':'jmp'}[new_instructions[i][:3]],
-                    new_instructions[i][3:]
-            )
-            # check for loop
-            found_loop, history = detect_loop("\n".join(new_instructions))
+    """
+    Swaps a single jmp/nop instruction until the program halts,
+    returns the final accumulator value. The program is only parsed
+    and compiled once, each candidate patches a single instruction.
+    """
+    vm = VM(handheld_program(program_txt), HANDHELD)
+    swap = {'jmp':'nop', 'nop':'jmp'}
+    for i, (op, args) in enumerate(vm.program.instructions):
+        if op in swap:
+            original = vm.patch(i, (swap[op], args))
+            found_loop, accumulator = detect_loop(vm)
+            vm.patch(i, original)
             if not found_loop:
-                return history
+                return accumulator
 
 def test_example_part2():
-    history = fix_program(example)
-    assert(8 == history[-1]['a'])
+    accumulator = fix_program(example)
+    assert(8 == accumulator)
 
 def test_part2():
-    history = fix_program(get_input())
-    answer = history[-1]['a']
+    answer = fix_program(get_input())
     print('Part 2:', answer)
     assert(1539 == answer)
 
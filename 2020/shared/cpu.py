@@ -1,23 +1,156 @@
-class CPU:
-    def __init__(self, program_txt):
-        self._program = [l.strip() for l in program_txt.splitlines()]
+"""
+Shared register VM
+Pieter Kitslaar
+
+Used by the 2020 handheld console (day 08), the 2017 duet (day 18)
+and the 2022 CRT (day 10).
+
+A program is parsed once into (opcode, slots) tuples. Register
+names and literal values are both resolved to slot indices into a
+single register list, literals get their own (read-only) slot. An
+instruction set maps each opcode to a factory that compiles one
+instruction into a closure. The closure returns the pc offset and
+can signal an event (like waiting for input) through vm.event.
+"""
+from collections import deque
+
+HALT = 'halt'
+
+class Program:
+    def __init__(self, program_txt, register_names=()):
+        lines = [line.split() for line in program_txt.strip().splitlines()]
+        all_args = [a for _, *args in lines for a in args]
+        self.register_slots = {}
+        for name in list(register_names) + [a for a in all_args if a.isalpha()]:
+            self.register_slots.setdefault(name, len(self.register_slots))
+        # literals get a slot after the registers
+        self.constants = []
+        self._constant_slots = {}
+        for value in [int(a) for a in all_args if not a.isalpha()]:
+            if value not in self._constant_slots:
+                self._constant_slots[value] = len(self.register_slots) + len(self.constants)
+                self.constants.append(value)
+        self.instructions = [(op, tuple(self.slot(a) for a in args)) for op, *args in lines]
+
+    def slot(self, arg):
+        """
+        Returns the register list index for a register name or literal.
+        """
+        if arg.isalpha():
+            return self.register_slots[arg]
+        return self._constant_slots[int(arg)]
+
+    def initial_registers(self):
+        return [0]*len(self.register_slots) + self.constants
+
+
+class VM:
+    def __init__(self, program, instruction_set, trace=None):
+        self.program = program
+        self.instruction_set = instruction_set
+        self.trace = trace
+        self.registers = program.initial_registers()
+        self.pc = 0
+        self.event = None
+        self.inputs = deque()
+        self.outputs = []
+        self.ops = [self.compile(i) for i in program.instructions]
+
+    def compile(self, instruction):
+        op, slots = instruction
+        return self.instruction_set[op](self, *slots)
+
+    def patch(self, index, instruction):
+        """
+        Replaces the compiled instruction at 'index', returns the old one.
+        """
+        old = self.ops[index]
+        self.ops[index] = self.compile(instruction) if isinstance(instruction, tuple) else instruction
+        return old
+
+    def reset(self):
+        self.registers[:] = self.program.initial_registers()
+        self.pc = 0
+        self.event = None
+        self.inputs.clear()
+        self.outputs.clear()
+
+    def __getitem__(self, name):
+        return self.registers[self.program.register_slots[name]]
+
+    def __setitem__(self, name, value):
+        self.registers[self.program.register_slots[name]] = value
+
+    def instruction(self):
+        """
+        Returns the parsed instruction at the current pc.
+        """
+        return self.program.instructions[self.pc]
 
-        self._accumulator = 0
-        self._program_counter = 0
-    
     def step(self):
-        instruction, *args = self._program[self._program_counter].split()
-        getattr(self, instruction)(*args) # run instruction
-        return {'pc': self._program_counter, 'a': self._accumulator}
-
-    def acc(self, value):
-        self._accumulator += int(value)
-        self._program_counter += 1
-    
-    def jmp(self, value):
-        self._program_counter += int(value)
-    
-    def nop(self, _):
-        self._program_counter += 1
-
-    
+        """
+        Executes a single instruction and returns the event
+        it signalled (or None). Returns HALT when the pc is
+        outside of the program.
+        """
+        if not 0 <= self.pc < len(self.ops):
+            return HALT
+        if self.trace is not None:
+            self.trace(self)
+        self.pc += self.ops[self.pc]()
+        event, self.event = self.event, None
+        return event
+
+    def run(self):
+        """
+        Runs until an instruction signals an event or the program
+        halts, returns the event.
+        """
+        ops = self.ops
+        num_ops = len(ops)
+        trace = self.trace
+        pc = self.pc
+        event = HALT
+        while 0 <= pc < num_ops:
+            if trace is not None:
+                self.pc = pc
+                trace(self)
+            pc += ops[pc]()
+            if self.event is not None:
+                event, self.event = self.event, None
+                break
+        self.pc = pc
+        return event
+
+#
+# 2020 handheld game console
+#
+
+def _acc(vm, value):
+    r = vm.registers
+    acc = vm.program.register_slots['acc']
+    def op():
+        r[acc] += r[value]
+        return 1
+    return op
+
+def _jmp(vm, offset):
+    r = vm.registers
+    def op():
+        return r[offset]
+    return op
+
+def _nop(vm, _):
+    def op():
+        return 1
+    return op
+
+HANDHELD = {
+    'acc': _acc,
+    'jmp': _jmp,
+    'nop': _nop,
+}
+
+def handheld_program(program_txt):
+    return Program(program_txt, register_names=['acc'])
+
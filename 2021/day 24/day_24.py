@@ -4,7 +4,8 @@ Pieter Kitslaar
 """
 
 from pathlib import Path
-import json
+import sys
+import time
 
 def get_input():
     with open(Path(__file__).parent / 'input.txt', 'r') as f:
@@ -122,148 +123,266 @@ def MONAD(number_txt):
     assert len(number_txt)==14
     assert all(c!='0' for c in number_txt)
     a = ALU(get_input(),[*map(int,number_txt)])
+    a.exec()
     return a.reg['z']==0, a
 
 def test_monad():
-    result, _ = MONAD('13579246899999')
-    assert True == result
-
-def find_z0(d_program, wanted_values):
-    A = int(d_program[5][2])
-    B = int(d_program[-3][2])
-    Z_DIV = int(d_program[4][2])
-    print(f"> A={A}, B={B}, Z_DIV={Z_DIV}")
-
-    X = lambda z_0,w: 1 if z_0%26 + A != w else 0
-    x_zero_for_w = {}
-    for z_0 in range(1,max(26,26-A)):
-        for w in range(1,10):
-            if X(z_0,w) == 0:
-                x_zero_for_w[z_0]=w
-    print('> z_zero', x_zero_for_w)
-
-    Z = lambda z_0,w: 26*int(z_0/Z_DIV) + w + B if X(z_0,w) else int(z_0/Z_DIV)
-
-    # - z_0 cannot be negative or zero
-    # x == 0 ony when z_0 + A is in the range 1 to 9
-    # A<=-25: x==0 never
-    # A==-24: x==0 for w,z in [(1,25),                                                               ]
-    # A==-23: x==0 for w,z in [(1,24), (2,25),                                                       ]
-    # A==-22: x==0 for w,z in [(1,23), (2,24), (3,25),                                               ]
-    # A==-21: x==0 for w,z in [(1,22), (2,23), (3,24), (4,25),                                       ]
-    # A==-20: x==0 for w,z in [(1,21), (2,22), (3,23), (4,24), (5,25),                               ]
-    # A==-19: x==0 for w,z in [(1,20), (2,21), (3,22), (4,23), (5,24), (6,25),                       ]
-    # A==-18: x==0 for w,z in [(1,19), (2,20), (3,21), (4,22), (5,23), (6,24), (7,25),               ]
-    # A==-17: x==0 for w,z in [(1,18), (2,19), (3,20), (4,21), (5,22), (6,23), (7,24), (8,25),       ]
-    # A==-16: x==0 for w,z in [(1,17), (2,18), (3,19), (4,20), (5,21), (6,22), (7,23), (8,24), (9,25)]
-    # A==-15: x==0 for w,z in [(1,16), (2,17), (3,18), (4,19), (5,20), (6,21), (7,22), (8,23), (9,24)]
-    # A==-14: x==0 for w,z in [(1,15), (2,16), (3,17), (4,18), (5,19), (6,20), (7,21), (8,22), (9,23)]
-    # A==-13: x==0 for w,z in [(1,14), (2,15), (3,16), (4,17), (5,18), (6,19), (7,20), (8,21), (9,21)]
-    # ..
-    # A==-2 : x==0 for w,z in [(1, 3), (2, 4), (3, 5), (4, 6), (5, 7), (6, 8), (7, 9), (8,10), (9,11)]
-    # A==-1 : x==0 for w,z in [(1, 2), (2, 3), (3, 4), (4, 5), (5, 6), (6, 7), (7, 8), (8, 9), (9,10)]
-    # A== 0 : x==0 for w,z in [(1, 1), (2, 2), (3, 3), (4, 4), (5, 5), (6, 6), (7, 7), (8, 8), (9, 9)]
-    # A== 1 : x==0 for w,z in [        (2, 1), (3, 2), (4, 3), (5, 4), (6, 5), (7, 6), (8, 7), (9, 8)]
-    # A== 2 : x==0 for w,z in [                (3, 1), (4, 2), (5, 3), (6, 4), (7, 5), (8, 6), (9, 7)]
-    # A== 3 : x==0 for w,z in [                        (4, 1), (5, 2), (6, 3), (7, 4), (8, 5), (9, 6)]
-    # A== 4 : x==0 for w,z in [                                (5, 1), (6, 2), (7, 3), (8, 4), (9, 5)]
-    # A== 5 : x==0 for w,z in [                                        (6, 1), (7, 2), (8, 3), (9, 4)]
-    # A== 6 : x==0 for w,z in [                                                (7, 1), (8, 2), (9, 3)]
-    # A== 7 : x==0 for w,z in [                                                        (8, 1), (9, 2)]
-    # A== 7 : x==0 for w,z in [                                                                (9, 1)]
-    # A>= 8 : x==0 never
-
-    w_for_z0 = {}
-    x_solutions = {}
-    #z_0_range = range(1,27+(-1*A)) if Z_DIV == 26 else range(1,27+A)
-    for z_0 in range(1000000):
-            #z_0 = z_0*26 if Z_DIV == 1 else z_0
-            for w in range(1,10):
-                #alu = ALU(d_program,[w])
-                #alu.reg.update({'z':z_0,})
-                #alu.exec()
-                #z = alu.reg['z']
-                z = Z(z_0,w)
-                #assert z_fast == z
-                if z in wanted_values:
-                    w_for_z0.setdefault(z_0, []).append((w,z))
-    print('> found', len(w_for_z0))
-    return w_for_z0
-
-def brute_force(splitted_monad_program):
-    all_found = {}
-    wanted_values = set([0])
-    for d_i in range(13,-1,-1):
-        print(d_i, ': finding num_wanted', len(wanted_values))
-        w_for_z0 = find_z0(splitted_monad_program[d_i], wanted_values)
-        all_found[d_i] = w_for_z0
-        if w_for_z0:
-            print(d_i, ': found', len(w_for_z0))
-            #print(w_for_z0)
-            wanted_values = set(w_for_z0)
-        else:
-            print(d_i, ': no soluton found for wanted values')
-            print(wanted_values)
-            return
-    return all_found
-
-def prepare():
-    full_monad_program = parse(get_input())
-    splitted_monad_program = []
-    for p in full_monad_program:
+    # the interpreter and the compiled blocks should agree
+    number_txt = '13579246899999'
+    result, alu = MONAD(number_txt)
+    blocks = compile_blocks(parse(get_input()))
+    assert alu.reg['z'] == run_blocks(blocks, number_txt)
+    assert result == (alu.reg['z'] == 0)
+
+#
+# Symbolic compilation
+#
+# Each block (starting at an 'inp' instruction) is evaluated on
+# expressions instead of numbers. The only free variables are the
+# incoming z and the digit w, all other registers are reset by the
+# block itself. Every expression also carries the range of values it
+# can take, which is used to fold comparisons that can never (or
+# always) be true. For MONAD this removes the 'x' test in the blocks
+# that only push onto z, leaving closed-form transitions like
+#   z' = z*26 + w + 2
+#   z' = z//26*(25*x + 1) + (w + 9)*x,  x = z%26 - 13 != w
+# which are compiled into small Python functions.
+#
+
+INF = float('inf')
+
+class Expr:
+    """
+    Expression tree node. 'fmt' is the Python source with {0}, {1}
+    placeholders for the arguments, lo and hi bound its value.
+    """
+    def __init__(self, fmt, args, lo, hi, value=None):
+        self.fmt = fmt
+        self.args = args
+        self.lo = lo
+        self.hi = hi
+        self.value = value
+
+    @staticmethod
+    def const(v):
+        return Expr(str(v), (), v, v, v)
+
+    @staticmethod
+    def var(name, lo, hi):
+        return Expr(name, (), lo, hi)
+
+def _range_mul(a, b):
+    products = [x*y for x in (a.lo, a.hi) for y in (b.lo, b.hi) if 0 not in (x, y)]
+    if a.lo <= 0 <= a.hi or b.lo <= 0 <= b.hi:
+        products.append(0)
+    return min(products), max(products)
+
+def sym_add(a, b):
+    if a.value is not None and b.value is not None:
+        return Expr.const(a.value + b.value)
+    if a.value == 0:
+        return b
+    if b.value == 0:
+        return a
+    return Expr('({0} + {1})', (a, b), a.lo + b.lo, a.hi + b.hi)
+
+def sym_mul(a, b):
+    if a.value is not None and b.value is not None:
+        return Expr.const(a.value * b.value)
+    if a.value == 0 or b.value == 0:
+        return Expr.const(0)
+    if a.value == 1:
+        return b
+    if b.value == 1:
+        return a
+    return Expr('{0}*{1}', (a, b), *_range_mul(a, b))
+
+def sym_div(a, b):
+    assert b.value is not None and b.value != 0, 'only division by a constant is supported'
+    if a.value is not None:
+        return Expr.const(int(a.value / b.value))
+    if b.value == 1:
+        return a
+    if a.lo >= 0 and b.value > 0:
+        return Expr('{0}//{1}', (a, b), a.lo // b.value, a.hi // b.value)
+    # truncate towards zero like the ALU does
+    bounds = [int(x / b.value) if abs(x) != INF else x*b.value for x in (a.lo, a.hi)]
+    return Expr('_tdiv({0}, {1})', (a, b), min(bounds), max(bounds))
+
+def sym_mod(a, b):
+    assert b.value is not None and b.value > 0, 'only modulo by a positive constant is supported'
+    if a.value is not None:
+        return Expr.const(a.value % b.value)
+    if 0 <= a.lo and a.hi < b.value:
+        return a
+    return Expr('{0}%{1}', (a, b), 0, b.value - 1)
+
+def sym_eql(a, b):
+    if a.value is not None and b.value is not None:
+        return Expr.const(int(a.value == b.value))
+    if a.hi < b.lo or b.hi < a.lo:
+        return Expr.const(0)
+    if b.value == 0 and a.fmt == '({0} == {1})':
+        # negation of a previous comparison
+        return Expr('({0} != {1})', a.args, 0, 1)
+    return Expr('({0} == {1})', (a, b), 0, 1)
+
+SYM_OPS = {'add': sym_add, 'mul': sym_mul, 'div': sym_div, 'mod': sym_mod, 'eql': sym_eql}
+
+def _tdiv(a, b):
+    q = abs(a) // abs(b)
+    return q if (a < 0) == (b < 0) else -q
+
+def to_source(name, params, result):
+    """
+    Returns the source of a function 'name' computing 'result'.
+    Subexpressions that are used more than once are bound to locals.
+    """
+    num_uses = {}
+    def count(e):
+        for arg in e.args:
+            num_uses[id(arg)] = num_uses.get(id(arg), 0) + 1
+            if num_uses[id(arg)] == 1:
+                count(arg)
+    count(result)
+
+    lines = []
+    locals_ = {}
+    def render(e):
+        if id(e) in locals_:
+            return locals_[id(e)]
+        src = e.fmt.format(*map(render, e.args))
+        if e.args and num_uses.get(id(e), 0) > 1:
+            local = f't{len(locals_)}'
+            lines.append(f'    {local} = {src}')
+            locals_[id(e)] = src = local
+        return src
+    lines.append(f'    return {render(result)}')
+    return f'def {name}({", ".join(params)}):\n' + '\n'.join(lines)
+
+def split_blocks(program):
+    blocks = []
+    for p in program:
         if p[0] == 'inp':
-            splitted_monad_program.append([])
-        splitted_monad_program[-1].append(p)
-
-    all_found = brute_force(splitted_monad_program)
-    with open(Path(__file__).parent / 'cache.json', 'w') as f:
-        json.dump(all_found, f)
+            blocks.append([])
+        blocks[-1].append(p)
+    return blocks
+
+class Block:
+    """
+    Closed-form transition z' = f(z, w) of a single input block.
+    """
+    def __init__(self, instructions):
+        assert instructions[0] == ('inp', 'w'), 'blocks should start with "inp w"'
+        reg = {'w': Expr.var('w', 1, 9), 'x': Expr.const(0), 'y': Expr.const(0), 'z': Expr.var('z', 0, INF)}
+        # the incoming x and y are unknown, they have to be reset
+        # (with 'mul r 0') before being used
+        unknown = {'x', 'y'}
+        for code in instructions[1:]:
+            op, r, arg = code
+            if arg in unknown or (r in unknown and (op, arg) != ('mul', '0')):
+                raise ValueError(f'register read before being reset in {code}')
+            unknown.discard(r)
+            b = reg[arg] if arg in reg else Expr.const(int(arg))
+            reg[r] = SYM_OPS[op](reg[r], b)
+        self.source = to_source('transition', ['z', 'w'], reg['z'])
+        namespace = {'_tdiv': _tdiv}
+        exec(self.source, namespace)
+        self.transition = namespace['transition']
+        # the product of all 'div z' constants, z shrinks by at most this factor
+        self.divisor = 1
+        for op, r, arg in instructions[1:]:
+            if (op, r) == ('div', 'z'):
+                self.divisor *= int(arg)
+
+    def __call__(self, z, w):
+        return self.transition(z, w)
+
+def compile_blocks(program):
+    return [Block(b) for b in split_blocks(program)]
+
+def run_blocks(blocks, number_txt):
+    z = 0
+    for block, w in zip(blocks, map(int, number_txt)):
+        z = block(z, w)
+    return z
+
+def _first_model_number(blocks, bounds, digits):
+    # states are kept in the order of their digit prefix, so the
+    # first prefix that reaches a z is also the best one
+    states = {0: 0}
+    for i, block in enumerate(blocks):
+        transition = block.transition
+        bound = bounds[i+1]
+        new_states = {}
+        for z, prefix in states.items():
+            prefix *= 10
+            for w in digits:
+                new_z = transition(z, w)
+                if new_z < bound and new_z not in new_states:
+                    new_states[new_z] = prefix + w
+        states = new_states
+    return str(states[0]) if 0 in states else None
+
+def find_model_numbers(blocks):
+    """
+    Returns the (smallest, largest) model numbers for which z ends up 0.
+
+    Runs a DP over the reachable z values per stage, keeping the
+    best digit prefix for each z. Every block divides z by at most
+    its divisor, so after stage i a z that is not below the product
+    of the remaining divisors can never become 0 again.
+    """
+    bounds = [1]*(len(blocks) + 1)
+    for i in range(len(blocks) - 1, -1, -1):
+        bounds[i] = bounds[i+1] * blocks[i].divisor
+    lowest = _first_model_number(blocks, bounds, range(1, 10))
+    highest = _first_model_number(blocks, bounds, range(9, 0, -1))
+    return lowest, highest
+
+def test_compiled_blocks():
+    import random
+    rng = random.Random(24)
+    for instructions in split_blocks(parse(get_input())):
+        block = Block(instructions)
+        for _ in range(50):
+            z, w = rng.randrange(0, 26**5), rng.randrange(1, 10)
+            alu = ALU(instructions, [w])
+            alu.reg['z'] = z
+            alu.exec()
+            assert alu.reg['z'] == block(z, w)
 
 def test_part1():
-    with open(Path(__file__).parent / 'cache.json', 'r') as f:
-        all_found = json.load(f)
-    
-    last_z = 0
-    w_parts = []
-    for i in range(14):
-        z_options = all_found[str(i)][str(last_z)]
-        z_options.sort(key = lambda t: t[0])
-        w, last_z = z_options[-1]
-        w_parts.append(w)
-    highest_number = "".join(map(str,w_parts))
+    _, highest_number = find_model_numbers(compile_blocks(parse(get_input())))
     result_highest,_ = MONAD(highest_number)
     assert result_highest == True
     print('Part 1', highest_number)
 
 
 def test_part2():
-    with open(Path(__file__).parent / 'cache.json', 'r') as f:
-        all_found = json.load(f)
-    
-    last_z = 0
-    w_parts = []
-    for i in range(14):
-        z_options = all_found[str(i)][str(last_z)]
-        z_options.sort(key = lambda t: t[0])
-        w, last_z = z_options[0]
-        w_parts.append(w)
-    lowest_number = "".join(map(str,w_parts))
+    lowest_number, _ = find_model_numbers(compile_blocks(parse(get_input())))
     result_lowest,_ = MONAD(lowest_number)
     assert result_lowest == True
     print('Part 2', lowest_number)
 
+def benchmark():
+    start = time.perf_counter()
+    blocks = compile_blocks(parse(get_input()))
+    lowest, highest = find_model_numbers(blocks)
+    elapsed = time.perf_counter() - start
+    print(f'symbolic + DP: {elapsed*1000:.1f} ms, lowest {lowest}, highest {highest}')
+    for block in blocks:
+        print(block.source)
 
 
 if __name__ == "__main__":
-    test_ex_negate()
-    test_ex_3_times_larger()
-    test_ex_bit_split()
-    test_monad()
-    # prepare() # uncomment to run brute_force preparation for part 1 and part 2
-    test_part1()
-    test_part2()
-
-
-
-
-
+    if 'bench' in sys.argv[1:]:
+        benchmark()
+    else:
+        test_ex_negate()
+        test_ex_3_times_larger()
+        test_ex_bit_split()
+        test_monad()
+        test_compiled_blocks()
+        test_part1()
+        test_part2()
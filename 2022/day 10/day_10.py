@@ -13,22 +13,38 @@ def data(fn='input.txt'):
         return f.read()
 
 
+import sys
+sys.path.insert(0, str(THIS_DIR.absolute().parents[1] / '2020' / 'shared'))
+from cpu import Program, VM
+
+def _noop(vm):
+    def op():
+        return 1
+    return op
+
+def _addx(vm, value):
+    r = vm.registers
+    x = vm.program.register_slots['x']
+    def op():
+        r[x] += r[value]
+        return 1
+    return op
+
+CRT = {'noop': _noop, 'addx': _addx}
+CRT_CYCLES = {'noop': 1, 'addx': 2}
+
 def run_cpu(d):
-    regX = 1
+    vm = VM(Program(d, register_names=['x']), CRT)
+    vm['x'] = 1
     cycle = 1
-    for line in d.strip().splitlines():
-        if line == 'noop':
-            yield cycle, regX
+    while 0 <= vm.pc < len(vm.ops):
+        # the register only changes after all cycles of the instruction
+        op, _ = vm.instruction()
+        for i in range(CRT_CYCLES[op]):
+            yield cycle, vm['x']
             cycle += 1
-
-        elif line.startswith('addx'):
-            add_value = int(line.split()[-1])
-            for i in range(2):
-                yield cycle, regX
-                cycle += 1
-            regX += add_value
-    yield cycle, regX
-            #yield cycle, regX
+        vm.step()
+    yield cycle, vm['x']
 
 def solve(d):
     signal_strength = 0
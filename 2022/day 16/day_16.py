@@ -118,11 +118,85 @@ def test_part1():
     print('PART 1:', result)
     assert(1741 == result)
 
-class R2(namedtuple("R2", "t_remaining current valves total_flow")):
-    def sort_key(self):
-        return (self.t_elapsed, -self.flow_rate, -self.total_flow)
-    def __lt__(self, other):
-        return self.sort_key() < other.sort_key()
+class ValveModel:
+    """
+    The valves with a positive flow rate, indexed 0..n-1 so a set
+    of open valves is an n-bit mask, and the travel time between
+    them (from Floyd-Warshall over all tunnels).
+    """
+    def __init__(self, d, start='AA'):
+        flow_rates = {}
+        tunnels = {}
+        for line in d.splitlines():
+            room_info, tunnel_info = line.split(';')
+            valve_name = VALVE_NAME.search(room_info).group(0)
+            flow_rates[valve_name] = int(FLOW_RATE.search(room_info).group(0))
+            tunnels[valve_name] = VALVE_NAME.findall(tunnel_info)
+
+        all_valves = list(flow_rates)
+        index = {v:i for i,v in enumerate(all_valves)}
+        n = len(all_valves)
+        INF = float('inf')
+        dist = [[0 if i == j else INF for j in range(n)] for i in range(n)]
+        for v, others in tunnels.items():
+            for o in others:
+                dist[index[v]][index[o]] = 1
+        for k in range(n):
+            dist_k = dist[k]
+            for i in range(n):
+                d_ik = dist[i][k]
+                if d_ik == INF:
+                    continue
+                dist_i = dist[i]
+                for j in range(n):
+                    if d_ik + dist_k[j] < dist_i[j]:
+                        dist_i[j] = d_ik + dist_k[j]
+
+        self.names = [v for v in all_valves if flow_rates[v] > 0]
+        self.flow_rates = [flow_rates[v] for v in self.names]
+        # the start is placed after the pressure valves
+        nodes = [index[v] for v in self.names] + [index[start]]
+        self.start = len(self.names)
+        self.distances = [[dist[i][j] for j in nodes] for i in nodes]
+
+    def best_flow_per_mask(self, T_END):
+        """
+        Returns a list with for every set of open valves (as bitmask)
+        the highest total flow of a single route opening exactly those.
+        """
+        n = len(self.names)
+        # per position the (bit, valve, time to move and open, flow rate) options
+        moves = [
+            [(1 << v, v, self.distances[p][v] + 1, self.flow_rates[v]) for v in range(n)]
+            for p in range(n+1)
+        ]
+        best = [0]*(1 << n)
+        stack = [(self.start, T_END, 0, 0)]
+        while stack:
+            pos, t_remaining, valves, total_flow = stack.pop()
+            if total_flow > best[valves]:
+                best[valves] = total_flow
+            for bit, v, cost, flow_rate in moves[pos]:
+                if not valves & bit and cost < t_remaining:
+                    t = t_remaining - cost
+                    stack.append((v, t, valves | bit, total_flow + flow_rate*t))
+        return best
+
+
+def best_disjoint_pair(best):
+    """
+    Returns the highest best[m1] + best[m2] for disjoint masks m1, m2.
+    """
+    num_bits = len(best).bit_length() - 1
+    # best_subset[m] = max(best[s]) over all subsets s of m
+    best_subset = best[:]
+    for b in range(num_bits):
+        bit = 1 << b
+        for m in range(len(best)):
+            if m & bit and best_subset[m ^ bit] > best_subset[m]:
+                best_subset[m] = best_subset[m ^ bit]
+    full = len(best) - 1
+    return max(f + best_subset[full ^ m] for m, f in enumerate(best))
 
 
 def solve2(d, T_END=30, part2=False):
@@ -140,47 +214,13 @@ def solve2(d, T_END=30, part2=False):
     I just used the highest max_flow value after a couple an two hours brute-force which
     happend to be the correct one.
     """
-    graph = parse(d)
-    flow_attributes = nx.get_node_attributes(graph, "flow_rate")
-    all_valves = list(flow_attributes)
-
-    pressure_valves = tuple([n for n,f in flow_attributes.items() if f > 0])
-    valve_bits = {v:1<<i for i,v in enumerate(pressure_valves)}
-
-    distances = {}
-    for v in all_valves:
-        for v2 in pressure_valves: # only want to travel to pressure values
-            if v != v2:
-                distances.setdefault(v, {})[v2] = nx.shortest_path_length(graph, v, v2)
-
-    states = [R2(
-        t_remaining=T_END,
-        current='AA', # all workers start a 'AA' and have no route to go to
-        valves = 0, # no valves are open
-        total_flow=0)]
-
-    max_flow = {} # per valve set
-    while states:
-        current = states.pop()
-
-        max_flow[current.valves] = max([max_flow.get(current.valves, 0), current.total_flow])
-        for v in pressure_valves:
-            if not (valve_bits[v] & current.valves): # valve already open
-                t_remaining = current.t_remaining - distances[current.current][v] -1 
-                if t_remaining > 0:
-                    states.append(
-                        current._replace(
-                            t_remaining = t_remaining,
-                            current = v,
-                            valves = current.valves | valve_bits[v],
-                            total_flow = current.total_flow + flow_attributes[v]*t_remaining
-                        )
-                    ) 
+    model = ValveModel(d)
+    best = model.best_flow_per_mask(T_END)
     if not part2:
-        return max(max_flow.values())
+        return max(best)
     else:
         # find maximum of sum of mutually exclusive solutions e.g. v1 and v2 have no common bits
-        return max(f1+f2 for v1,f1 in max_flow.items() for v2,f2 in max_flow.items() if not v1 & v2)
+        return best_disjoint_pair(best)
 
 def test_example2():
     result = solve2(EXAMPLE_DATA, T_END=26, part2=True)
@@ -191,8 +231,24 @@ def test_part2():
     print('PART 2:', result)
     assert(2316 == result)
 
+def test_best_disjoint_pair():
+    best = ValveModel(EXAMPLE_DATA).best_flow_per_mask(26)
+    brute_force = max(f1+f2 for v1,f1 in enumerate(best) for v2,f2 in enumerate(best) if not v1 & v2)
+    assert(brute_force == best_disjoint_pair(best))
+
+def benchmark():
+    import time
+    for name, T_END, part2 in [('part 1', 30, False), ('part 2', 26, True)]:
+        start = time.perf_counter()
+        result = solve2(data(), T_END=T_END, part2=part2)
+        print(f"{name}: {result} in {(time.perf_counter()-start)*1000:.1f} ms")
+
 if __name__ == "__main__":
-    test_example()
-    test_part1()
-    test_example2()
-    test_part2()
+    import sys
+    if 'bench' in sys.argv[1:]:
+        benchmark()
+    else:
+        test_example()
+        test_part1()
+        test_example2()
+        test_part2()
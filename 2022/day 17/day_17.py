@@ -4,7 +4,6 @@ Pieter Kitslaar
 """
 
 from pathlib import Path
-from turtle import st
 THIS_DIR = Path(__file__).parent
 
 
@@ -12,11 +11,20 @@ def data(fn='input.txt'):
     with open(THIS_DIR / fn) as f:
         return f.read().strip()
 
+CHAMBER_WIDTH = 7
+
 class Rock:
     def __init__(self, offsets):
         self.offsets = offsets
         self.width = max(o[0] for o in self.offsets)
         self.height = max(o[1] for o in self.offsets)
+        # row bitmasks (bottom row first) for every valid x position,
+        # bit x is set when column x is occupied
+        self.max_x = CHAMBER_WIDTH - 1 - self.width
+        self.masks = [
+            tuple(sum(1 << (ox + x) for ox, oy in offsets if oy == y) for y in range(self.height+1))
+            for x in range(self.max_x+1)
+        ]
     
     def at_position(self, pos):
         for o in self.offsets:
@@ -74,124 +82,106 @@ EXAMPLE_DATA="""\
 >>><<><>><<<>><>>><<<>>><<<><<<>><>><<>>"""
 
 
-def solve(d, N=2022, fast=False):
-    JET_DIRS = d
-    jet_index = 0
-    JET_TO_X_OFFSET={'>':1,'<':-1}
-
-    cave = {}
-    def hits_other_rock(rock, rock_pos):
-        for o_pos in rock.at_position(rock_pos):
-            if o_pos in cave:
-                return True
-        return False
-
-    def print_cave(rock, rock_pos, rock_char='*'):
-        if rock_char!='*':
-            return
-        max_y = highest_rock_y
-        rock_in_cave = {}
-        if rock:
-            rock_in_cave = {p:rock_char for p in rock.at_position(rock_pos)}
-            max_y = max([*[p[1] for p in rock_in_cave], max_y ])
-        for y in range(max_y,-1,-1):
-            print(f"{y:4} ", end='')
-            for x in range(0,7):
-                print(cave.get((x,y),rock_in_cave.get((x,y),'.')), end='')
-            print()
-        print()
-
-    highest_rock_y = 0
-    num_rocks_stopped = 0
-    rock_index = 0
-    current_rock = None
-    current_rock_origin = None
-
-    next_action = "JET" # or FALL
-
-    # for fast solution with cycle detection
-    cycle_items = []
-    cycle_values = []
-    num_cycles_found = 0
-    
-    if True:
-        while num_rocks_stopped < N:
-                
-            if not current_rock:
-                if fast:
-                    top_layer = ''.join([cave.get((x,highest_rock_y-1),'.') for x in range(7)])
-                    current_state = (rock_index, jet_index, top_layer)
-                    if top_layer.count('#') == 4 and current_state in cycle_items:
-                        start_cycle = cycle_items.index(current_state)
-                        cycle_items = cycle_items[start_cycle:] + [current_state]
-                        new_cycle_values = cycle_values[start_cycle:] + [highest_rock_y]
-
-                        # full cycle available
-                        prev_v = cycle_values[start_cycle]
-                        stack_incr_per_block = []
-                        for v in new_cycle_values[1:]:
-                            stack_incr_per_block.append(v- prev_v)
-                            prev_v = v
-
-                        num_remaining = N - num_rocks_stopped
-                        num_cycles = num_remaining // len(stack_incr_per_block)
-                        stack_size_per_cycle = sum(v for v in stack_incr_per_block)
-                        remaining_blocks = num_remaining % len(stack_incr_per_block)
-                        remaining_size = sum(v for v in stack_incr_per_block[:remaining_blocks])
-                        result = highest_rock_y + num_cycles*stack_size_per_cycle + remaining_size
-                        return result
-                        
-                    cycle_items.append((rock_index, jet_index, top_layer))
-                    cycle_values.append(highest_rock_y)  
-
-                # new rock appears
-                current_rock = ROCKS[rock_index]
-                rock_index = (rock_index+1) % len(ROCKS) # setup for next cycle
-                current_rock_origin = (2,3+highest_rock_y)
-                next_action = "JET"
-
-
-            if next_action == "JET":
-                jet_dir = JET_DIRS[jet_index]
-                #print(next_action, jet_dir, jet_index)
-
-                jet_index = (jet_index+1) % len(JET_DIRS) # cycle to new jet for next round
-                next_action = "FALL"
-
-
-                x_offset = JET_TO_X_OFFSET[jet_dir]
-                new_rock_origin = (current_rock_origin[0]+x_offset, current_rock_origin[1])
-                if new_rock_origin[0] < 0 or new_rock_origin[0]+current_rock.width > 6:
-                    # hit the wall
-                    pass
-                elif hits_other_rock(current_rock, new_rock_origin):
-                    # hit other rock
-                    pass
-                else:
-                    # all OK update the position
-                    current_rock_origin = new_rock_origin
-            elif next_action == "FALL":
-                #print(next_action)
-                next_action = "JET" 
-
-                new_rock_origin = (current_rock_origin[0], current_rock_origin[1]-1)
-                stopped = False
-                if new_rock_origin[1] < 0:
-                    # hit the floor
-                    stopped = True
-                elif hits_other_rock(current_rock, new_rock_origin):
-                    stopped = True
+JET_TO_X_OFFSET={'>':1,'<':-1}
+
+class Chamber:
+    """
+    The chamber as a bytearray with one bitmask per row. Rows at
+    and above 'height' are always empty.
+    """
+    def __init__(self, jets):
+        self.jets = [JET_TO_X_OFFSET[j] for j in jets]
+        self.rows = bytearray(64)
+        self.height = 0
+        self.rock_index = 0
+        self.jet_index = 0
+        self.num_rocks = 0
+
+    def drop(self):
+        """
+        Drops the next rock until it comes to rest.
+        """
+        rock = ROCKS[self.rock_index]
+        self.rock_index = (self.rock_index + 1) % len(ROCKS)
+        masks, max_x = rock.masks, rock.max_x
+        rows, jets = self.rows, self.jets
+        num_jets = len(jets)
+        jet_index = self.jet_index
+        height = self.height
+        x = 2
+
+        # the first three jets happen above the stack, only the walls matter
+        for _ in range(3):
+            nx = x + jets[jet_index]
+            jet_index = (jet_index + 1) % num_jets
+            if 0 <= nx <= max_x:
+                x = nx
+        y = height
+
+        while True:
+            nx = x + jets[jet_index]
+            jet_index = (jet_index + 1) % num_jets
+            if 0 <= nx <= max_x:
+                for i, m in enumerate(masks[nx]):
+                    if rows[y+i] & m:
+                        break
                 else:
-                    current_rock_origin = new_rock_origin
-                
-                if stopped:
-                    num_rocks_stopped += 1
-                    cave.update({p:'#' for p in current_rock.at_position(current_rock_origin)})
-                    highest_rock_y = max(p[1] for p,v in cave.items() if v=='#') +1#[highest_rock_y, current_rock_origin[1]+current_rock.height+1])
-                    current_rock = None # trigger new rock to appear
+                    x = nx
+            if y == 0:
+                break
+            for i, m in enumerate(masks[x]):
+                if rows[y-1+i] & m:
+                    break
+            else:
+                y -= 1
+                continue
+            break
+
+        for i, m in enumerate(masks[x]):
+            rows[y+i] |= m
+        self.height = max(height, y + len(masks[x]))
+        if len(rows) < self.height + 8:
+            rows.extend(bytes(len(rows)))
+        self.jet_index = jet_index
+        self.num_rocks += 1
+
+    def profile(self, num_rows):
+        """
+        Returns the top 'num_rows' rows of the stack.
+        """
+        return bytes(self.rows[max(0, self.height-num_rows):self.height])
+
+    def __str__(self):
+        lines = []
+        for y in range(self.height-1, -1, -1):
+            lines.append(f"{y:4} " + ''.join('#' if self.rows[y] & (1 << x) else '.' for x in range(CHAMBER_WIDTH)))
+        return "\n".join(lines)
+
+# number of rows at the top of the stack used to detect a repeat
+PROFILE_ROWS = 32
+
+def solve(d, N=2022, fast=False, profile_rows=PROFILE_ROWS):
+    """
+    Returns the height of the stack after N rocks. With 'fast' the
+    simulation stops as soon as a (rock, jet, top rows) state repeats
+    and the remaining full cycles are added at once.
+    """
+    chamber = Chamber(d)
+    skipped_height = 0
+    seen = {}
+    while chamber.num_rocks < N:
+        if fast and not skipped_height:
+            state = (chamber.rock_index, chamber.jet_index, chamber.profile(profile_rows))
+            if state in seen:
+                prev_rocks, prev_height = seen[state]
+                cycle_rocks = chamber.num_rocks - prev_rocks
+                num_cycles = (N - chamber.num_rocks) // cycle_rocks
+                skipped_height = num_cycles * (chamber.height - prev_height)
+                N -= num_cycles * cycle_rocks
             else:
-                raise ValueError(f"Unknown action {next_action}")
-    return highest_rock_y
+                seen[state] = (chamber.num_rocks, chamber.height)
+        chamber.drop()
+    return chamber.height + skipped_height
                 
 
 def test_example():
@@ -214,8 +204,27 @@ def test_part2():
     print('PART 2:', result)
     assert(1532163742758 == result)
 
+def test_no_cycle_skip():
+    assert(3068 == solve(EXAMPLE_DATA, N=2022))
+    assert(3147 == solve(data(), N=2022))
+
+def benchmark(num_rocks=1_000_000):
+    import time
+    start = time.perf_counter()
+    height = solve(data(), N=num_rocks)
+    elapsed = time.perf_counter() - start
+    print(f"{num_rocks} rocks: height {height}, {elapsed:.2f} s ({num_rocks/elapsed:.0f} rocks/s)")
+    start = time.perf_counter()
+    height = solve(data(), N=PART2_N, fast=True)
+    elapsed = time.perf_counter() - start
+    print(f"{PART2_N} rocks with cycle skipping: height {height}, {elapsed*1000:.1f} ms")
+
 if __name__ == "__main__":
-    test_example()
-    test_part1()
-    test_example2()
-    test_part2()
\ No newline at end of file
+    import sys
+    if 'bench' in sys.argv[1:]:
+        benchmark()
+    else:
+        test_example()
+        test_part1()
+        test_example2()
+        test_part2()
\ No newline at end of file
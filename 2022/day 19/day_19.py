@@ -52,111 +52,126 @@ def parse(d):
         blueprints[bp_number] = {'robot_costs': robots, 'max_robots': max_robots}
     return blueprints
 
-import collections
-import math
-
-
-class Option:
-    def __init__(self, bp, t, robots, resources):
-        self.bp = bp
-        self.t = t
-        self.robots = robots
-        self.resources = resources
-
-    def __str__(self):
-        return f"t={self.t} resource={self.resources.items()} robots={self.robots.items()}"
-
-    def sort_key(self):
-        return (
-
-            -self.resources['geode'],
-            #-self.robots['geode'],
-            -(self.robots['obsidian'] > 0),
-            -(self.robots['clay'] > 0),
-                                                    
-            -len(self.robots),
-            self.resources['ore'],
-                        #self.t,
-
-        )
-
-    def __lt__(self, other):
-        return self.sort_key() < other.sort_key()
-
-    def can_create_robot_with_resources(self, robot_type, resources):
-        test_resources = resources.copy()
-        for r,v in self.bp['robot_costs'][robot_type].items():
-            test_resources[r] -= v
-        if all(v >= 0 for v in test_resources.values()):
-            # enough resources
-            return True, test_resources
-        return False, resources
-
-    def max_geodes(self, END_T):
-        """The maximum number of geodes to obtain assuming you are able to build a new geode robot eveyr minute"""
-        max_geode = self.resources['geode']
-        nr_geode = self.robots['geode']
-        for _ in range(self.t+1, END_T+1):
-            max_geode += nr_geode
-            nr_geode+=1
-        return max_geode
-
-    
-    def next_options(self, END_T):
-        # assume we do nothing until end
-        t_remaining = END_T - self.t
-        if t_remaining > 0:
-            next_resources = self.resources.copy()
-            for r,n in self.robots.items():
-                next_resources[r] += n*t_remaining
-            yield Option(self.bp, END_T, self.robots.copy(), next_resources)
-
-        for robot, cost in self.bp['robot_costs'].items():
-            if robot in self.bp['max_robots']:
-                if self.robots[robot] >= self.bp['max_robots'][robot]:
-                    # don't build more than needed robot
-                    continue
-            
-            can_build = True
-            needed_times = []
-            for r,c in cost.items():
-                needed = c - self.resources[r]
-                if needed > 0:
-                    nr = self.robots[r]
-                    if nr > 0:
-                        needed_times.append(math.ceil(needed/nr))
-                    else:
-                        can_build = False
-                else:
-                    needed_times.append(0)
-
-            if can_build:
-                max_needed_time = max(needed_times)
-                new_t = self.t + max_needed_time+1
-                if new_t <= END_T:
-                    new_resources = self.resources.copy()
-                    for r,n in self.robots.items():
-                        new_resources[r] += (n*max_needed_time)
-                    new_robots = self.robots.copy()
-                    new_robots[robot] += 1
-                    for r,c in cost.items():
-                        new_resources[r] -= c
-                    assert(all(v >= 0 for v in new_resources.values()))
-                    for r,n in self.robots.items():
-                        new_resources[r] += n
-
-                    yield Option(
-                        self.bp,
-                        new_t, 
-                        new_robots,
-                        new_resources
-                        )
-
-
-            
-import heapq
-
-def solve(d, part2=False):
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+RESOURCES = ('ore', 'clay', 'obsidian', 'geode')
+
+def compile_blueprint(bp):
+    """
+    Returns the robot costs as a flat tuple:
+    (ore robot ore, clay robot ore, obsidian robot ore, obsidian robot clay,
+     geode robot ore, geode robot obsidian)
+    """
+    c = bp['robot_costs']
+    return (
+        c['ore']['ore'],
+        c['clay']['ore'],
+        c['obsidian']['ore'], c['obsidian']['clay'],
+        c['geode']['ore'], c['geode']['obsidian'],
+    )
+
+def _ceil_div(needed, rate):
+    return (needed + rate - 1) // rate if needed > 0 else 0
+
+def max_geodes(costs, END_T):
+    """
+    Depth first branch and bound over the next robot to build.
+
+    A state is the tuple (t_remaining, ore robots, clay robots,
+    obsidian robots, ore, clay, obsidian, geodes). Geode robots are
+    not part of the state, all geodes a new geode robot will crack
+    are added when it is built.
+
+    A state is pruned when:
+    - its relaxed bound cannot beat the best so far. The bound assumes
+      unlimited ore and allows building a clay, obsidian and geode robot
+      in the same minute.
+    - an earlier state with the same time and robots had at least as much
+      of every resource and geodes (dominance).
+
+    Returns (geodes, nodes expanded).
+    """
+    ore_ore, clay_ore, obs_ore, obs_clay, geo_ore, geo_obs = costs
+    # the factory builds one robot per minute, more robots than
+    # the highest cost of a resource are never needed
+    max_ore_robots = max(ore_ore, clay_ore, obs_ore, geo_ore)
+    best = 0
+    nodes = 0
+    seen = {}
+    stack = [(END_T, 1, 0, 0, 0, 0, 0, 0)]
+    while stack:
+        t, r_ore, r_clay, r_obs, ore, clay, obs, geodes = stack.pop()
+        nodes += 1
+        if geodes > best:
+            best = geodes
+
+        bound, c, o, rc, ro = geodes, clay, obs, r_clay, r_obs
+        for t_bound in range(t, 0, -1):
+            new_ro = 0
+            if o >= geo_obs:
+                o -= geo_obs
+                bound += t_bound - 1
+            if c >= obs_clay:
+                c -= obs_clay
+                new_ro = 1
+            o += ro
+            c += rc
+            ro += new_ro
+            rc += 1
+        if bound <= best:
+            continue
+
+        key = (t, r_ore, r_clay, r_obs)
+        others = seen.setdefault(key, [])
+        if any(o_ore >= ore and o_clay >= clay and o_obs >= obs and o_geodes >= geodes
+               for o_ore, o_clay, o_obs, o_geodes in others):
+            continue
+        others.append((ore, clay, obs, geodes))
+
+        # wait (if needed) and build the next robot, pushed in the
+        # order that pops geode robots first
+        if r_ore < max_ore_robots:
+            dt = _ceil_div(ore_ore - ore, r_ore) + 1
+            if dt < t:
+                stack.append((t-dt, r_ore+1, r_clay, r_obs,
+                    ore + r_ore*dt - ore_ore, clay + r_clay*dt, obs + r_obs*dt, geodes))
+        if r_clay < obs_clay:
+            dt = _ceil_div(clay_ore - ore, r_ore) + 1
+            if dt < t:
+                stack.append((t-dt, r_ore, r_clay+1, r_obs,
+                    ore + r_ore*dt - clay_ore, clay + r_clay*dt, obs + r_obs*dt, geodes))
+        if r_clay and r_obs < geo_obs:
+            dt = max(_ceil_div(obs_ore - ore, r_ore), _ceil_div(obs_clay - clay, r_clay)) + 1
+            if dt < t:
+                stack.append((t-dt, r_ore, r_clay, r_obs+1,
+                    ore + r_ore*dt - obs_ore, clay + r_clay*dt - obs_clay, obs + r_obs*dt, geodes))
+        if r_obs:
+            dt = max(_ceil_div(geo_ore - ore, r_ore), _ceil_div(geo_obs - obs, r_obs)) + 1
+            if dt < t:
+                stack.append((t-dt, r_ore, r_clay, r_obs,
+                    ore + r_ore*dt - geo_ore, clay + r_clay*dt, obs + r_obs*dt - geo_obs, geodes + t - dt))
+    return best, nodes
+
+def _evaluate(args):
+    bp_num, costs, END_T = args
+    start = time.perf_counter()
+    geodes, nodes = max_geodes(costs, END_T)
+    return bp_num, geodes, nodes, time.perf_counter() - start
+
+def evaluate_blueprints(blueprints, END_T, max_workers=None):
+    """
+    Returns (blueprint number, geodes, nodes expanded, seconds) per blueprint.
+    The blueprints are independent and evaluated in parallel
+    unless max_workers is 1.
+    """
+    jobs = [(bp_num, compile_blueprint(bp), END_T) for bp_num, bp in blueprints.items()]
+    if max_workers == 1:
+        return [*map(_evaluate, jobs)]
+    with ProcessPoolExecutor(max_workers) as executor:
+        return [*executor.map(_evaluate, jobs)]
+
+def solve(d, part2=False, max_workers=None, report=False):
     blueprint = parse(d)
     END_T = 24
     if part2:
@@ -164,29 +179,9 @@ def solve(d, part2=False):
         blueprint = {bp_num:bp for bp_num, bp in blueprint.items() if bp_num <= 3}
 
     result = 0 if not part2 else 1
-    for bp_num, bp in blueprint.items():
-        options = [Option(bp,
-                    t=1,
-                    robots=collections.defaultdict(int,{'ore':1}),
-                    resources=collections.defaultdict(int,{'ore':1}))]
-
-        max_geode = 0
-        while options:
-            this_option = heapq.heappop(options)
-            if True:
-                if this_option.resources['geode'] > max_geode:
-                    max_geode = this_option.resources['geode']
-                    if this_option.t == END_T:
-                        print(this_option)
-                    # remove any options that theoretically cannot reach above max_geode
-                    options = [opt for opt in options if opt.max_geodes(END_T) >= max_geode]
-                    heapq.heapify(options)
-
-            if this_option.t < END_T:
-                for new_option in this_option.next_options(END_T):
-                    if new_option.max_geodes(END_T) >= max_geode:
-                        heapq.heappush(options, new_option)
-                    
+    for bp_num, max_geode, nodes, seconds in evaluate_blueprints(blueprint, END_T, max_workers):
+        if report:
+            print(f"blueprint {bp_num:2}: {max_geode:3} geodes, {nodes:6} nodes, {seconds*1000:7.1f} ms")
         if not part2:
             result += bp_num*max_geode
         else:
@@ -216,8 +211,19 @@ def test_part2():
     print('PART 2:', result)
     assert(21080 == result)
 
+def benchmark():
+    for name, part2 in [('PART 1', False), ('PART 2', True)]:
+        print(name)
+        start = time.perf_counter()
+        result = solve(data(), part2=part2, report=True)
+        print(f"{name}: {result} in {(time.perf_counter()-start)*1000:.1f} ms")
+
     
 if __name__ == "__main__":
+    import sys
+    if 'bench' in sys.argv[1:]:
+        benchmark()
+        sys.exit()
     test_example()
     test_part1()
     test_example2()
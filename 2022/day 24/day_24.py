@@ -131,88 +131,97 @@ class Valley:
 
         return additional_info, initial_valley
 
-class State(namedtuple("State", "minute current_pos end_pos")):
+class BlizzardTables:
+    """
+    Blizzard occupancy as bitmasks per valley row, bit i is the
+    inner column x=i+1. Horizontal blizzards stay in their row and
+    rotate with the minute. Vertical blizzards stay in their column,
+    so at minute t the blizzards in row y are the ones that started
+    in row y-t (moving down) or y+t (moving up).
+    """
+    def __init__(self, d):
+        lines = d.strip().splitlines()
+        inner = [line[1:-1] for line in lines[1:-1]]
+        self.w = len(inner[0])
+        self.h = len(inner)
+        self.full = (1 << self.w) - 1
+        # columns of the openings in the top and bottom wall
+        self.start_x = lines[0].index('.') - 1
+        self.end_x = lines[-1].index('.') - 1
+        self.blizzard_cycle = math.lcm(self.w, self.h)
+
+        def row_masks(c):
+            return [sum(1 << i for i, v in enumerate(row) if v == c) for row in inner]
+        right, left = row_masks('>'), row_masks('<')
+        self.down, self.up = row_masks('v'), row_masks('^')
+
+        w, full = self.w, self.full
+        def rotate(m, k):
+            k %= w
+            return ((m << k) | (m >> (w - k))) & full
+        # horizontal blizzards per (minute % w) and row
+        self.horizontal = [
+            [rotate(r, t) | rotate(l, -t) for r, l in zip(right, left)]
+            for t in range(w)
+        ]
+
+    def blocked(self, y, t):
+        """
+        Returns the bitmask of the blizzards in row y at minute t.
+        """
+        h = self.h
+        return self.horizontal[t % self.w][y] | self.down[(y - t) % h] | self.up[(y + t) % h]
+
+    def is_free(self, x, y, t):
+        """
+        True if the valley position (x, y) has no blizzard at minute t.
+        """
+        if not (1 <= y <= self.h and 1 <= x <= self.w):
+            return (x, y) in ((self.start_x + 1, 0), (self.end_x + 1, self.h + 1))
+        return not (self.blocked(y - 1, t) >> (x - 1)) & 1
+
+    def find_path(self, t0=0, forward=True):
+        """
+        Breadth first search that moves the whole frontier (one bitmask
+        per row) a minute at a time. Starts at minute t0 at the start
+        (or end if not forward) and returns the minute the other
+        opening is reached.
+        """
+        h, full = self.h, self.full
+        entry_y, entry_bit, exit_y, exit_bit = 0, 1 << self.start_x, h - 1, 1 << self.end_x
+        if not forward:
+            entry_y, entry_bit, exit_y, exit_bit = exit_y, exit_bit, entry_y, entry_bit
+        frontier = [0]*h
+        t = t0
+        while True:
+            if frontier[exit_y] & exit_bit:
+                return t + 1
+            t += 1
+            new_frontier = []
+            for y in range(h):
+                reach = frontier[y]
+                reach |= (reach << 1) | (reach >> 1)
+                if y > 0:
+                    reach |= frontier[y-1]
+                if y < h - 1:
+                    reach |= frontier[y+1]
+                new_frontier.append(reach & full & ~self.blocked(y, t))
+            # waiting at the entry is always possible
+            new_frontier[entry_y] |= entry_bit & ~self.blocked(entry_y, t)
+            frontier = new_frontier
 
-    def __lt__(self, other):
-        return self.sort_key() < other.sort_key()
-
-    def sort_key(self):
-        d_end = self.dist_end()
-        return (self.minute, d_end)
-
-    def accept_key(self):
-        return (self.current_pos, self.minute)
-
-    def dist_end(self):
-        return abs(self.current_pos[0]-self.end_pos[0])+abs(self.current_pos[1]-self.end_pos[1])
-
-import heapq
 import math
 
 def solve(d, part2=False):
-    info, initial_valley = Valley.parse(d)
-    blizzard_cycle = info['blizzard_cycle']
-
-
-    start_pos = info['start_pos']
-    end_pos = info['end_pos']
-
-    all_valleys = {}
-    all_valleys[0] = initial_valley
+    tables = BlizzardTables(d)
     if not part2:
-        return find_path(all_valleys, blizzard_cycle, State(0, info['start_pos'], end_pos), end_pos)
+        return tables.find_path()
     else:
-        prev_minute = 0
-        for (start, end) in [(start_pos, end_pos), (end_pos, start_pos), (start_pos, end_pos)]:
-            end_minute = find_path(all_valleys, blizzard_cycle, State(prev_minute, start, end), end)
-            print(start, end, end_minute)
-            prev_minute = end_minute
+        end_minute = 0
+        for forward in [True, False, True]:
+            end_minute = tables.find_path(end_minute, forward)
+            print('forward' if forward else 'back', end_minute)
         return end_minute
-        
-
-
-
-def find_path(all_valleys, blizzard_cycle, initial_state, end_pos):
-    states = [initial_state]
-    num_evaluations = 0
-    accepted = {}
-    while states:
-        num_evaluations += 1
-        current_state = heapq.heappop(states)
-        current_valley = all_valleys[current_state.minute % blizzard_cycle]
-
-        if not current_state.accept_key() in accepted or current_state < accepted[current_state.accept_key()]:
-            accepted[current_state.accept_key()] = current_state
-            if num_evaluations % 100 == 0:
-                print(len(states), current_state.sort_key())
-            if current_state.current_pos == end_pos:
-                print('FOUND exit', current_state.minute)
-                return current_state.minute
-        else:
-            continue
-
-
-        new_state = current_state._replace(minute=current_state.minute+1)
-        try:
-            new_valley = all_valleys[new_state.minute % blizzard_cycle]
-        except KeyError:
-            new_valley = current_valley.move_blizzards()
-            all_valleys[new_state.minute % blizzard_cycle] = new_valley
-
-        new_states = []
-        if new_valley.is_valid_position(new_state.current_pos):
-            # keep current position
-            new_states.append(new_state)
-            #heapq.heappush(states, new_state)
-        for D in DIRS.values():
-            c_pos = new_state.current_pos
-            new_pos = (c_pos[0]+D[0], c_pos[1]+D[1])
-            if new_valley.is_valid_position(new_pos):
-                new_states.append(new_state._replace(current_pos=new_pos))
-        
-        for ns in new_states:
-            if not ns.accept_key() in accepted:
-                heapq.heappush(states, ns)
 
 
 def test_example_small():
@@ -240,8 +249,30 @@ def test_part2():
     print('PART 2:', result)
     assert(861 == result)
 
+def test_tables_match_valley():
+    _, valley = Valley.parse(EXAMPLE_DATA)
+    tables = BlizzardTables(EXAMPLE_DATA)
+    for t in range(2*tables.blizzard_cycle):
+        for pos in valley.valley:
+            assert(valley.is_valid_position(pos) == tables.is_free(*pos, t))
+        valley = valley.move_blizzards()
+
+def benchmark():
+    import time
+    start = time.perf_counter()
+    tables = BlizzardTables(data())
+    print(f"tables: {(time.perf_counter()-start)*1000:.1f} ms")
+    for name, part2 in [('PART 1', False), ('PART 2', True)]:
+        start = time.perf_counter()
+        result = solve(data(), part2)
+        print(f"{name}: {result} in {(time.perf_counter()-start)*1000:.1f} ms")
+
 
 if __name__ == "__main__":
+    import sys
+    if 'bench' in sys.argv[1:]:
+        benchmark()
+        sys.exit()
     test_example_small()
     test_example()
     test_part1()
@@ -152,7 +152,8 @@ def test_mapping_cascade():
 
 def solve(data, part2=False):
     seeds, maps = parse(data)
-    locations = [map_value_cascade(seed, maps.values()) for seed in seeds]
+    seed_to_location = compose_almanac(maps)
+    locations = [seed_to_location(seed) for seed in seeds]
     return min(locations)
 
 
@@ -256,7 +257,11 @@ from heapq import heappush, heappop, heapify
 HeapElement = namedtuple("HeapElement", "map_index d_to_s_range")
 
 
-def solve2(data):
+def solve2_heap(data):
+    """
+    Reverse search from the lowest location ranges back to the seeds,
+    stops at the first range that overlaps a seed range.
+    """
     seeds, maps = parse(data)
     seed_ranges = [(s, s + l) for s, l in zip(seeds[::2], seeds[1::2])]
     seed_ranges.sort(key=lambda r: r[0])
@@ -297,6 +302,177 @@ def solve2(data):
     return lowest_location
 
 
+from bisect import bisect_right
+
+
+class PiecewiseMap:
+    """
+    Piecewise-linear map on the non-negative integers.
+
+    Segment i covers [starts[i], starts[i+1]) (the last one is
+    unbounded) and maps x to x + offsets[i]. starts[0] is always 0.
+    """
+
+    def __init__(self, starts, offsets):
+        self.starts = starts
+        self.offsets = offsets
+
+    @staticmethod
+    def from_mappings(mappings):
+        """
+        Builds the map for a single almanac map, values outside
+        all mappings are mapped to themselves.
+        """
+        starts, offsets = [0], [0]
+        for m in sorted(mappings, key=lambda m: m.s_start):
+            if m.s_start > starts[-1]:
+                starts.append(m.s_start)
+                offsets.append(0)
+            elif m.s_start == starts[-1]:
+                starts.pop()
+                offsets.pop()
+            starts.append(m.s_start)
+            offsets.append(m.d_start - m.s_start)
+            starts.append(m.s_start + m.length)
+            offsets.append(0)
+        return PiecewiseMap(starts, offsets)._merged()
+
+    def _merged(self):
+        """
+        Removes breakpoints between segments with the same offset.
+        """
+        starts, offsets = [self.starts[0]], [self.offsets[0]]
+        for start, offset in zip(self.starts[1:], self.offsets[1:]):
+            if offset != offsets[-1]:
+                starts.append(start)
+                offsets.append(offset)
+        self.starts, self.offsets = starts, offsets
+        return self
+
+    def __call__(self, value):
+        return value + self.offsets[bisect_right(self.starts, value) - 1]
+
+    def then(self, other):
+        """
+        Returns the composition other(self(x)). The image of every
+        segment is split at the breakpoints of 'other' it covers.
+        """
+        starts, offsets = [], []
+        o_starts, o_offsets = other.starts, other.offsets
+        ends = self.starts[1:] + [None]
+        for start, end, offset in zip(self.starts, ends, self.offsets):
+            # the segment maps to [start + offset, end + offset)
+            i = bisect_right(o_starts, start + offset) - 1
+            starts.append(start)
+            offsets.append(offset + o_offsets[i])
+            i += 1
+            while i < len(o_starts) and (end is None or o_starts[i] < end + offset):
+                starts.append(o_starts[i] - offset)
+                offsets.append(offset + o_offsets[i])
+                i += 1
+        return PiecewiseMap(starts, offsets)._merged()
+
+    def map_ranges(self, ranges):
+        """
+        Maps half-open (start, end) ranges, returns the image ranges.
+        The ranges are sorted and overlapping ones are merged first, so
+        a single sweep over the breakpoints splits all of them.
+        """
+        starts, offsets = self.starts, self.offsets
+        num_segments = len(starts)
+        result = []
+        i = 0
+        for r_start, r_end in merge_ranges(ranges):
+            while i + 1 < num_segments and starts[i+1] <= r_start:
+                i += 1
+            while r_start < r_end:
+                segment_end = starts[i+1] if i + 1 < num_segments else r_end
+                piece_end = min(r_end, segment_end)
+                result.append((r_start + offsets[i], piece_end + offsets[i]))
+                r_start = piece_end
+                if piece_end == segment_end:
+                    i += 1
+        return result
+
+    def min_image(self, ranges):
+        """
+        Returns the lowest value the ranges map to.
+
+        Only the first covered value of every segment matters. A value x
+        is covered when more ranges start than end at or before x, so
+        the sorted starts and ends are all that is needed.
+        """
+        range_starts = sorted([start for start, _ in ranges])
+        range_ends = sorted([end for _, end in ranges])
+        ends = self.starts[1:] + [None]
+        lowest = None
+        for start, end, offset in zip(self.starts, ends, self.offsets):
+            if bisect_right(range_starts, start) > bisect_right(range_ends, start):
+                first = start
+            else:
+                # the first range starting after the segment start
+                j = bisect_right(range_starts, start)
+                if j == len(range_starts):
+                    continue
+                first = range_starts[j]
+                if end is not None and first >= end:
+                    continue
+            if lowest is None or first + offset < lowest:
+                lowest = first + offset
+        return lowest
+
+
+def merge_ranges(ranges):
+    """
+    Returns the union of half-open ranges as sorted disjoint ranges.
+
+    Sorting the starts and ends separately is enough: the union has a
+    gap after the k-th end exactly when the next start lies beyond it.
+    """
+    if not ranges:
+        return []
+    starts = sorted([start for start, _ in ranges])
+    ends = sorted([end for _, end in ranges])
+    merged = []
+    current_start = starts[0]
+    for end, next_start in zip(ends, starts[1:]):
+        if next_start > end:
+            merged.append((current_start, end))
+            current_start = next_start
+    merged.append((current_start, ends[-1]))
+    return merged
+
+
+def compose_almanac(maps):
+    """
+    Composes all almanac maps (in order) into a single PiecewiseMap.
+    """
+    maps = [PiecewiseMap.from_mappings(m) for m in maps.values()]
+    result = maps[0]
+    for m in maps[1:]:
+        result = result.then(m)
+    return result
+
+
+def test_piecewise_map():
+    seeds, maps = parse(EXAMPLE_DATA)
+    seed_to_location = compose_almanac(maps)
+    for value in range(120):
+        assert map_value_cascade(value, maps.values()) == seed_to_location(value)
+    seed_to_soil = PiecewiseMap.from_mappings(maps["seed-to-soil"])
+    assert seed_to_soil.map_ranges([(45, 100)]) == [(45, 50), (52, 100), (50, 52)]
+    seed_ranges = [(79, 93), (55, 68), (60, 70)]
+    assert seed_to_location.min_image(seed_ranges) == min(
+        start for start, _ in seed_to_location.map_ranges(seed_ranges)
+    )
+
+
+def solve2(data):
+    seeds, maps = parse(data)
+    seed_ranges = [(s, s + l) for s, l in zip(seeds[::2], seeds[1::2])]
+    return compose_almanac(maps).min_image(seed_ranges)
+
+
 def test_example2():
     result = solve2(EXAMPLE_DATA)
     print(f"example 2: {result}")
@@ -309,6 +485,80 @@ def test_part2():
     assert result == 79004094
 
 
+def test_part2_heap():
+    assert solve2_heap(data()) == 79004094
+
+
+def synthetic_almanac(num_seed_ranges, max_seed_length, num_mappings=40, max_value=2**32, seed=5):
+    """
+    Returns an almanac with random seed ranges and maps that each
+    cut [0, max_value) into num_mappings ranges and lay those out
+    again in a random order.
+    """
+    import random
+
+    rng = random.Random(seed)
+    seeds = []
+    for _ in range(num_seed_ranges):
+        start = rng.randrange(max_value)
+        seeds += [start, rng.randrange(1, min(max_seed_length, max_value - start) + 1)]
+    lines = ["seeds: " + " ".join(map(str, seeds)), ""]
+    names = ["seed", "soil", "fertilizer", "water", "light", "temperature", "humidity", "location"]
+    for src, dst in zip(names, names[1:]):
+        cuts = sorted(rng.sample(range(1, max_value), num_mappings - 1))
+        lengths = [end - start for start, end in zip([0] + cuts, cuts + [max_value])]
+        order = [*range(num_mappings)]
+        rng.shuffle(order)
+        d_starts = [0] * num_mappings
+        d_start = 0
+        for i in order:
+            d_starts[i] = d_start
+            d_start += lengths[i]
+        lines.append(f"{src}-to-{dst} map:")
+        for d_start, s_start, length in zip(d_starts, [0] + cuts, lengths):
+            lines.append(f"{d_start} {s_start} {length}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def test_random_almanacs():
+    # small almanacs, so every value can be checked by brute force
+    for seed in range(10):
+        almanac = synthetic_almanac(5, 30, num_mappings=8, max_value=200, seed=seed)
+        seeds, maps = parse(almanac)
+        # leave gaps (identity ranges) in half of the almanacs
+        if seed % 2:
+            maps = {name: mappings[::2] for name, mappings in maps.items()}
+        seed_to_location = compose_almanac(maps)
+        for value in range(250):
+            assert seed_to_location(value) == map_value_cascade(value, maps.values())
+        seed_ranges = [(s, s + l) for s, l in zip(seeds[::2], seeds[1::2])]
+        expected = min(
+            map_value_cascade(value, maps.values()) for start, end in seed_ranges for value in range(start, end)
+        )
+        assert seed_to_location.min_image(seed_ranges) == expected
+        assert min(start for start, _ in seed_to_location.map_ranges(seed_ranges)) == expected
+
+
+def benchmark():
+    import time
+
+    for max_seed_length in [10**6, 10**3]:
+        for num_seed_ranges in [10, 1000, 100_000]:
+            almanac = synthetic_almanac(num_seed_ranges, max_seed_length)
+            start = time.perf_counter()
+            result = solve2(almanac)
+            t_map = time.perf_counter() - start
+            start = time.perf_counter()
+            result_heap = solve2_heap(almanac)
+            t_heap = time.perf_counter() - start
+            assert result == result_heap
+            print(
+                f"{num_seed_ranges:7} seed ranges (length <= {max_seed_length:7}):"
+                f" piecewise {t_map*1000:8.1f} ms, heap {t_heap*1000:8.1f} ms"
+            )
+
+
 from pathlib import Path
 
 THIS_DIR = Path(__file__).parent
@@ -317,3 +567,13 @@ THIS_DIR = Path(__file__).parent
 def data():
     with open(THIS_DIR / "input.txt") as f:
         return f.read()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "bench" in sys.argv[1:]:
+        benchmark()
+    else:
+        test_part1()
+        test_part2()
@@ -32,6 +32,12 @@ def total_load(data):
 
 
 def solve(data, part2=False):
+    platform = Platform(data)
+    platform.tilt("north")
+    return platform.load()
+
+
+def solve_strings(data):
     rows_west = to_rows(data)
 
     # currently the rows are WEST orientated, e.g. the left side if to the west
@@ -74,6 +80,7 @@ def test_part1():
     result = solve(data())
     print("Part 1:", result)
     assert result == 109833
+    assert solve_strings(data()) == result
 
 
 def tilt_right(row):
@@ -178,6 +185,112 @@ def solve2(data):
             return load
 
 
+import numpy as np
+import hashlib
+
+# tilt directions in spin order, each as a function that orients an
+# (H, W) array so the rocks roll towards index 0 along axis 0
+SPIN = {
+    "north": lambda a: a,
+    "west": lambda a: a.T,
+    "south": lambda a: a[::-1, :],
+    "east": lambda a: a.T[::-1, :],
+}
+
+
+class Platform:
+    """
+    The round rocks as an array of flat cell indices.
+
+    For every tilt direction the free cells are listed segment by
+    segment (a segment is a run of cells between two cube rocks in the
+    direction of the tilt), ordered in the direction the rocks roll.
+    Tilting only counts the round rocks per segment, a segment with
+    count c ends up with rocks in its first c cells.
+    """
+
+    def __init__(self, data):
+        grid = np.array([list(r) for r in to_rows(data)])
+        self.H, self.W = grid.shape
+        self.cube = (grid == "#").ravel()
+        self.rocks = np.flatnonzero(grid == "O")
+        self.weight = np.repeat(np.arange(self.H, 0, -1), self.W)
+        index = np.arange(self.H * self.W).reshape(self.H, self.W)
+        cube = self.cube.reshape(self.H, self.W)
+        self.segments = {d: self._segments(orient(index), orient(cube)) for d, orient in SPIN.items()}
+
+    def _segments(self, index, cube):
+        L, M = cube.shape
+        # segment number of every cell, counting along each column
+        segment = np.cumsum(cube, axis=0) + np.arange(M)[None, :] * (L + 1)
+        # the free cells, column by column in the direction of the tilt
+        free = ~cube.T.ravel()
+        cells = index.T.ravel()[free]
+        # renumber the non-empty segments 0..n-1
+        _, first, cell_segment = np.unique(segment.T.ravel()[free], return_index=True, return_inverse=True)
+        segment_of_cell = np.full(L * M, -1, dtype=np.int64)
+        segment_of_cell[cells] = cell_segment
+        return segment_of_cell, cells, first
+
+    def tilt(self, direction):
+        """
+        Tilts the platform, returns the number of round rocks per segment.
+        """
+        segment_of_cell, cells, first = self.segments[direction]
+        counts = np.bincount(segment_of_cell[self.rocks], minlength=len(first))
+        # for rock k in segment s its cell is first[s] + k - (rocks before s)
+        shift = first - (np.cumsum(counts) - counts)
+        self.rocks = cells[np.arange(len(self.rocks)) + np.repeat(shift, counts)]
+        return counts
+
+    def spin(self):
+        """
+        Runs a full spin cycle, returns a digest of the resulting state.
+        After the last (east) tilt the round rocks per segment fully
+        describe the platform.
+        """
+        for direction in SPIN:
+            counts = self.tilt(direction)
+        return hashlib.blake2b(counts.astype(np.uint32).tobytes(), digest_size=16).digest()
+
+    def load(self):
+        return int(self.weight[self.rocks].sum())
+
+    def __str__(self):
+        grid = np.full(self.H * self.W, ".")
+        grid[self.cube] = "#"
+        grid[self.rocks] = "O"
+        return "\n".join("".join(row) for row in grid.reshape(self.H, self.W))
+
+
+def test_platform():
+    platform = Platform(EXAMPLE_DATA)
+    platform.tilt("north")
+    assert platform.load() == 136
+    platform = Platform(EXAMPLE_DATA)
+    for expected in [EXAMPLE_DATA_CYCLE_1, EXAMPLE_DATA_CYCLE_2, EXAMPLE_DATA_CYCLE_3]:
+        platform.spin()
+        assert str(platform) == expected
+
+
+def solve2_platform(data, N=1_000_000_000):
+    """
+    Same as solve2, with the cycle detection keyed on the spin digest.
+    """
+    platform = Platform(data)
+    loads = [platform.load()]
+    seen = {}
+    for i in range(1, N + 1):
+        digest = platform.spin()
+        loads.append(platform.load())
+        if digest in seen:
+            cycle_start = seen[digest]
+            cycle_length = i - cycle_start
+            return loads[cycle_start + (N - cycle_start) % cycle_length]
+        seen[digest] = i
+    return loads[N]
+
+
 def test_example2():
     result = solve2(EXAMPLE_DATA)
     print(f"example 2: {result}")
@@ -190,6 +303,53 @@ def test_part2():
     assert result == 99875
 
 
+def test_example2_platform():
+    assert solve2_platform(EXAMPLE_DATA) == 64
+
+
+def test_part2_platform():
+    assert solve2_platform(data()) == 99875
+
+
+def random_platform(size, seed=14):
+    rng = np.random.default_rng(seed)
+    grid = rng.choice(np.array(list(".#O")), size=(size, size), p=[0.6, 0.15, 0.25])
+    return "\n".join("".join(row) for row in grid)
+
+
+def benchmark():
+    """
+    Full billion-spin runs on the input and a random 100x100 platform.
+    Random 1000x1000 platforms take thousands of spins before the state
+    repeats, for those only the time per spin is reported.
+    """
+    import time
+    from contextlib import redirect_stdout
+    from io import StringIO
+
+    for name, platform_data in [("input", data()), ("100x100", random_platform(100))]:
+        start = time.perf_counter()
+        result = solve2_platform(platform_data)
+        t_platform = time.perf_counter() - start
+        start = time.perf_counter()
+        with redirect_stdout(StringIO()):
+            assert result == solve2(platform_data)
+        t_strings = time.perf_counter() - start
+        print(f"{name:9}: platform {t_platform*1000:8.1f} ms, strings {t_strings*1000:8.1f} ms")
+
+    platform_data = random_platform(1000)
+    platform = Platform(platform_data)
+    num_spins = 20
+    start = time.perf_counter()
+    for _ in range(num_spins):
+        platform.spin()
+    t_platform = (time.perf_counter() - start) / num_spins
+    start = time.perf_counter()
+    run_cyle(platform_data)
+    t_strings = time.perf_counter() - start
+    print(f"1000x1000: platform {t_platform*1000:8.1f} ms, strings {t_strings*1000:8.1f} ms per spin")
+
+
 from pathlib import Path
 
 THIS_DIR = Path(__file__).parent
@@ -198,3 +358,13 @@ THIS_DIR = Path(__file__).parent
 def data():
     with open(THIS_DIR / "input.txt") as f:
         return f.read()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "bench" in sys.argv[1:]:
+        benchmark()
+    else:
+        test_part1()
+        test_part2()
@@ -83,7 +83,170 @@ def trace_beam(grid, x=0, y=0, direction="E"):
     return len(unique_position)
 
 
-def solve(data, part2=False):
+class Contraption:
+    """
+    The contraption compiled into a graph of beam segments.
+
+    A segment is the path of a beam from a start until it hits a
+    splitter from the flat side, leaves the grid or loops (through
+    mirrors only). The graph nodes are the splitters, each activated
+    splitter emits two segments. After condensing the strongly
+    connected components, the energised cells reachable from every
+    splitter are computed once as a bitset (an int with a bit per cell).
+    """
+
+    def __init__(self, data):
+        self.rows = [line for line in data.splitlines() if line]
+        self.H, self.W = len(self.rows), len(self.rows[0])
+        self.splitters = {}
+        for y, row in enumerate(self.rows):
+            for x, c in enumerate(row):
+                if c in "|-":
+                    self.splitters[x, y] = len(self.splitters)
+        # per splitter the cells of its own segments and the splitters they end in
+        cells = []
+        successors = []
+        for (x, y), node in self.splitters.items():
+            bits = 1 << (y * self.W + x)
+            ends = []
+            for d in ("NS" if self.rows[y][x] == "|" else "EW"):
+                dx, dy = DIRECTIONS[d]
+                segment_bits, end = self.trace_segment(x + dx, y + dy, d)
+                bits |= segment_bits
+                if end is not None:
+                    ends.append(end)
+            cells.append(bits)
+            successors.append(ends)
+        self.reach = self._reachable(cells, successors)
+
+    def trace_segment(self, x, y, direction):
+        """
+        Follows a beam until it activates a splitter, returns the
+        bitset of the energised cells and the splitter (or None).
+        """
+        rows, W, H = self.rows, self.W, self.H
+        bits = 0
+        seen = set()
+        while 0 <= x < W and 0 <= y < H:
+            if (x, y, direction) in seen:
+                break
+            seen.add((x, y, direction))
+            bits |= 1 << (y * W + x)
+            c = rows[y][x]
+            if (c == "|" and direction in "EW") or (c == "-" and direction in "NS"):
+                return bits, self.splitters[x, y]
+            if c in "/\\":
+                direction = TURNS[direction, c]
+            dx, dy = DIRECTIONS[direction]
+            x, y = x + dx, y + dy
+        return bits, None
+
+    @staticmethod
+    def _reachable(cells, successors):
+        """
+        Tarjan's algorithm (iterative), the components are found in
+        reverse topological order, so the successors of a component
+        are always done before the component itself.
+        """
+        n = len(cells)
+        index = [None] * n
+        low = [0] * n
+        on_stack = [False] * n
+        stack = []
+        reach = [0] * n
+        counter = 0
+        for root in range(n):
+            if index[root] is not None:
+                continue
+            work = [(root, 0)]
+            while work:
+                node, i = work.pop()
+                if i == 0:
+                    index[node] = low[node] = counter
+                    counter += 1
+                    stack.append(node)
+                    on_stack[node] = True
+                if i < len(successors[node]):
+                    work.append((node, i + 1))
+                    nxt = successors[node][i]
+                    if index[nxt] is None:
+                        work.append((nxt, 0))
+                    elif on_stack[nxt]:
+                        low[node] = min(low[node], index[nxt])
+                    continue
+                # all successors done
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component.append(member)
+                        if member == node:
+                            break
+                    # successors inside the component have no reach yet (0)
+                    bits = 0
+                    for member in component:
+                        bits |= cells[member]
+                        for nxt in successors[member]:
+                            bits |= reach[nxt]
+                    for member in component:
+                        reach[member] = bits
+        return reach
+
+    def energized(self, x=0, y=0, direction="E"):
+        bits, end = self.trace_segment(x, y, direction)
+        if end is not None:
+            bits |= self.reach[end]
+        return bits.bit_count()
+
+    def edge_starts(self):
+        max_x, max_y = self.W - 1, self.H - 1
+        start_options = []
+        start_options.extend([(x, 0, "S") for x in range(max_x + 1)])
+        start_options.extend([(x, max_y, "N") for x in range(max_x + 1)])
+        start_options.extend([(0, y, "E") for y in range(max_y + 1)])
+        start_options.extend([(max_x, y, "W") for y in range(max_y + 1)])
+        return start_options
+
+
+_worker_contraption = None
+
+
+def _init_worker(contraption):
+    global _worker_contraption
+    _worker_contraption = contraption
+
+
+def _energized_chunk(starts):
+    return max(_worker_contraption.energized(*start) for start in starts)
+
+
+def solve(data, part2=False, max_workers=None):
+    contraption = Contraption(data)
+    if not part2:
+        result = contraption.energized()
+    else:
+        start_options = contraption.edge_starts()
+        if max_workers == 1:
+            return max(contraption.energized(*start) for start in start_options)
+        from concurrent.futures import ProcessPoolExecutor
+        import os
+
+        num_workers = max_workers or os.cpu_count() or 1
+        chunk_size = max(1, -(-len(start_options) // num_workers))
+        chunks = [start_options[i : i + chunk_size] for i in range(0, len(start_options), chunk_size)]
+        with ProcessPoolExecutor(len(chunks), initializer=_init_worker, initargs=(contraption,)) as executor:
+            result = max(executor.map(_energized_chunk, chunks))
+    return result
+
+
+def solve_flood(data, part2=False):
+    """
+    Original solution, a separate flood fill for every start.
+    """
     grid = parse(data)
     if not part2:
         result = trace_beam(grid)
@@ -128,6 +291,39 @@ def test_part2():
     assert result == 7716
 
 
+def test_contraption():
+    for d in [data("example.txt"), data()]:
+        contraption = Contraption(d)
+        grid = parse(d)
+        for start in contraption.edge_starts()[::7]:
+            assert contraption.energized(*start) == trace_beam(grid, *start)
+
+
+def test_more_workers_than_starts():
+    num_starts = len(Contraption(data("example.txt")).edge_starts())
+    assert solve(data("example.txt"), part2=True, max_workers=num_starts + 24) == 51
+
+
+def benchmark():
+    import time
+
+    start = time.perf_counter()
+    result_flood = solve_flood(data(), part2=True)
+    t_flood = time.perf_counter() - start
+    start = time.perf_counter()
+    contraption = Contraption(data())
+    t_compile = time.perf_counter() - start
+    result = max(contraption.energized(*s) for s in contraption.edge_starts())
+    t_serial = time.perf_counter() - start
+    start = time.perf_counter()
+    result_parallel = solve(data(), part2=True)
+    t_parallel = time.perf_counter() - start
+    assert result_flood == result == result_parallel
+    print(f"flood per start   : {t_flood*1000:8.1f} ms")
+    print(f"segment graph     : {t_serial*1000:8.1f} ms (compile {t_compile*1000:.1f} ms)")
+    print(f"segment graph pool: {t_parallel*1000:8.1f} ms")
+
+
 from pathlib import Path
 
 THIS_DIR = Path(__file__).parent
@@ -136,3 +332,13 @@ THIS_DIR = Path(__file__).parent
 def data(fn="input.txt"):
     with open(THIS_DIR / fn) as f:
         return f.read()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "bench" in sys.argv[1:]:
+        benchmark()
+    else:
+        test_part1()
+        test_part2()
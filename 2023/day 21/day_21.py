@@ -141,15 +141,16 @@ def test_part2():
     This causes the solution to be a quadratic equation.
     This does not work for the more general input in the example.
 
-    The basic solve function is still used to compute the first 3 values.
-    And this one I derived myself, although is is probably not the most efficient way.
+    The first 3 values are computed with a single layered BFS (count_reachable),
+    the basic solve function gives the same values but is a lot slower.
     """
     N = 26501365
     width = 131
     remainder = N % width
-    v1 = solve(data(), N=remainder, part2=True)
-    v2 = solve(data(), N=remainder + width, part2=True)
-    v3 = solve(data(), N=remainder + 2 * width, part2=True)
+    counts = count_reachable(data(), [remainder, remainder + width, remainder + 2 * width])
+    v1 = counts[remainder]
+    v2 = counts[remainder + width]
+    v3 = counts[remainder + 2 * width]
 
     # * Lagrange's Interpolation formula for ax^2 + bx + c with x=[0,1,2] and y=[y0,y1,y2] we have
     # *   f(x) = (x^2-3x+2) * y0/2 - (x^2-2x)*y1 + (x^2-x) * y2/2
@@ -176,6 +177,123 @@ def test_part2():
     assert result == 632257949158206
 
 
+import numpy as np
+
+
+def parse_garden(data):
+    """
+    Returns the garden plots as boolean array and the start (row, column).
+    """
+    rows = [line.strip() for line in data.splitlines() if line.strip()]
+    grid = np.array([list(r) for r in rows])
+    start = tuple(int(v) for v in np.argwhere(grid == "S")[0])
+    return grid != "#", start
+
+
+def count_reachable(data, step_counts, tiled=True):
+    """
+    Returns {N: number of plots reachable in exactly N steps}.
+
+    Layered BFS that only keeps the previous and current frontier.
+    The grid is bipartite, so the next layer is every open neighbour
+    of the frontier that was not in the previous layer. A plot reached
+    after n steps can be reached again after n+2, so the answer for N
+    is the total size of the layers with the same parity as N.
+
+    With 'tiled' the garden repeats in all directions (as many copies
+    as needed for the largest N).
+    """
+    garden, (sy, sx) = parse_garden(data)
+    max_n = max(step_counts)
+    H, W = garden.shape
+    if tiled:
+        k_y, k_x = (max_n + H - 1) // H, (max_n + W - 1) // W
+        garden = np.tile(garden, (2 * k_y + 1, 2 * k_x + 1))
+        sy, sx = sy + k_y * H, sx + k_x * W
+    # border of rocks so the shifts never wrap
+    garden = np.pad(garden, 1)
+    sy, sx = sy + 1, sx + 1
+
+    previous, current, next_ = (np.zeros_like(garden) for _ in range(3))
+    current[sy, sx] = True
+    parity_totals = [1, 0]
+    wanted = set(step_counts)
+    counts = {0: 1} if 0 in wanted else {}
+    for step in range(1, max_n + 1):
+        # all plots reached so far are within 'step' of the start
+        y0, y1 = max(sy - step, 0), min(sy + step + 1, garden.shape[0])
+        x0, x1 = max(sx - step, 0), min(sx + step + 1, garden.shape[1])
+        f = current[y0:y1, x0:x1]
+        new = next_[y0:y1, x0:x1]
+        new[:] = False
+        new[1:] |= f[:-1]
+        new[:-1] |= f[1:]
+        new[:, 1:] |= f[:, :-1]
+        new[:, :-1] |= f[:, 1:]
+        new &= garden[y0:y1, x0:x1]
+        new &= ~previous[y0:y1, x0:x1]
+        parity_totals[step % 2] += int(np.count_nonzero(new))
+        if step in wanted:
+            counts[step] = parity_totals[step % 2]
+        previous, current, next_ = current, next_, previous
+    return counts
+
+
+def solve2(data, N=26501365, verify=False):
+    """
+    The number of reachable plots for N = r + n*width grows
+    quadratically in n for the (diamond shaped) input. Fits the
+    quadratic through n = 0, 1, 2 (from a single BFS) and evaluates
+    it at the wanted n.
+
+    With 'verify' the result is also computed with the tiled BFS,
+    only feasible for small N.
+    """
+    garden, _ = parse_garden(data)
+    width = garden.shape[1]
+    r, n = N % width, N // width
+    counts = count_reachable(data, [r, r + width, r + 2 * width])
+    v1, v2, v3 = counts[r], counts[r + width], counts[r + 2 * width]
+    # Lagrange interpolation through x = 0, 1, 2 (see test_part2)
+    a2 = v1 - 2 * v2 + v3
+    b2 = -3 * v1 + 4 * v2 - v3
+    result = (a2 * n * n + b2 * n) // 2 + v1
+    if verify:
+        brute_force = count_reachable(data, [N])[N]
+        assert result == brute_force, (N, result, brute_force)
+    return result
+
+
+def test_count_reachable():
+    assert 16 == count_reachable(EXAMPLE_DATA, [6], tiled=False)[6]
+    assert 3814 == count_reachable(data(), [64], tiled=False)[64]
+    counts = count_reachable(EXAMPLE_DATA, [6, 10, 50, 100, 500])
+    assert [counts[n] for n in (6, 10, 50, 100, 500)] == [16, 50, 1594, 6536, 167004]
+
+
+def test_part2_extrapolated():
+    result = solve2(data())
+    assert result == 632257949158206
+    # the quadratic also holds for step counts that can be checked directly
+    width = 131
+    for N in [65 + 3 * width, 64 + 3 * width]:
+        solve2(data(), N, verify=True)
+
+
+def benchmark():
+    import time
+
+    start = time.perf_counter()
+    result = solve2(data())
+    print(f"26501365 steps: {result} in {(time.perf_counter() - start)*1000:.1f} ms")
+    start = time.perf_counter()
+    counts = count_reachable(EXAMPLE_DATA, [1000])
+    print(f"example 1000 steps (tiled BFS): {counts[1000]} in {(time.perf_counter() - start)*1000:.1f} ms")
+    start = time.perf_counter()
+    assert counts[1000] == solve(EXAMPLE_DATA, N=1000, part2=True)
+    print(f"example 1000 steps (heap): {(time.perf_counter() - start)*1000:.1f} ms")
+
+
 from pathlib import Path
 
 THIS_DIR = Path(__file__).parent
@@ -184,3 +302,13 @@ THIS_DIR = Path(__file__).parent
 def data():
     with open(THIS_DIR / "input.txt") as f:
         return f.read()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "bench" in sys.argv[1:]:
+        benchmark()
+    else:
+        test_part1()
+        test_part2()
@@ -43,7 +43,7 @@ LETTERS = "ABCDEFGHIJ"
 from collections import defaultdict
 
 
-def solve(data, part2=False):
+def parse_bricks(data):
     bricks = []
     all_lines = [*data.splitlines()]
     for i, line in enumerate(all_lines):
@@ -58,6 +58,15 @@ def solve(data, part2=False):
                 end=Position(*map(int, e.split(","))),
             )
         )
+    return bricks
+
+
+def solve_fall(data, part2=False):
+    """
+    Original solver, drops each brick one step at a time
+    and tests it against all fallen bricks.
+    """
+    bricks = parse_bricks(data)
 
     # we start checking the falling of the bricks from the bottom up
     bricks.sort(key=lambda b: b.start.z)
@@ -133,12 +142,166 @@ def solve(data, part2=False):
     return result
 
 
+def settle(bricks):
+    """
+    Lets the bricks fall using a height map with the top brick
+    per (x, y) column, each brick lands in O(footprint).
+
+    Returns the settled bricks (in landing order, which is a
+    topological order of the support graph) and for each settled
+    brick the list of indices of the bricks it rests on.
+    """
+    bricks = sorted(bricks, key=lambda b: b.start.z)
+    width = 1 + max(max(b.start.x, b.end.x) for b in bricks)
+    depth = 1 + max(max(b.start.y, b.end.y) for b in bricks)
+    height = [0] * (width * depth)
+    top = [-1] * (width * depth)
+
+    settled = []
+    rests_on = []
+    for index, brick in enumerate(bricks):
+        x0, x1 = sorted((brick.start.x, brick.end.x))
+        y0, y1 = sorted((brick.start.y, brick.end.y))
+        z0, z1 = sorted((brick.start.z, brick.end.z))
+        cells = [y * width + x for y in range(y0, y1 + 1) for x in range(x0, x1 + 1)]
+        floor = max(height[c] for c in cells)
+        below = []
+        if floor > 0:
+            for c in cells:
+                if height[c] == floor and top[c] not in below:
+                    below.append(top[c])
+        land_z = floor + 1
+        new_top = land_z + z1 - z0
+        for c in cells:
+            height[c] = new_top
+            top[c] = index
+        settled.append(
+            Brick(
+                name=brick.name,
+                start=Position(brick.start.x, brick.start.y, land_z),
+                end=Position(brick.end.x, brick.end.y, new_top),
+            )
+        )
+        rests_on.append(below)
+    return settled, rests_on
+
+
+def dominator_tree(rests_on):
+    """
+    Immediate dominators of the support graph with the ground as root.
+
+    A brick falls when all paths from the ground to it pass through
+    the removed brick, i.e. when the removed brick dominates it. The
+    bricks are given in topological order, so the immediate dominator
+    of a brick is the lowest common ancestor (in the dominator tree)
+    of the bricks it rests on. The LCA uses binary lifting.
+
+    Returns the list of immediate dominators, the ground is -1.
+    """
+    num_bricks = len(rests_on)
+    ground = num_bricks
+    level = [0] * (num_bricks + 1)
+    # ancestors[v][k] is the 2**k-th ancestor of v
+    ancestors = [None] * (num_bricks + 1)
+    ancestors[ground] = [ground]
+
+    def lca(a, b):
+        if level[a] < level[b]:
+            a, b = b, a
+        diff = level[a] - level[b]
+        k = 0
+        while diff:
+            if diff & 1:
+                a = ancestors[a][k]
+            diff >>= 1
+            k += 1
+        if a == b:
+            return a
+        for k in range(len(ancestors[a]) - 1, -1, -1):
+            ups_a, ups_b = ancestors[a], ancestors[b]
+            if k < len(ups_a) and ups_a[k] != ups_b[k]:
+                a, b = ups_a[k], ups_b[k]
+        return ancestors[a][0]
+
+    idom = [ground] * num_bricks
+    for v, below in enumerate(rests_on):
+        if below:
+            d = below[0]
+            for other in below[1:]:
+                d = lca(d, other)
+                if d == ground:
+                    break
+            idom[v] = d
+        parent = idom[v]
+        level[v] = level[parent] + 1
+        ups = [parent]
+        k = 0
+        while k < len(ancestors[ups[k]]):
+            ups.append(ancestors[ups[k]][k])
+            k += 1
+        ancestors[v] = ups
+    return [-1 if d == ground else d for d in idom]
+
+
+def solve(data, part2=False):
+    settled, rests_on = settle(parse_bricks(data))
+    if not part2:
+        # a brick is safe to remove if it is not the only support of another
+        sole_supports = set(below[0] for below in rests_on if len(below) == 1)
+        return len(settled) - len(sole_supports)
+
+    # number of falling bricks is the dominator subtree size minus one
+    idom = dominator_tree(rests_on)
+    subtree = [1] * len(idom)
+    for v in range(len(idom) - 1, -1, -1):
+        if idom[v] >= 0:
+            subtree[idom[v]] += subtree[v]
+    return sum(subtree) - len(subtree)
+
+
+def synthetic_bricks(num_bricks, width=100, max_length=4, seed=22):
+    """
+    Random puzzle input with 'num_bricks' straight bricks in
+    a width x width area, stacked in random order.
+    """
+    import random
+
+    rng = random.Random(seed)
+    lines = []
+    for z in range(1, num_bricks + 1):
+        x, y = rng.randrange(width), rng.randrange(width)
+        length = rng.randrange(max_length)
+        axis = rng.randrange(3)
+        end = [x, y, z]
+        end[axis] = min(end[axis] + length, width - 1) if axis < 2 else z + length
+        lines.append(f"{x},{y},{z}~{end[0]},{end[1]},{end[2]}")
+    # the puzzle input is not sorted by z either
+    rng.shuffle(lines)
+    return "\n".join(lines)
+
+
 def test_example():
     result = solve(EXAMPLE_DATA)
     print(f"example: {result}")
     assert result == 5
 
 
+def test_settle():
+    # compare against the brick by brick simulation, narrow areas give
+    # tall columns, long bricks give many bricks with multiple supports
+    for seed, width, max_length in [(1, 2, 2), (2, 3, 4), (3, 5, 4), (4, 10, 4), (5, 10, 8), (6, 4, 6)]:
+        example = synthetic_bricks(250, width=width, max_length=max_length, seed=seed)
+        settled, rests_on = settle(parse_bricks(example))
+        assert any(len(below) > 1 for below in rests_on)
+        assert solve(example) == solve_fall(example)
+        assert solve(example, part2=True) == solve_fall(example, part2=True)
+
+    settled, rests_on = settle(parse_bricks(EXAMPLE_DATA))
+    assert [b.name for b in settled] == ["A", "B", "C", "D", "E", "F", "G"]
+    assert rests_on == [[], [0], [0], [1, 2], [1, 2], [3, 4], [5]]
+    assert dominator_tree(rests_on) == [-1, 0, 0, 0, 0, 0, 5]
+
+
 def test_part1():
     result = solve(data())
     print("Part 1:", result)
@@ -165,3 +328,43 @@ THIS_DIR = Path(__file__).parent
 def data():
     with open(THIS_DIR / "input.txt") as f:
         return f.read()
+
+
+def benchmark():
+    import time
+
+    puzzle = data()
+    for name, f in [("fall", solve_fall), ("height map", solve)]:
+        t0 = time.perf_counter()
+        result = f(puzzle), f(puzzle, part2=True)
+        print(f"input {name}: {result} {time.perf_counter() - t0:.3f}s")
+
+    for num_bricks in [1_000, 100_000]:
+        bricks = synthetic_bricks(num_bricks)
+        t0 = time.perf_counter()
+        parsed = parse_bricks(bricks)
+        t1 = time.perf_counter()
+        settled, rests_on = settle(parsed)
+        t2 = time.perf_counter()
+        dominator_tree(rests_on)
+        t3 = time.perf_counter()
+        print(
+            f"{num_bricks} bricks: parse {t1 - t0:.3f}s, settle {t2 - t1:.3f}s,"
+            f" dominators {t3 - t2:.3f}s"
+        )
+        if num_bricks <= 1_000:
+            t0 = time.perf_counter()
+            result = solve_fall(bricks), solve_fall(bricks, part2=True)
+            print(f"{num_bricks} bricks (fall): {result} {time.perf_counter() - t0:.3f}s")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "bench" in sys.argv[1:]:
+        benchmark()
+    else:
+        test_example()
+        test_part1()
+        test_example2()
+        test_part2()
@@ -40,7 +40,10 @@ NEIGHBORS = {
 }
 
 
-def solve(data, part2=False):
+def solve_networkx(data, part2=False):
+    """
+    Original solution, simple paths through the networkx cell graph.
+    """
     grid = {}
     start_pos = None
     end_pos = None
@@ -116,6 +119,196 @@ def solve(data, part2=False):
     return result
 
 
+class TrailGraph:
+    """
+    The trails compressed to the junctions (cells with more than two
+    open neighbours, plus start and end) with the corridor lengths as
+    edge weights. Nodes are numbered so a set of visited nodes is an
+    integer bit mask. With 'part2' the slopes are ignored.
+    """
+
+    def __init__(self, data, part2=False):
+        lines = data.splitlines()
+        grid = {(x, y): c for y, line in enumerate(lines) for x, c in enumerate(line) if c != "#"}
+        start_pos = min(grid, key=lambda p: (p[1], p[0]))
+        end_pos = max(grid, key=lambda p: (p[1], -p[0]))
+
+        def open_neighbors(pos):
+            x, y = pos
+            return [(x + dx, y + dy) for dx, dy in NEIGHBORS["."] if (x + dx, y + dy) in grid]
+
+        def can_move(a, b):
+            if part2:
+                return True
+            move = (b[0] - a[0], b[1] - a[1])
+            if grid[a] != "." and NEIGHBORS[grid[a]][0] != move:
+                return False
+            if grid[b] != "." and NEIGHBORS[grid[b]][0] == (-move[0], -move[1]):
+                return False
+            return True
+
+        self.positions = [start_pos, end_pos] + [
+            p for p in grid if p not in (start_pos, end_pos) and len(open_neighbors(p)) > 2
+        ]
+        index = {p: i for i, p in enumerate(self.positions)}
+        self.start, self.end = 0, 1
+        self.adjacency = [{} for _ in self.positions]
+        for i, pos in enumerate(self.positions):
+            for cur in open_neighbors(pos):
+                prev, steps, passable = pos, 1, can_move(pos, cur)
+                while passable and cur not in index:
+                    options = [n for n in open_neighbors(cur) if n != prev]
+                    if not options:
+                        # dead end
+                        passable = False
+                        break
+                    prev, cur = cur, options[0]
+                    steps += 1
+                    passable = can_move(prev, cur)
+                if passable:
+                    j = index[cur]
+                    self.adjacency[i][j] = max(steps, self.adjacency[i].get(j, 0))
+        self.adjacency = [sorted(a.items()) for a in self.adjacency]
+
+        # a path uses at most two edges of every node on it (and at most
+        # once per neighbour), each edge is shared by two nodes, so the
+        # remaining length is at most half the sum of the two heaviest
+        # edges of the unvisited nodes. Bounds are kept doubled.
+        incident = [{} for _ in self.positions]
+        for i, edges in enumerate(self.adjacency):
+            for j, w in edges:
+                incident[i][j] = max(w, incident[i].get(j, 0))
+                incident[j][i] = max(w, incident[j].get(i, 0))
+        self.heaviest = [max(weights.values(), default=0) for weights in incident]
+        self.top_two = [sum(sorted(weights.values())[-2:]) for weights in incident]
+
+        # the exit is only reachable through a single junction, once
+        # there any other move would block the way to the exit
+        into_end = [(i, w) for i, edges in enumerate(self.adjacency) for j, w in edges if j == self.end]
+        if len(into_end) == 1:
+            self.target, self.bonus = into_end[0]
+        else:
+            self.target, self.bonus = self.end, 0
+
+    def initial_state(self):
+        """
+        State is (node, visited mask, length, sum of top_two of the unvisited nodes).
+        """
+        return (self.start, 1 << self.start, 0, sum(self.top_two) - self.top_two[self.start])
+
+    def greedy_path(self):
+        """
+        Length of the path found by always taking the heaviest edge to
+        an unvisited node, without backtracking. Returns -1 if that walk
+        gets stuck before reaching the exit.
+        """
+        node, visited, length = self.start, 1 << self.start, 0
+        while node != self.target:
+            options = [(w, j) for j, w in self.adjacency[node] if not visited >> j & 1]
+            if not options:
+                return -1
+            w, node = max(options)
+            visited |= 1 << node
+            length += w
+        return length + self.bonus
+
+    def branches(self, min_states):
+        """
+        Expands the search from the start, one branching decision at a
+        time, until there are at least 'min_states' partial paths. Returns
+        those and the longest path completed during the expansion.
+        """
+        states = [self.initial_state()]
+        best = -1
+        while len(states) < min_states:
+            expanded = []
+            for state in states:
+                node, visited, length, remaining = state
+                if node == self.target:
+                    best = max(best, length + self.bonus)
+                    continue
+                options = [
+                    (j, visited | (1 << j), length + w, remaining - self.top_two[j])
+                    for j, w in self.adjacency[node]
+                    if not visited >> j & 1
+                ]
+                expanded.extend(options)
+            if not expanded:
+                break
+            states = expanded
+        return states, best
+
+    def longest_path(self, states=None, best=-1):
+        """
+        Iterative depth first search for the longest path from the
+        given states (default the start) to the exit. Returns 'best'
+        if there is no longer path.
+        """
+        adjacency = self.adjacency
+        top_two = self.top_two
+        heaviest = self.heaviest
+        target, bonus = self.target, self.bonus
+        stack = list(states) if states is not None else [self.initial_state()]
+        while stack:
+            node, visited, length, remaining = stack.pop()
+            if node == target:
+                if length + bonus > best:
+                    best = length + bonus
+                continue
+            # doubled bound, the current node still leaves through one edge,
+            # the unvisited nodes (including the exit) are in 'remaining'
+            if 2 * length + heaviest[node] + remaining <= 2 * best:
+                continue
+            for j, w in adjacency[node]:
+                if not visited >> j & 1:
+                    stack.append((j, visited | (1 << j), length + w, remaining - top_two[j]))
+        return best
+
+
+_worker_trails = None
+
+
+def _init_worker(trails):
+    global _worker_trails
+    _worker_trails = trails
+
+
+def _longest_path_chunk(states, best):
+    return _worker_trails.longest_path(states, best)
+
+
+def solve(data, part2=False, max_workers=None):
+    trails = TrailGraph(data, part2)
+    if max_workers == 1:
+        return trails.longest_path()
+    from concurrent.futures import ProcessPoolExecutor
+    import os
+
+    num_workers = max_workers or os.cpu_count() or 1
+    states, best = trails.branches(4 * num_workers)
+    if not states:
+        return best
+    # a greedy walk gives the workers a bound to prune against
+    best = max(best, trails.greedy_path())
+    num_chunks = min(num_workers, len(states))
+    chunks = [states[i::num_chunks] for i in range(num_chunks)]
+    with ProcessPoolExecutor(num_chunks, initializer=_init_worker, initargs=(trails,)) as executor:
+        results = executor.map(_longest_path_chunk, chunks, [best] * num_chunks)
+        return max(best, *results)
+
+
+def test_trail_graph():
+    trails = TrailGraph(EXAMPLE_DATA, part2=True)
+    assert len(trails.positions) == 9
+    assert trails.longest_path() == 154
+    assert trails.target != trails.end
+    assert 0 < trails.greedy_path() <= 154
+    for part2, expected in [(False, 94), (True, 154)]:
+        assert solve(EXAMPLE_DATA, part2, max_workers=1) == expected
+        assert solve(EXAMPLE_DATA, part2, max_workers=2) == expected
+        assert solve_networkx(EXAMPLE_DATA, part2) == expected
+
+
 def test_example():
     result = solve(EXAMPLE_DATA)
     print(f"example: {result}")
@@ -149,3 +342,32 @@ THIS_DIR = Path(__file__).parent
 def data():
     with open(THIS_DIR / "input.txt") as f:
         return f.read()
+
+
+def benchmark():
+    import time
+
+    puzzle = data()
+    for part2 in [False, True]:
+        t0 = time.perf_counter()
+        trails = TrailGraph(puzzle, part2)
+        t1 = time.perf_counter()
+        result = trails.longest_path()
+        t2 = time.perf_counter()
+        print(
+            f"part {1 + part2}: {result}, {len(trails.positions)} junctions,"
+            f" compress {t1 - t0:.3f}s, search {t2 - t1:.3f}s"
+        )
+        t0 = time.perf_counter()
+        result = solve(puzzle, part2)
+        print(f"part {1 + part2} (processes): {result} {time.perf_counter() - t0:.3f}s")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "bench" in sys.argv[1:]:
+        benchmark()
+    else:
+        test_part1()
+        test_part2()
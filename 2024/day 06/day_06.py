@@ -55,7 +55,10 @@ def trace(grid, guard, visit_order=None):
                 break
     return visit_order, loop_detected
 
-def solve(data, part2=False):
+def solve_steps(data, part2=False):
+    """
+    Original solution, traces the guard one step at a time.
+    """
     grid, guard_start = parse(data)
     visit_order, _ = trace(grid, guard_start)
     if not part2:
@@ -84,6 +87,183 @@ def solve(data, part2=False):
     return sum(1 for v in tested_positions.values() if v)
 
 
+import numpy as np
+
+# directions in turning order
+HEADINGS = '^>v<'
+
+
+class Lab:
+    """
+    The lab as flat cell indices (y*W + x) with a jump table per
+    heading: the cell where the guard stops in front of the next
+    obstacle, or -1 when she walks off the map. A walk then moves
+    from obstacle to obstacle instead of cell by cell.
+    """
+
+    def __init__(self, data):
+        lines = data.splitlines()
+        chars = np.array([list(line) for line in lines])
+        self.H, self.W = chars.shape
+        blocked = chars == '#'
+        y, x = [int(v[0]) for v in np.nonzero(np.isin(chars, list(HEADINGS)))]
+        self.start = y * self.W + x
+        self.heading = HEADINGS.index(chars[y, x])
+        self.rows = np.repeat(np.arange(self.H), self.W).tolist()
+        self.cols = np.tile(np.arange(self.W), self.H).tolist()
+        self.stops = [table.ravel().tolist() for table in self._jump_tables(blocked)]
+
+    def _jump_tables(self, blocked):
+        H, W = blocked.shape
+        index = np.arange(H * W).reshape(H, W)
+
+        def stops_right(blocked, index):
+            # column of the next obstacle at or right of each cell
+            n = blocked.shape[1]
+            obstacle_col = np.where(blocked, np.arange(n), n)
+            next_col = np.minimum.accumulate(obstacle_col[:, ::-1], axis=1)[:, ::-1]
+            # look from the cell to the right
+            next_col = np.concatenate([next_col[:, 1:], np.full((blocked.shape[0], 1), n)], axis=1)
+            rows = np.arange(blocked.shape[0])[:, None]
+            stop = index[rows, np.minimum(next_col - 1, n - 1)]
+            return np.where(next_col < n, stop, -1)
+
+        # orient every heading as 'right', compute and orient back
+        up = stops_right(blocked.T[:, ::-1], index.T[:, ::-1])[:, ::-1].T
+        right = stops_right(blocked, index)
+        down = stops_right(blocked.T, index.T).T
+        left = stops_right(blocked[:, ::-1], index[:, ::-1])[:, ::-1]
+        return up, right, down, left
+
+    def path(self):
+        """
+        Returns the guard's (cell, heading) for every step of her
+        patrol, until she leaves the map. Raises a ValueError if she
+        never does.
+        """
+        steps = (-self.W, 1, self.W, -1)
+        cell, heading = self.start, self.heading
+        visits = []
+        turns = set()
+        while True:
+            stop = self.stops[heading][cell]
+            end = stop
+            if stop < 0:
+                # walk to the edge of the map
+                row, col = self.rows[cell], self.cols[cell]
+                distance = (row, self.W - 1 - col, self.H - 1 - row, col)[heading]
+                end = cell + distance * steps[heading]
+            visits.extend((c, heading) for c in range(cell, end + steps[heading], steps[heading]))
+            if stop < 0:
+                return visits
+            if (stop, heading) in turns:
+                raise ValueError("The guard patrols in a loop")
+            turns.add((stop, heading))
+            cell, heading = stop, (heading + 1) & 3
+
+    def loops(self, obstacle, cell, heading, stamps, generation):
+        """
+        Returns whether the guard, starting at cell with heading, ends up
+        in a loop with an extra obstacle. Visited (stop, heading) pairs are
+        marked in 'stamps' with 'generation', so the array can be reused
+        between walks without clearing.
+        """
+        stops, rows, cols, W = self.stops, self.rows, self.cols, self.W
+        obstacle_row, obstacle_col = rows[obstacle], cols[obstacle]
+        while True:
+            stop = stops[heading][cell]
+            row, col = rows[cell], cols[cell]
+            # stop earlier if the new obstacle is in the way
+            if heading == 0:
+                if obstacle_col == col and obstacle_row < row and (stop < 0 or obstacle_row >= rows[stop]):
+                    stop = obstacle + W
+            elif heading == 1:
+                if obstacle_row == row and obstacle_col > col and (stop < 0 or obstacle_col <= cols[stop]):
+                    stop = obstacle - 1
+            elif heading == 2:
+                if obstacle_col == col and obstacle_row > row and (stop < 0 or obstacle_row <= rows[stop]):
+                    stop = obstacle - W
+            else:
+                if obstacle_row == row and obstacle_col < col and (stop < 0 or obstacle_col >= cols[stop]):
+                    stop = obstacle + 1
+            if stop < 0:
+                return False
+            key = 4 * stop + heading
+            if stamps[key] == generation:
+                return True
+            stamps[key] = generation
+            cell, heading = stop, (heading + 1) & 3
+
+    def candidates(self, visits):
+        """
+        Obstacle positions on the guard's path (except her start) with
+        the state she is in just before first reaching them.
+        """
+        first = {self.start: None}
+        for i, (cell, _) in enumerate(visits):
+            if cell not in first:
+                first[cell] = visits[i - 1]
+        del first[self.start]
+        return [(cell, *before) for cell, before in first.items()]
+
+    def count_loops(self, candidates):
+        stamps = [0] * (4 * self.H * self.W)
+        return sum(
+            self.loops(obstacle, cell, heading, stamps, generation)
+            for generation, (obstacle, cell, heading) in enumerate(candidates, 1)
+        )
+
+
+_worker_lab = None
+
+
+def _init_worker(lab):
+    global _worker_lab
+    _worker_lab = lab
+
+
+def _count_loops_chunk(candidates):
+    return _worker_lab.count_loops(candidates)
+
+
+def solve(data, part2=False, max_workers=None):
+    lab = Lab(data)
+    visits = lab.path()
+    if not part2:
+        return len({cell for cell, _ in visits})
+
+    candidates = lab.candidates(visits)
+    if max_workers == 1:
+        return lab.count_loops(candidates)
+    from concurrent.futures import ProcessPoolExecutor
+    import os
+
+    num_chunks = min(max_workers or os.cpu_count() or 1, len(candidates)) or 1
+    chunks = [candidates[i::num_chunks] for i in range(num_chunks)]
+    with ProcessPoolExecutor(num_chunks, initializer=_init_worker, initargs=(lab,)) as executor:
+        return sum(executor.map(_count_loops_chunk, chunks))
+
+
+def test_lab():
+    lab = Lab(EXAMPLE_DATA)
+    grid, guard_start = parse(EXAMPLE_DATA)
+    visit_order, _ = trace(grid, guard_start)
+    assert lab.path() == [(y * lab.W + x, HEADINGS.index(d)) for (x, y), d in visit_order]
+    assert solve(EXAMPLE_DATA, part2=True, max_workers=1) == 6
+    assert solve(EXAMPLE_DATA, part2=True, max_workers=2) == 6
+    for seed in range(5):
+        example = random_lab(12, seed=seed)
+        assert solve(example) == solve_steps(example)
+        assert solve(example, part2=True, max_workers=1) == solve_steps(example, part2=True)
+
+
+def random_lab(size, density=0.05, seed=6):
+    rng = np.random.default_rng(seed)
+    grid = np.where(rng.random((size, size)) < density, '#', '.')
+    grid[size // 2, size // 2] = '^'
+    return '\n'.join(''.join(row) for row in grid)
+
+
 def test_example():
     result = solve(EXAMPLE_DATA)
     print(f"example: {result}")
@@ -116,3 +296,43 @@ THIS_DIR = Path(__file__).parent
 def data():
     with open(THIS_DIR / "input.txt") as f:
         return f.read()
+
+
+def benchmark():
+    import time
+    from contextlib import redirect_stdout
+    from io import StringIO
+
+    def leaving_lab(size, density):
+        # a random lab where the guard walks off the map
+        for seed in range(100):
+            lab_data = random_lab(size, density, seed)
+            try:
+                Lab(lab_data).path()
+                return lab_data
+            except ValueError:
+                pass
+
+    for name, lab_data in [('input', data()), ('1000x1000', leaving_lab(1000, density=0.02))]:
+        lab = Lab(lab_data)
+        visits = lab.path()
+        print(f"{name}: {len(lab.candidates(visits))} candidates")
+        for max_workers in [1, None]:
+            start = time.perf_counter()
+            result = solve(lab_data, part2=True, max_workers=max_workers)
+            print(f"  jump table (max_workers={max_workers}): {result} {time.perf_counter() - start:.3f}s")
+        if name == 'input':
+            start = time.perf_counter()
+            with redirect_stdout(StringIO()):
+                result = solve_steps(lab_data, part2=True)
+            print(f"  steps: {result} {time.perf_counter() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if 'bench' in sys.argv[1:]:
+        benchmark()
+    else:
+        test_part1()
+        test_part2()
@@ -2,6 +2,7 @@
 Advent of Code 2024 - Day 17
 Pieter Kitslaar
 """
+import numpy as np
 
 EXAMPLE_DATA = """\
 Register A: 729
@@ -234,6 +235,120 @@ def solve2(data):
     assert run_program(A) == program
     return result
 
+# register written by adv, bdv and cdv
+SHIFT_TARGET = {0: 0, 6: 1, 7: 2}
+# instructions with a combo operand
+COMBO_OPS = {0, 2, 5, 6, 7}
+
+def _batch_step(program, pc, registers, mask):
+    """
+    Executes the instruction at pc for the lanes selected by mask
+    (a slice or boolean array), returns the next pc and output values.
+    """
+    op_code, operand = program[pc], program[pc+1]
+    A = registers[0, mask]
+    if op_code in COMBO_OPS:
+        combo = np.uint64(operand) if operand < 4 else registers[operand - 4, mask]
+    if op_code in (0, 6, 7):
+        # numpy shifts of 64 bits or more are undefined
+        result = A >> np.minimum(combo, np.uint64(63))
+        result = np.where(combo > 63, np.uint64(0), result)
+        registers[SHIFT_TARGET[op_code], mask] = result
+    elif op_code == 1:
+        registers[1, mask] ^= np.uint64(operand)
+    elif op_code == 2:
+        registers[1, mask] = combo & np.uint64(7)
+    elif op_code == 3:
+        return np.where(A != 0, operand, pc + 2), None
+    elif op_code == 4:
+        registers[1, mask] ^= registers[2, mask]
+    elif op_code == 5:
+        return pc + 2, np.broadcast_to(combo & np.uint64(7), A.shape)
+    return pc + 2, None
+
+def run_batch(program, A, B=0, C=0, max_outputs=None, max_steps=100_000):
+    """
+    Runs the program for all values in the array A in lockstep.
+
+    Every lane has its own program counter and halts independently.
+    Halted lanes are dropped from the working arrays, as long as all
+    running lanes share the same program counter each instruction is
+    a single operation on whole arrays. A lane also stops once it
+    produced max_outputs values (default: the length of the program).
+
+    Returns (outputs, num_outputs), where outputs[i, :num_outputs[i]]
+    holds the output of lane i.
+    """
+    if max_outputs is None:
+        max_outputs = len(program)
+    A = np.array(A, dtype=np.uint64, ndmin=1)
+    n = len(A)
+    outputs = np.zeros((n, max_outputs), dtype=np.uint8)
+    num_outputs = np.zeros(n, dtype=np.int64)
+
+    # state of the running lanes only
+    lanes = np.arange(n)
+    registers = np.zeros((3, n), dtype=np.uint64)
+    registers[0] = A
+    registers[1] = B
+    registers[2] = C
+    pcs = np.zeros(n, dtype=np.int64)
+
+    for _ in range(max_steps):
+        running = pcs < len(program)
+        if not running.all():
+            lanes, registers, pcs = lanes[running], registers[:, running], pcs[running]
+        if len(lanes) == 0:
+            break
+        pc = pcs[0]
+        if (pcs == pc).all():
+            groups = [(pc, slice(None))]
+        else:
+            groups = [(pc, pcs == pc) for pc in np.unique(pcs)]
+        for pc, mask in groups:
+            next_pc, values = _batch_step(program, pc, registers, mask)
+            pcs[mask] = next_pc
+            if values is not None:
+                out_lanes = lanes[mask]
+                outputs[out_lanes, num_outputs[out_lanes]] = values
+                num_outputs[out_lanes] += 1
+                # stop lanes with a full output buffer
+                full = num_outputs[out_lanes] == max_outputs
+                if full.any():
+                    done = pcs[mask]
+                    done[full] = len(program)
+                    pcs[mask] = done
+    else:
+        raise RuntimeError(f"lanes still running after {max_steps} steps")
+    return outputs, num_outputs
+
+def solve2_batch(data):
+    """
+    Builds A one octal digit at a time, starting with the most
+    significant one (see solve2). Instead of backtracking, the 8
+    values of the next digit are tried at once for all candidates
+    that are still valid, the smallest A is the smallest candidate
+    left at the end.
+
+    Like solve2 this relies on the program shifting A by 3 bits per
+    output, so a candidate only needs to produce the next program
+    value as its first output: the rest of its output is the output
+    of the (already valid) shorter candidate. The final answer is
+    checked with a full run.
+    """
+    _, program = parse(data)
+    candidates = np.zeros(1, dtype=np.uint64)
+    for value in reversed(program):
+        A = ((candidates[:, None] << np.uint64(3)) | np.arange(8, dtype=np.uint64)).ravel()
+        A = A[A > 0]
+        outputs, num_outputs = run_batch(program, A, max_outputs=1)
+        candidates = A[(num_outputs == 1) & (outputs[:, 0] == value)]
+    for A in np.sort(candidates).tolist():
+        outputs, num_outputs = run_batch(program, [A], max_outputs=len(program) + 1)
+        if outputs[0, :num_outputs[0]].tolist() == program:
+            return A
+    raise ValueError("no A found that outputs the program")
+
 EXAMPLE_DATA2 = """\
 Register A: 117440
 Register B: 0
@@ -253,6 +368,48 @@ def test_part2():
     print("Part 2:", result)
     assert result == 90938893795561
 
+def test_batch():
+    registers, program = parse(data())
+    A = [registers['A'], 0, 1, 117440, 2**47 + 12345, 90938893795561]
+    outputs, num_outputs = run_batch(program, A, max_outputs=20)
+    for a, lane_output, lane_num_outputs in zip(A, outputs, num_outputs):
+        cpu = CPU(a, 0, 0)
+        cpu.run(program)
+        assert cpu.output == lane_output[:lane_num_outputs].tolist()
+
+def test_example2_batch():
+    assert solve2_batch(EXAMPLE_DATA2) == 117440
+
+def test_part2_batch():
+    result = solve2_batch(data())
+    print("Part 2 (batch):", result)
+    assert result == 90938893795561
+
+def benchmark():
+    import time
+    import contextlib, io
+    registers, program = parse(data())
+    rng = np.random.default_rng(17)
+    A = rng.integers(1, 8**16, size=10_000, dtype=np.uint64)
+
+    start = time.perf_counter()
+    for a in A[:1000].tolist():
+        CPU(a, 0, 0).run(program)
+    scalar = (time.perf_counter() - start) / 1000
+    start = time.perf_counter()
+    run_batch(program, A, max_outputs=20)
+    batch = (time.perf_counter() - start) / len(A)
+    print(f"CPU      : {scalar*1e6:8.1f} us per A")
+    print(f"run_batch: {batch*1e6:8.1f} us per A ({len(A)} lanes)")
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        solve2(data())
+    print(f"solve2      : {(time.perf_counter() - start)*1000:8.1f} ms")
+    start = time.perf_counter()
+    solve2_batch(data())
+    print(f"solve2_batch: {(time.perf_counter() - start)*1000:8.1f} ms")
+
 
 from pathlib import Path
 
@@ -261,4 +418,13 @@ THIS_DIR = Path(__file__).parent
 
 def data():
     with open(THIS_DIR / "input.txt") as f:
-        return f.read()
\ No newline at end of file
+        return f.read()
+
+
+if __name__ == "__main__":
+    import sys
+    if 'bench' in sys.argv[1:]:
+        benchmark()
+    else:
+        test_part1()
+        test_part2_batch()